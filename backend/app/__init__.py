@@ -1,7 +1,5 @@
 # backend/app/__init__.py
 from flask import Flask, request, make_response
-from pymongo import MongoClient, ASCENDING
-from datetime import datetime
 import sys
 import os
 
@@ -9,55 +7,108 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from config import Config
 
-def create_indexes(db):
-    # Drop existing indexes to ensure clean state
-    db.cabinets.drop_indexes()
-    db.notes.drop_indexes()
-    
-    """Create necessary database indexes"""
-    # Create index for notes order within a cabinet
-    db.notes.create_index([
-        ('cabinet_id', ASCENDING),
-        ('order', ASCENDING)
-    ])
-    
-    # Create index for cabinet names (ensure uniqueness)
-    db.cabinets.create_index('name', unique=True)
+# Shared by the Flask app and the async app in app.aio
+CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "http://localhost:3000",
+    "Access-Control-Allow-Headers": "Content-Type,If-None-Match,Last-Event-ID",
+    "Access-Control-Allow-Methods": "GET,PUT,PATCH,POST,DELETE,OPTIONS",
+    "Access-Control-Allow-Credentials": "true",
+}
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    from .utils.json_provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
+    from .utils import logs, metrics, compression
+    logs.configure_logging(app.config)
+    # Registered first so the preflight short-circuit below is timed too
+    if app.config['METRICS_ENABLED']:
+        metrics.init_app(app)
+    # After-request hooks run in reverse, so metrics see the compressed size
+    if app.config['COMPRESSION_ENABLED']:
+        compression.init_app(app)
 
     @app.before_request
     def handle_preflight():
         if request.method == "OPTIONS":
             response = make_response()
-            response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type"
-            response.headers["Access-Control-Allow-Methods"] = "GET,PUT,POST,DELETE,OPTIONS"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.headers.update(CORS_HEADERS)
             return response
 
     @app.after_request
     def after_request(response):
         if request.method != "OPTIONS":
-            response.headers["Access-Control-Allow-Origin"] = "http://localhost:3000"
-            response.headers["Access-Control-Allow-Headers"] = "Content-Type"
-            response.headers["Access-Control-Allow-Methods"] = "GET,PUT,POST,DELETE,OPTIONS"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
+            response.headers.update(CORS_HEADERS)
+            response.headers["Access-Control-Expose-Headers"] = "ETag, Retry-After"
         return response
 
-    # Initialize MongoDB
-    client = MongoClient(app.config['MONGO_URI'])
-    db_name = app.config['MONGO_URI'].split('/')[-1]
-    app.db = client[db_name]
+    # After the preflight short-circuit, so OPTIONS never takes a slot
+    from .utils import admission
+    admission.init_app(app)
+
+    # Initialize MongoDB, or the SQLite storage that stands in for it
+    from .utils.storage import open_storage
+    app.store = open_storage(app.config, event_listeners=[metrics.command_timer])
+
+    # Create whatever indexes are missing; a no-op once the schema is current
+    app.store.migrate()
 
-    # Set up database
-    create_indexes(app.db)
+    # Size the shared sanitized-HTML and cabinet listing caches
+    from .utils import sanitizer, list_cache
+    sanitizer.configure(
+        app.config['SANITIZE_CACHE_MAX_ENTRIES'],
+        app.config['SANITIZE_CACHE_MAX_BYTES']
+    )
+    list_cache.configure(app.config)
+    from .utils import coalescing, content_codec, cabinet_refs
+    coalescing.configure(app.config)
+    content_codec.configure(app.config)
+    cabinet_refs.configure(app.config)
+
+    # Write routes publish to the change feed; with change streams it reads
+    # the database instead and publishing is a no-op
+    from .utils.change_feed import open_change_feed
+    app.changes = open_change_feed(app.store, app.config)
 
     # Register blueprints
-    from .routes import notes, cabinets
+    from .routes import notes, cabinets, calendar, search, system, jobs, revisions, changes, tasks
     app.register_blueprint(notes.bp)
     app.register_blueprint(cabinets.bp)
+    app.register_blueprint(calendar.bp)
+    app.register_blueprint(search.bp)
+    app.register_blueprint(system.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(revisions.bp)
+    app.register_blueprint(changes.bp)
+    app.register_blueprint(tasks.bp)
+
+    # Background jobs persist in storage; any left unfinished by a previous
+    # process are picked up again once every job type is registered
+    from .utils.jobs import JobRunner
+    app.jobs = JobRunner(
+        app.store,
+        max_workers=app.config['JOBS_MAX_WORKERS'],
+        stale_seconds=app.config['JOBS_STALE_SECONDS'],
+        retention_seconds=app.config['JOBS_RETENTION_SECONDS']
+    )
+    app.jobs.resume()
+    if app.config['STATS_RECONCILE_INTERVAL_SECONDS'] > 0:
+        interval = app.config['STATS_RECONCILE_INTERVAL_SECONDS']
+        app.jobs.schedule('reconcile_cabinet_stats', interval_seconds=interval, delay_seconds=min(60, interval))
+
+    # Revisions are recorded off the request path by a background thread
+    from .utils.revisions import RevisionRecorder
+    app.revisions = RevisionRecorder(
+        app.store,
+        app.jobs,
+        enabled=app.config['REVISIONS_ENABLED'],
+        snapshot_every=app.config['REVISIONS_SNAPSHOT_EVERY'],
+        coalesce_seconds=app.config['REVISIONS_COALESCE_SECONDS'],
+        compact_after_seconds=app.config['REVISIONS_COMPACT_AFTER_SECONDS'],
+        compact_bucket_seconds=app.config['REVISIONS_COMPACT_BUCKET_SECONDS'],
+        compact_interval_seconds=app.config['REVISIONS_COMPACT_INTERVAL_SECONDS']
+    )
 
     return app
\ No newline at end of file
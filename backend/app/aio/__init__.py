@@ -0,0 +1,120 @@
+# backend/app/aio/__init__.py
+from quart import Quart, request, make_response
+from pymongo import AsyncMongoClient
+from config import Config
+from .. import CORS_HEADERS
+from ..utils.storage import database_name, open_storage
+from ..utils.jobs import JobRunner
+from ..utils.revisions import RevisionRecorder
+from ..utils.change_feed import open_change_feed
+from ..utils.json_provider import FastJSONProvider
+
+
+def create_async_app(config_class=Config):
+    """ASGI counterpart of create_app serving the same routes.
+
+    Note and cabinet handlers await an async MongoDB client instead of
+    holding a worker thread per request, so one process can keep many more
+    editors in flight. The less frequent calendar, task, revision, search,
+    transfer and system routes run the synchronous storage code on worker
+    threads.
+    """
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+    if app.config['STORAGE_BACKEND'] != 'mongo':
+        # SQLite storage has no async driver; serve it with create_app
+        raise ValueError('The async app requires STORAGE_BACKEND=mongo')
+
+    app.json = FastJSONProvider(app)
+
+    from ..utils import logs, metrics, compression
+    logs.configure_logging(app.config)
+    if app.config['METRICS_ENABLED']:
+        metrics.init_async_app(app)
+    if app.config['COMPRESSION_ENABLED']:
+        compression.init_async_app(app)
+
+    @app.before_request
+    async def handle_preflight():
+        if request.method == "OPTIONS":
+            response = await make_response()
+            response.headers.update(CORS_HEADERS)
+            return response
+
+    @app.after_request
+    async def after_request(response):
+        if request.method != "OPTIONS":
+            response.headers.update(CORS_HEADERS)
+            response.headers["Access-Control-Expose-Headers"] = "ETag, Retry-After"
+        return response
+
+    # After the preflight short-circuit, so OPTIONS never takes a slot
+    from ..utils import admission
+    admission.init_async_app(app)
+
+    db_name = database_name(app.config)
+
+    # Migrations, background jobs and revision recording use synchronous
+    # storage; they run on worker threads and never touch the event loop
+    app.store = open_storage(app.config, event_listeners=[metrics.command_timer])
+    app.store.migrate()
+    app.jobs = JobRunner(
+        app.store,
+        max_workers=app.config['JOBS_MAX_WORKERS'],
+        stale_seconds=app.config['JOBS_STALE_SECONDS'],
+        retention_seconds=app.config['JOBS_RETENTION_SECONDS']
+    )
+    app.revisions = RevisionRecorder(
+        app.store,
+        app.jobs,
+        enabled=app.config['REVISIONS_ENABLED'],
+        snapshot_every=app.config['REVISIONS_SNAPSHOT_EVERY'],
+        coalesce_seconds=app.config['REVISIONS_COALESCE_SECONDS'],
+        compact_after_seconds=app.config['REVISIONS_COMPACT_AFTER_SECONDS'],
+        compact_bucket_seconds=app.config['REVISIONS_COMPACT_BUCKET_SECONDS'],
+        compact_interval_seconds=app.config['REVISIONS_COMPACT_INTERVAL_SECONDS']
+    )
+    # Change streams are read through the async client; the sync one only
+    # finds out whether the deployment supports them
+    app.changes = open_change_feed(app.store, app.config)
+
+    # The async client binds to the serving event loop, so it is opened there
+    @app.before_serving
+    async def connect():
+        app.mongo_client = AsyncMongoClient(
+            app.config['MONGO_URI'], event_listeners=[metrics.command_timer]
+        )
+        app.db = app.mongo_client[db_name]
+        app.jobs.resume()
+        if app.config['STATS_RECONCILE_INTERVAL_SECONDS'] > 0:
+            interval = app.config['STATS_RECONCILE_INTERVAL_SECONDS']
+            app.jobs.schedule('reconcile_cabinet_stats', interval_seconds=interval, delay_seconds=min(60, interval))
+
+    @app.after_serving
+    async def disconnect():
+        await app.mongo_client.close()
+        app.jobs.shutdown(wait=False)
+        app.store.close()
+
+    from ..utils import sanitizer, list_cache, coalescing, content_codec, cabinet_refs
+    sanitizer.configure(
+        app.config['SANITIZE_CACHE_MAX_ENTRIES'],
+        app.config['SANITIZE_CACHE_MAX_BYTES']
+    )
+    list_cache.configure(app.config)
+    coalescing.configure(app.config)
+    content_codec.configure(app.config)
+    cabinet_refs.configure(app.config)
+
+    from . import notes, cabinets, calendar, tasks, revisions, search, jobs, system, changes
+    app.register_blueprint(notes.bp)
+    app.register_blueprint(cabinets.bp)
+    app.register_blueprint(calendar.bp)
+    app.register_blueprint(tasks.bp)
+    app.register_blueprint(revisions.bp)
+    app.register_blueprint(search.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(system.bp)
+    app.register_blueprint(changes.bp)
+
+    return app
@@ -0,0 +1,333 @@
+from quart import Blueprint, request, jsonify, current_app, Response
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from datetime import datetime
+import asyncio
+import logging
+import tempfile
+from ..routes.cabinets import _client_fields
+from ..utils.note_listing import ListingError, parse_listing_args
+from ..utils.versioning import LIVE_CABINET, cabinet_etag, tag_response, version_update
+from ..utils.cabinet_stats import WITHOUT_STATS, cabinet_projection, wants_stats, with_default_stats
+from ..utils.cabinet_purge import soft_delete_filter, soft_delete_update
+from ..utils.cabinet_refs import cabinet_match
+from ..utils.list_cache import get_list_cache
+from ..utils.change_feed import cabinet_update_event
+from ..utils.streaming import NDJSON_MIMETYPE
+from ..utils.tasks import task_counts
+from ..utils.cabinet_transfer import (
+    ARCHIVE_SPOOL_BYTES, ZIP_MIMETYPE, TransferError, export_filename, export_lines, import_notes,
+    open_export, spooled_upload_lines, zip_stream
+)
+from .db import cabinet_version, not_modified, cabinet_listing_response, iterate_in_thread, spool_body
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('cabinets', __name__, url_prefix='/api/cabinets')
+
+@bp.route('', methods=['GET'])
+async def get_cabinets():
+    """Get all cabinets, with their note counters when `with_stats=1`"""
+    try:
+        with_stats = wants_stats(request)
+        cabinets = await current_app.db.cabinets.find(
+            LIVE_CABINET, cabinet_projection(with_stats)
+        ).sort('created_at', -1).to_list(None)
+        if with_stats:
+            cabinets = [with_default_stats(cabinet) for cabinet in cabinets]
+
+        return jsonify(cabinets)
+    except Exception as e:
+        logger.error("Error fetching cabinets: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('', methods=['POST'])
+async def create_cabinet():
+    """Create a new cabinet"""
+    try:
+        cabinet_data = await request.get_json()
+
+        if not cabinet_data or 'name' not in cabinet_data:
+            logger.error("Cabinet name is required")
+            return jsonify({'error': 'Cabinet name is required'}), 400
+
+        cabinet_data = _client_fields(cabinet_data)
+
+        now = datetime.utcnow()
+        cabinet_data['created_at'] = now
+        cabinet_data['updated_at'] = now
+
+        existing = await current_app.db.cabinets.find_one({'name': cabinet_data['name']}, {'_id': 1})
+        if existing:
+            logger.error("Cabinet name already exists")
+            return jsonify({'error': 'A cabinet with this name already exists'}), 409
+
+        # insert_one fills in _id, so the stored document needs no re-read
+        result = await current_app.db.cabinets.insert_one(cabinet_data)
+        new_cabinet = dict(cabinet_data, _id=str(result.inserted_id))
+        current_app.changes.publish(str(result.inserted_id), 'cabinet_created', {'cabinet': new_cabinet})
+
+        return jsonify(new_cabinet), 201
+    except Exception as e:
+        logger.error("Error creating cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/reconcile', methods=['POST'])
+async def reconcile_stats():
+    """Recount every cabinet's notes in a background job and repair counters that drifted"""
+    try:
+        job_id = await asyncio.to_thread(
+            current_app.jobs.submit, 'reconcile_cabinet_stats', key='reconcile_cabinet_stats'
+        )
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error reconciling cabinet stats: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>', methods=['GET'])
+async def get_cabinet(cabinet_id):
+    """Get a specific cabinet, with its note counters when `with_stats=1`"""
+    try:
+        with_stats = wants_stats(request)
+        cabinet = await current_app.db.cabinets.find_one(
+            soft_delete_filter(cabinet_id), cabinet_projection(with_stats)
+        )
+
+        if not cabinet:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        etag = cabinet_etag(cabinet_id, cabinet.get('version', 0), request)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+
+        if with_stats:
+            with_default_stats(cabinet)
+        return tag_response(jsonify(cabinet), etag)
+    except Exception as e:
+        logger.error("Error fetching cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>', methods=['PUT'])
+async def update_cabinet(cabinet_id):
+    """Update a cabinet"""
+    try:
+        cabinet_data = await request.get_json()
+
+        if not cabinet_data or 'name' not in cabinet_data:
+            logger.error("Cabinet name is required")
+            return jsonify({'error': 'Cabinet name is required'}), 400
+
+        existing = await current_app.db.cabinets.find_one({
+            '_id': {'$ne': ObjectId(cabinet_id)},
+            'name': cabinet_data['name']
+        }, {'_id': 1})
+        if existing:
+            logger.error("Cabinet name already exists")
+            return jsonify({'error': 'A cabinet with this name already exists'}), 409
+
+        cabinet_data = _client_fields(cabinet_data)
+        cabinet_data['updated_at'] = datetime.utcnow()
+
+        # The updated cabinet comes back from the write itself
+        updated_cabinet = await current_app.db.cabinets.find_one_and_update(
+            soft_delete_filter(cabinet_id),
+            dict(version_update(), **{'$set': cabinet_data}),
+            projection=WITHOUT_STATS,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if updated_cabinet is None:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+        get_list_cache().invalidate(cabinet_id)
+        current_app.changes.publish(cabinet_id, *cabinet_update_event(cabinet_data))
+
+        return jsonify(updated_cabinet)
+    except Exception as e:
+        logger.error("Error updating cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>', methods=['DELETE'])
+async def delete_cabinet(cabinet_id):
+    """Hide a cabinet immediately and purge its notes in the background"""
+    try:
+        cabinet = await current_app.db.cabinets.find_one(soft_delete_filter(cabinet_id), {'name': 1})
+        if not cabinet:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        result = await current_app.db.cabinets.update_one(
+            soft_delete_filter(cabinet_id), soft_delete_update(cabinet)
+        )
+        get_list_cache().invalidate(cabinet_id)
+        if result.matched_count == 0:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+        current_app.changes.publish(cabinet_id, 'cabinet_deleted', {})
+
+        # The job runner uses a synchronous client, so queueing goes off the loop
+        job_id = await asyncio.to_thread(current_app.jobs.submit, 'purge_cabinet', {
+            'cabinet_id': cabinet_id,
+            'batch_size': current_app.config['JOBS_PURGE_BATCH_SIZE']
+        }, key=f'purge:{cabinet_id}')
+        response = jsonify({'message': 'Cabinet deleted; its notes are being removed', 'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error deleting cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/notes', methods=['GET'])
+async def get_cabinet_notes(cabinet_id):
+    """Get all notes in a cabinet"""
+    try:
+        try:
+            options = parse_listing_args(request.args, current_app.config['NOTES_PAGE_MAX_LIMIT'])
+        except ListingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        response = await cabinet_listing_response(
+            current_app.db, cabinet_id, {'cabinet_id': cabinet_match(cabinet_id)}, options, request,
+            current_app.config['NOTES_STREAM_BATCH_SIZE']
+        )
+        if response is None:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+        return response
+    except Exception as e:
+        logger.error("Error fetching cabinet notes: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/task-counts', methods=['GET'])
+async def get_cabinet_task_counts(cabinet_id):
+    """Open and done task counts per task note of a cabinet and in total"""
+    try:
+        version = await cabinet_version(current_app.db, cabinet_id)
+        if version is None:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        # Every note write bumps the cabinet version, so it tags the counts too
+        etag = cabinet_etag(cabinet_id, version, request)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        notes, totals = await asyncio.to_thread(task_counts, current_app.store, cabinet_id)
+        return tag_response(jsonify(dict(totals, cabinet_id=cabinet_id, notes=notes)), etag)
+    except Exception as e:
+        logger.error("Error counting cabinet tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+# Exports and imports reuse the synchronous transfer code: each export
+# chunk is produced on a worker thread, and an upload is spooled from the
+# event loop before a worker thread parses and writes it
+
+@bp.route('/<cabinet_id>/export', methods=['GET'])
+async def export_cabinet(cabinet_id):
+    """Stream a cabinet and its notes as NDJSON, or as a zip archive with `format=zip`"""
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'zip'):
+            return jsonify({'error': 'format must be ndjson or zip'}), 400
+
+        cabinet = await current_app.db.cabinets.find_one(soft_delete_filter(cabinet_id))
+        if not cabinet:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        chunks = export_lines(
+            current_app.store, cabinet_id, _client_fields(cabinet),
+            current_app.config['NOTES_STREAM_BATCH_SIZE']
+        )
+        if export_format == 'zip':
+            response = Response(iterate_in_thread(zip_stream(chunks)), mimetype=ZIP_MIMETYPE)
+        else:
+            response = Response(iterate_in_thread(chunks), mimetype=NDJSON_MIMETYPE)
+        filename = export_filename(cabinet.get('name'), export_format)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        # A large cabinet can take longer than RESPONSE_TIMEOUT to stream
+        response.timeout = None
+        return response
+    except Exception as e:
+        logger.error("Error exporting cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+def _import_cabinet(store, cabinet_data, records, batch_size):
+    """(id of the new cabinet, import summary), or None when the name is taken"""
+    if store.cabinets.name_taken(cabinet_data['name']):
+        return None
+    cabinet_id = str(store.cabinets.insert(cabinet_data))
+    return cabinet_id, import_notes(store, cabinet_id, records, batch_size)
+
+@bp.route('/import', methods=['POST'])
+async def import_cabinet():
+    """Create a cabinet from an export streamed in the request body"""
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES) as spool:
+            await spool_body(request, spool)
+            try:
+                cabinet_fields, records = await asyncio.to_thread(
+                    open_export, spooled_upload_lines(request.mimetype, spool)
+                )
+            except TransferError as e:
+                return jsonify({'error': str(e)}), 400
+
+            # ?name= imports a second copy next to the original
+            cabinet_data = _client_fields(cabinet_fields)
+            if request.args.get('name'):
+                cabinet_data['name'] = request.args['name']
+            if not isinstance(cabinet_data.get('name'), str) or not cabinet_data['name']:
+                return jsonify({'error': 'Cabinet name is required'}), 400
+
+            now = datetime.utcnow()
+            cabinet_data['created_at'] = now
+            cabinet_data['updated_at'] = now
+            try:
+                imported = await asyncio.to_thread(
+                    _import_cabinet, current_app.store, cabinet_data, records,
+                    current_app.config['IMPORT_BATCH_SIZE']
+                )
+            except TransferError as e:
+                return jsonify({'error': str(e)}), 400
+            if imported is None:
+                return jsonify({'error': 'A cabinet with this name already exists'}), 409
+            cabinet_id, summary = imported
+
+        new_cabinet = await current_app.db.cabinets.find_one(soft_delete_filter(cabinet_id), WITHOUT_STATS)
+        current_app.changes.publish(cabinet_id, 'cabinet_created', {'cabinet': new_cabinet})
+        logger.info("Imported cabinet %s: %s notes", cabinet_id, summary['imported'])
+        return jsonify(dict(summary, cabinet=new_cabinet)), 201
+    except Exception as e:
+        logger.error("Error importing cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/import', methods=['POST'])
+async def import_into_cabinet(cabinet_id):
+    """Append the notes of an export streamed in the request body to a cabinet"""
+    try:
+        if not await current_app.db.cabinets.find_one(soft_delete_filter(cabinet_id), {'_id': 1}):
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES) as spool:
+            await spool_body(request, spool)
+            try:
+                _, records = await asyncio.to_thread(open_export, spooled_upload_lines(request.mimetype, spool))
+                summary = await asyncio.to_thread(
+                    import_notes, current_app.store, cabinet_id, records, current_app.config['IMPORT_BATCH_SIZE']
+                )
+            except TransferError as e:
+                return jsonify({'error': str(e)}), 400
+
+        # One event for the whole import; clients refetch rather than replay it
+        current_app.changes.publish(cabinet_id, 'notes_imported', {'count': summary['imported']})
+        logger.info("Imported %s notes into cabinet %s", summary['imported'], cabinet_id)
+        return jsonify(summary)
+    except Exception as e:
+        logger.error("Error importing notes: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,113 @@
+from quart import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+import asyncio
+import logging
+from ..utils.cabinet_stats import touch_cabinet
+from ..utils.calendar_entries import (
+    CalendarEntryError, load_note, parse_date, serialize_entry, upsert_entry
+)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('calendar', __name__, url_prefix='/api/notes/<note_id>/calendar')
+
+# Calendar entries go through the synchronous storage on a worker thread,
+# with the helpers app.routes.calendar uses
+
+def _save_entry(store, note_object_id, date, content):
+    note = load_note(store, note_object_id)
+    if note:
+        upsert_entry(store, note['_id'], note.get('cabinet_id'), date, content)
+        touch_cabinet(store, note.get('cabinet_id'))
+    return note
+
+def _delete_entry(store, note_object_id, date):
+    """(note, whether the entry existed)"""
+    note = load_note(store, note_object_id)
+    if not note or not store.calendar_entries.delete(note['_id'], date):
+        return note, False
+    touch_cabinet(store, note.get('cabinet_id'))
+    return note, True
+
+@bp.route('', methods=['GET'])
+async def get_entries(note_id):
+    """Get the calendar entries of a note between `from` and `to` (inclusive)"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            start = parse_date(request.args['from'], 'from') if request.args.get('from') else None
+            end = parse_date(request.args['to'], 'to') if request.args.get('to') else None
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note = await asyncio.to_thread(load_note, current_app.store, ObjectId(note_id))
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        entries = await asyncio.to_thread(current_app.store.calendar_entries.list, note['_id'], start, end)
+
+        return jsonify([serialize_entry(entry) for entry in entries])
+    except Exception as e:
+        logger.error("Error fetching calendar entries: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<date>', methods=['PUT'])
+async def put_entry(note_id, date):
+    """Create or replace the entry of a single day"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        entry_data = await request.get_json()
+        if not entry_data or not isinstance(entry_data.get('content'), str):
+            return jsonify({'error': 'content must be a string'}), 400
+
+        try:
+            date = parse_date(date)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note = await asyncio.to_thread(
+            _save_entry, current_app.store, ObjectId(note_id), date, entry_data['content']
+        )
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        return jsonify({'date': date, 'content': entry_data['content']})
+    except Exception as e:
+        logger.error("Error saving calendar entry: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<date>', methods=['DELETE'])
+async def delete_entry(note_id, date):
+    """Remove the entry of a single day"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            date = parse_date(date)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note, deleted = await asyncio.to_thread(_delete_entry, current_app.store, ObjectId(note_id), date)
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+        if not deleted:
+            return jsonify({'error': 'Calendar entry not found'}), 404
+
+        return jsonify({'message': 'Calendar entry deleted successfully'})
+    except Exception as e:
+        logger.error("Error deleting calendar entry: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,128 @@
+from quart import Blueprint, request, jsonify, current_app, Response
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+import asyncio
+import logging
+import time
+from ..routes.changes import resume_token_arg
+from ..utils import metrics
+from ..utils.change_feed import (
+    EVENT_STREAM_MIMETYPE, RETRY_MS, READY, RESET, ChangeEvent, change_event, change_pipeline,
+    resume_token, sse_frame, watch_options
+)
+from ..utils.versioning import LIVE_CABINET
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+# Async counterparts of LocalChangeFeed.listen and MongoChangeFeed.listen:
+# waiting happens on the event loop instead of holding a thread per stream.
+
+async def local_events(feed, cabinet_id, token, timeout):
+    """Events from a LocalChangeFeed; None after each idle `timeout`"""
+    seq, first = feed.start(cabinet_id, token)
+    yield first
+    woken = asyncio.Event()
+    waiter = (asyncio.get_running_loop(), woken)
+    feed.add_waiter(waiter)
+    try:
+        last_sent = time.monotonic()
+        while True:
+            woken.clear()
+            events, seq = feed.poll(cabinet_id, seq)
+            for event in events:
+                yield event
+            if events:
+                last_sent = time.monotonic()
+                continue
+            idle = time.monotonic() - last_sent
+            if idle >= timeout:
+                yield None
+                last_sent = time.monotonic()
+                continue
+            try:
+                await asyncio.wait_for(woken.wait(), timeout - idle)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        feed.remove_waiter(waiter)
+
+
+async def mongo_events(db, cabinet_id, token, timeout):
+    """Events from a change stream on the async client; None after each idle `timeout`"""
+    pipeline = change_pipeline(cabinet_id)
+    first = READY
+    try:
+        stream = await db.watch(pipeline, **watch_options(token, timeout))
+    except OperationFailure as e:
+        if not token:
+            raise
+        logger.info("Cannot resume change stream, resetting: %s", e)
+        first = RESET
+        stream = await db.watch(pipeline, **watch_options(None, timeout))
+
+    try:
+        yield ChangeEvent(resume_token(stream), cabinet_id, first, {'source': 'mongo'})
+        while stream.alive:
+            change = await stream.try_next()
+            if change is None:
+                yield None
+                continue
+            event = change_event(change)
+            if event is not None:
+                yield event
+    finally:
+        await stream.close()
+
+
+async def event_stream(events, max_seconds):
+    """Async event_stream; see app.utils.change_feed.event_stream"""
+    deadline = time.monotonic() + max_seconds
+    metrics.CHANGE_FEED_SUBSCRIBERS.inc()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+        async for event in events:
+            if event is not None:
+                metrics.CHANGE_FEED_EVENTS.inc(event.type)
+            yield sse_frame(event)
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        metrics.CHANGE_FEED_SUBSCRIBERS.dec()
+        await events.aclose()
+
+
+@bp.route('', methods=['GET'])
+async def get_changes():
+    """Stream note and cabinet change events as Server-Sent Events, optionally for one cabinet"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        cabinet_id = request.args.get('cabinet_id') or None
+        if cabinet_id is not None:
+            if not ObjectId.is_valid(cabinet_id):
+                return jsonify({'error': 'Invalid cabinet ID format'}), 400
+            if not await current_app.db.cabinets.find_one(dict(LIVE_CABINET, _id=ObjectId(cabinet_id)), {'_id': 1}):
+                return jsonify({'error': 'Cabinet not found'}), 404
+
+        token = resume_token_arg(request)
+        heartbeat = current_app.config['CHANGE_FEED_HEARTBEAT_SECONDS']
+        if current_app.changes.source == 'mongo':
+            events = mongo_events(current_app.db, cabinet_id, token, heartbeat)
+        else:
+            events = local_events(current_app.changes, cabinet_id, token, heartbeat)
+
+        response = Response(
+            event_stream(events, current_app.config['CHANGE_FEED_MAX_SECONDS']),
+            mimetype=EVENT_STREAM_MIMETYPE
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        # Quart otherwise cuts streamed bodies off after RESPONSE_TIMEOUT
+        response.timeout = None
+        return response
+    except Exception as e:
+        logger.error("Error opening change feed: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,186 @@
+# backend/app/aio/db.py
+import asyncio
+import logging
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from quart import Response, jsonify
+from ..utils.mongo_storage import entry_upserts, other_dates_filter
+from ..utils.list_cache import get_list_cache
+from ..utils import coalescing, ordering
+from ..utils.note_listing import find_notes, split_page, is_paginated
+from ..utils.ordering import ORDER_STEP, order_block
+from ..utils.streaming import NDJSON_MIMETYPE, wants_stream
+from ..utils.json_provider import dumps_bytes
+from ..utils.versioning import LIVE_CABINET, cabinet_etag, request_variant, tag_response, version_update
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the MongoDB-facing helpers in app.utils. Query
+# building, validation and serialization are shared; only the round trips
+# differ, and independent ones are issued concurrently.
+
+async def bump_cabinet_version(db, cabinet_id, stats=None):
+    """Async bump_cabinet_version; must run after the mutation it records"""
+    if not cabinet_id or not ObjectId.is_valid(cabinet_id):
+        return
+    await db.cabinets.update_one({'_id': ObjectId(cabinet_id)}, version_update(stats))
+    get_list_cache().invalidate(cabinet_id)
+
+
+async def cabinet_version(db, cabinet_id):
+    """Current version of a cabinet, or None when it does not exist"""
+    if not cabinet_id or not ObjectId.is_valid(cabinet_id):
+        return None
+    cabinet = await db.cabinets.find_one(dict(LIVE_CABINET, _id=ObjectId(cabinet_id)), {'version': 1})
+    if not cabinet:
+        return None
+    return cabinet.get('version', 0)
+
+
+def not_modified(request, etag):
+    """304 response when the client already holds `etag`, otherwise None"""
+    if request.if_none_match.contains_weak(etag):
+        return tag_response(Response('', status=304), etag)
+    return None
+
+
+async def allocate_order(db, store, cabinet_id):
+    """Reserve the next order value at the end of a cabinet, see ordering.allocate_order"""
+    orders = await allocate_orders(db, store, cabinet_id, 1)
+    return orders[0] if orders else None
+
+
+async def allocate_orders(db, store, cabinet_id, count):
+    """Reserve `count` consecutive orders in one `$inc`, see ordering.allocate_orders"""
+    cabinet = await db.cabinets.find_one_and_update(
+        dict(LIVE_CABINET, _id=ObjectId(cabinet_id), last_order={'$exists': True}),
+        {'$inc': {'last_order': ORDER_STEP * count}},
+        projection={'last_order': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if cabinet:
+        return order_block(cabinet['last_order'], count)
+    # A cabinet without the counter is seeded once, on its first create; that
+    # and unknown cabinets take the synchronous path on a worker thread
+    return await asyncio.to_thread(ordering.allocate_orders, store, cabinet_id, count)
+
+
+async def raise_order_floor(db, cabinet_id, order):
+    """Make sure orders allocated later land after `order`"""
+    await db.cabinets.update_one(
+        {'_id': ObjectId(cabinet_id), 'last_order': {'$exists': True}},
+        {'$max': {'last_order': order}}
+    )
+
+
+async def replace_entries(db, note_object_id, cabinet_id, normalized):
+    """Make the stored entries of a note match a normalized calendarData array"""
+    operations = entry_upserts(note_object_id, cabinet_id, normalized)
+    # The upserts and the delete touch disjoint dates, so they can overlap
+    writes = [db.calendar_entries.delete_many(other_dates_filter(note_object_id, normalized))]
+    if operations:
+        writes.append(db.calendar_entries.bulk_write(operations, ordered=False))
+    await asyncio.gather(*writes)
+
+
+async def stream_documents(cursor, batch_size):
+    """Yield one NDJSON chunk per cursor batch so only a batch is held in memory"""
+    lines = []
+    try:
+        async for doc in cursor:
+            lines.append(dumps_bytes(doc))
+            if len(lines) >= batch_size:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
+    except Exception as e:
+        # Headers are already sent, so the best we can do is end the stream early
+        logger.error("Error while streaming documents: %s", e)
+    finally:
+        await cursor.close()
+
+
+async def iterate_in_thread(chunks):
+    """Yield the chunks of a blocking generator, each one produced on a worker thread"""
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        await asyncio.to_thread(chunks.close)
+
+
+async def spool_body(request, spool):
+    """Copy a streamed request body into a file, without holding it all in memory"""
+    async for chunk in request.body:
+        spool.write(chunk)
+
+
+def ndjson_response(cursor, batch_size):
+    """Wrap an async cursor in a chunked NDJSON response"""
+    response = Response(stream_documents(cursor, batch_size), mimetype=NDJSON_MIMETYPE)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+async def fetch_notes(collection, query, options):
+    """Run a listing query, returning the notes and the cursor for the following page"""
+    limit = options['limit']
+    if limit is None:
+        return await find_notes(collection, query, options).to_list(None), None
+
+    # Fetch one extra document to know whether another page exists
+    notes = await find_notes(collection, query, dict(options, limit=limit + 1)).to_list(None)
+    return split_page(notes, limit)
+
+
+async def listing_response(collection, query, options, stream=False, batch_size=None):
+    """Render a note listing as a JSON array, a paginated page or an NDJSON stream"""
+    if stream:
+        return ndjson_response(find_notes(collection, query, options, batch_size), batch_size)
+
+    notes, next_cursor = await fetch_notes(collection, query, options)
+    if is_paginated(options):
+        return jsonify({'notes': notes, 'next_cursor': next_cursor})
+    return jsonify(notes)
+
+
+async def cabinet_listing_response(db, cabinet_id, query, options, request, batch_size):
+    """Serve a cabinet-scoped listing through the list cache and ETag checks.
+
+    Same contract as note_listing.cabinet_listing_response; the version read
+    stays ahead of the listing so a body is never tagged newer than it is.
+    """
+    cache = get_list_cache()
+    stream = wants_stream(request)
+    variant = request_variant(request)
+
+    generation = cache.generation(cabinet_id)
+    version = await cabinet_version(db, cabinet_id)
+    if version is None:
+        return None
+
+    etag = cabinet_etag(cabinet_id, version, request)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    if not stream:
+        cached = cache.get(cabinet_id, variant, etag)
+        if cached is not None:
+            return tag_response(Response(cached.body, mimetype=cached.mimetype), etag)
+
+    if stream:
+        return tag_response(await listing_response(db.notes, query, options, stream, batch_size), etag)
+
+    async def render():
+        response = await listing_response(db.notes, query, options, stream, batch_size)
+        body = await response.get_data()
+        cache.put(cabinet_id, variant, etag, body, response.mimetype, generation)
+        return body, response.mimetype
+
+    body, mimetype = await coalescing.async_listings.do((cabinet_id, variant, version), render)
+    return tag_response(Response(body, mimetype=mimetype), etag)
@@ -0,0 +1,56 @@
+from quart import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+import logging
+from ..routes.jobs import MAX_JOB_LISTING
+from ..utils.jobs import JOB_TYPES, JOBS_COLLECTION, serialize_job
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+@bp.route('', methods=['GET'])
+async def get_jobs():
+    """List recent jobs, optionally filtered by type and status"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        query = {}
+        job_type = request.args.get('type')
+        if job_type:
+            if job_type not in JOB_TYPES:
+                return jsonify({'error': f'Unknown job type: {job_type}'}), 400
+            query['type'] = job_type
+        status = request.args.get('status')
+        if status:
+            query['status'] = status
+
+        try:
+            limit = min(int(request.args.get('limit', 20)), MAX_JOB_LISTING)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        jobs = await current_app.db[JOBS_COLLECTION].find(query).sort(
+            'created_at', -1
+        ).limit(max(limit, 1)).to_list(None)
+        return jsonify([serialize_job(job) for job in jobs])
+    except Exception as e:
+        logger.error("Error listing jobs: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Status, progress and result of a background job"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        job = None
+        if ObjectId.is_valid(job_id):
+            job = await current_app.db[JOBS_COLLECTION].find_one({'_id': ObjectId(job_id)})
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(serialize_job(job))
+    except Exception as e:
+        logger.error("Error fetching job: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,424 @@
+from quart import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, BulkWriteError
+import asyncio
+import logging
+from ..utils.note_listing import (
+    ListingError, parse_listing_args, strip_internal_fields, build_projection
+)
+from ..utils.note_patch import PatchError, NotePatch, version_filter
+from ..utils.note_move import MoveError, NoteMove, OrderUpdate
+from ..utils.streaming import wants_stream
+from ..utils.cabinet_refs import cabinet_key, cabinet_match, cabinet_ref
+from ..utils.calendar_entries import CalendarEntryError
+from ..utils.note_writes import EXISTING_NOTE_FIELDS, prepare_new_note, build_put_update
+from ..utils.note_batch import BatchError, NoteBatch, parse_batch
+from ..utils.mongo_storage import mongo_requests, update_requests
+from ..utils.revisions import REVISIONS_COLLECTION
+from ..utils.change_feed import note_created_event, note_update_event, publish_events
+from ..utils.ordering import rebalance_cabinet, schedule_rebalance
+from ..utils.cabinet_stats import STATS_NOTE_FIELDS, note_footprint, stats_change, updated_footprint
+from .db import (
+    bump_cabinet_version, allocate_order, allocate_orders, raise_order_floor,
+    replace_entries, listing_response, cabinet_listing_response
+)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('notes', __name__, url_prefix='/api/notes')
+
+@bp.route('', methods=['GET'])
+async def get_notes():
+    """Get all notes, optionally filtered by cabinet"""
+    try:
+        if not hasattr(current_app, 'db'):
+            logger.error("Database not initialized")
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        cabinet_id = request.args.get('cabinet_id')
+        query = {}
+        if cabinet_id:
+            query['cabinet_id'] = cabinet_match(cabinet_id)
+
+        try:
+            options = parse_listing_args(request.args, current_app.config['NOTES_PAGE_MAX_LIMIT'])
+        except ListingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        batch_size = current_app.config['NOTES_STREAM_BATCH_SIZE']
+
+        if cabinet_id:
+            response = await cabinet_listing_response(
+                current_app.db, cabinet_id, query, options, request, batch_size
+            )
+            if response is not None:
+                return response
+
+        return await listing_response(
+            current_app.db.notes, query, options,
+            stream=wants_stream(request),
+            batch_size=batch_size
+        )
+    except Exception as e:
+        logger.error("Server error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('', methods=['POST'])
+async def create_note():
+    """Create a new note"""
+    note_data = await request.get_json()
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not note_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        cabinet_id = note_data.get('cabinet_id')
+        if not cabinet_id:
+            return jsonify({'error': 'cabinet_id is required'}), 400
+
+        if not ObjectId.is_valid(cabinet_id):
+            logger.error("Invalid cabinet ID format: %s", cabinet_id)
+            return jsonify({'error': 'Invalid cabinet ID format'}), 400
+
+        # Reserving the order (which also checks the cabinet exists) and
+        # sanitizing the content do not depend on each other
+        try:
+            order, calendar_entries = await asyncio.gather(
+                allocate_order(current_app.db, current_app.store, cabinet_id),
+                asyncio.to_thread(prepare_new_note, note_data)
+            )
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+        if order is None:
+            return jsonify({'error': 'Cabinet not found'}), 404
+        note_data['order'] = order
+        note_data['cabinet_id'] = cabinet_ref(cabinet_id)
+
+        # insert_one fills in _id, so the stored document needs no re-read
+        result = await current_app.db.notes.insert_one(note_data)
+        if calendar_entries:
+            await replace_entries(current_app.db, result.inserted_id, cabinet_id, calendar_entries)
+        await bump_cabinet_version(current_app.db, cabinet_id, stats_change(after=note_footprint(note_data)))
+        current_app.revisions.record(result.inserted_id)
+
+        inserted_note = dict(note_data, _id=str(result.inserted_id))
+        strip_internal_fields(inserted_note)
+        current_app.changes.publish(cabinet_id, *note_created_event(inserted_note))
+        return jsonify(inserted_note), 201
+
+    except Exception as e:
+        logger.error("Error creating note: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<note_id>', methods=['PUT'])
+async def update_note(note_id):
+    """Update a note"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        note_data = await request.get_json()
+        if not note_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        try:
+            object_id = ObjectId(note_id)
+        except Exception:
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        existing_note = await current_app.db.notes.find_one({'_id': object_id}, EXISTING_NOTE_FIELDS)
+        if not existing_note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        # Building the update may sanitize content, so it runs off the event loop
+        try:
+            update, calendar_entries = await asyncio.to_thread(
+                build_put_update, existing_note, note_data
+            )
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # The updated note comes back from the write itself
+        updated_note = await current_app.db.notes.find_one_and_update(
+            {'_id': object_id},
+            update,
+            projection=build_projection(None),
+            return_document=ReturnDocument.AFTER
+        )
+        if updated_note is None:
+            return jsonify({'error': 'Note not found'}), 404
+        cabinet_id = cabinet_key(existing_note['cabinet_id'])
+        if calendar_entries is not None:
+            await replace_entries(current_app.db, object_id, cabinet_id, calendar_entries)
+        before = note_footprint(existing_note)
+        await bump_cabinet_version(
+            current_app.db, cabinet_id,
+            stats_change(before, updated_footprint(before, update['$set']))
+        )
+        current_app.revisions.record(object_id)
+        current_app.changes.publish(cabinet_id, *note_update_event(
+            object_id, updated_note.get('version'), update['$set']
+        ))
+
+        return jsonify(updated_note)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+async def _version_conflict(object_id):
+    """409 with the note's current version, or 404 if it no longer exists"""
+    current = await current_app.db.notes.find_one({'_id': object_id}, {'version': 1})
+    if not current:
+        return jsonify({'error': 'Note not found'}), 404
+    return jsonify({'error': 'Version conflict', 'version': current.get('version', 0)}), 409
+
+@bp.route('/<note_id>', methods=['PATCH'])
+async def patch_note(note_id):
+    """Apply text deltas or JSON-patch operations to a note at a base version"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        patch_data = await request.get_json()
+        if not patch_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        try:
+            object_id = ObjectId(note_id)
+        except Exception:
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            patch = NotePatch(patch_data)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+
+        guard = version_filter(object_id, patch.base_version)
+        base = None
+        projection = patch.base_projection()
+        if projection is not None:
+            base = await current_app.db.notes.find_one(guard, projection)
+            if base is None:
+                return await _version_conflict(object_id)
+        # Resolving may sanitize content, so it runs off the event loop
+        try:
+            await asyncio.to_thread(patch.resolve, base)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            updated_note = await current_app.db.notes.find_one_and_update(
+                guard,
+                patch.update(),
+                projection=patch.result_projection(),
+                return_document=ReturnDocument.AFTER
+            )
+        except OperationFailure as e:
+            return jsonify({'error': f'Patch could not be applied: {str(e)}'}), 400
+
+        if updated_note is None:
+            return await _version_conflict(object_id)
+        search_update = patch.search_update(updated_note)
+        if search_update:
+            await current_app.db.notes.update_one(
+                {'_id': object_id, 'version': updated_note['version']}, search_update
+            )
+        cabinet_id = cabinet_key(updated_note.pop('cabinet_id', None))
+        await bump_cabinet_version(current_app.db, cabinet_id, patch.stats_change())
+        current_app.revisions.record(object_id)
+        current_app.changes.publish(cabinet_id, *patch.change_event(object_id, updated_note))
+
+        return jsonify(patch.response(updated_note))
+
+    except Exception as e:
+        logger.error("Error patching note: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<note_id>', methods=['DELETE'])
+async def delete_note(note_id):
+    """Delete a note"""
+    try:
+        if not hasattr(current_app, 'db'):
+            logger.error("Database not initialized")
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        deleted_note = await current_app.db.notes.find_one_and_delete(
+            {'_id': ObjectId(note_id)},
+            projection=dict(STATS_NOTE_FIELDS, cabinet_id=1)
+        )
+        if deleted_note is None:
+            return jsonify({'error': 'Note not found'}), 404
+
+        # Calendar entries and revisions are not part of any cached listing,
+        # so their cleanup can overlap with the version bump
+        cabinet_id = cabinet_key(deleted_note.get('cabinet_id'))
+        await asyncio.gather(
+            current_app.db.calendar_entries.delete_many({'note_id': deleted_note['_id']}),
+            current_app.db[REVISIONS_COLLECTION].delete_many({'note_id': deleted_note['_id']}),
+            bump_cabinet_version(
+                current_app.db, cabinet_id, stats_change(before=note_footprint(deleted_note))
+            )
+        )
+        # With change streams this records the delete in MongoDB
+        await asyncio.to_thread(
+            current_app.changes.publish, cabinet_id, 'note_deleted', {'_id': deleted_note['_id']}
+        )
+
+        return jsonify({'message': 'Note deleted successfully'}), 200
+    except Exception as e:
+        logger.error("Server error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batch-update-order', methods=['POST'])
+async def batch_update_order():
+    """Update the order of multiple notes atomically"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        try:
+            reorder = OrderUpdate(await request.get_json())
+            cabinet_id = reorder.check(await current_app.db.notes.find(
+                {'_id': {'$in': reorder.note_ids}}, {'cabinet_id': 1}
+            ).to_list(None))
+        except MoveError as e:
+            return jsonify({'error': str(e)}), e.status
+
+        await current_app.db.notes.bulk_write(update_requests(reorder.updates()), ordered=False)
+
+        # Everything after the bulk write only depends on the write itself
+        updated_notes, _, _ = await asyncio.gather(
+            current_app.db.notes.find(
+                {'_id': {'$in': reorder.note_ids}}, build_projection(None)
+            ).sort('order', 1).to_list(None),
+            raise_order_floor(current_app.db, cabinet_id, reorder.max_order),
+            bump_cabinet_version(current_app.db, cabinet_id)
+        )
+        current_app.changes.publish(cabinet_id, *reorder.change_event())
+
+        return jsonify(updated_notes)
+
+    except Exception as e:
+        logger.error("Error in batch order update: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batch', methods=['POST'])
+async def batch_notes():
+    """Apply a batch of creates, updates and deletes with a single bulk_write"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        try:
+            ordered, operations = parse_batch(
+                await request.get_json(silent=True), current_app.config['NOTES_BATCH_MAX_OPS']
+            )
+        except BatchError as e:
+            return jsonify({'error': str(e), 'errors': e.errors}), 400
+
+        db = current_app.db
+        batch = NoteBatch(operations, ordered)
+
+        # The existing-note read and each cabinet's order reservation are independent
+        async def read_existing():
+            if not batch.note_ids():
+                return {}
+            return {
+                note['_id']: note
+                async for note in db.notes.find(
+                    {'_id': {'$in': batch.note_ids()}}, batch.existing_projection()
+                )
+            }
+
+        counts = batch.create_counts()
+        existing, *blocks = await asyncio.gather(
+            read_existing(),
+            *(allocate_orders(db, current_app.store, cabinet_id, count) for cabinet_id, count in counts.items())
+        )
+        requests = mongo_requests(await asyncio.to_thread(
+            batch.build_writes, existing, dict(zip(counts, blocks))
+        ))
+
+        write_errors = []
+        if requests:
+            try:
+                await db.notes.bulk_write(requests, ordered=ordered)
+            except BulkWriteError as e:
+                write_errors = e.details.get('writeErrors', [])
+        batch.record_write(write_errors)
+
+        updated_ids = batch.updated_ids()
+        if updated_ids:
+            batch.verify({
+                note['_id']: note.get('version', 0)
+                async for note in db.notes.find({'_id': {'$in': updated_ids}}, {'version': 1})
+            })
+
+        # Side effects of the applied operations are independent of each other
+        deleted_ids = batch.deleted_ids()
+        side_effects = [
+            replace_entries(db, object_id, cabinet_id, entries)
+            for object_id, cabinet_id, entries in batch.calendar_writes()
+        ]
+        if deleted_ids:
+            side_effects.append(db.calendar_entries.delete_many({'note_id': {'$in': deleted_ids}}))
+            side_effects.append(db[REVISIONS_COLLECTION].delete_many({'note_id': {'$in': deleted_ids}}))
+        await asyncio.gather(*side_effects)
+        stats = batch.stats_changes()
+        await asyncio.gather(*(
+            bump_cabinet_version(db, cabinet_id, stats.get(cabinet_id))
+            for cabinet_id in batch.touched_cabinets()
+        ))
+        current_app.revisions.record(*batch.written_ids())
+        await asyncio.to_thread(publish_events, current_app.changes, batch.change_events())
+
+        return jsonify(batch.response())
+
+    except Exception as e:
+        logger.error("Error in note batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<note_id>/move', methods=['POST'])
+async def move_note(note_id):
+    """Move a note between two neighbours, writing only the moved note"""
+    try:
+        if not hasattr(current_app, 'db'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        try:
+            move = NoteMove(note_id, await request.get_json() or {})
+            cabinet_id = move.check(await current_app.db.notes.find(
+                {'_id': {'$in': move.note_ids}}, {'order': 1, 'cabinet_id': 1}
+            ).to_list(None))
+        except MoveError as e:
+            return jsonify({'error': str(e)}), e.status
+
+        if move.to_end:
+            new_order = await allocate_order(current_app.db, current_app.store, cabinet_id)
+        else:
+            new_order = move.new_order()
+            if new_order is None:
+                # Renumbering a whole cabinet is rare and long, so it runs on a worker thread
+                await asyncio.to_thread(rebalance_cabinet, current_app.store, cabinet_id)
+                move.refresh(await current_app.db.notes.find(
+                    {'_id': {'$in': move.note_ids}}, {'order': 1}
+                ).to_list(None))
+                new_order = move.new_order()
+            elif move.wants_rebalance():
+                await asyncio.to_thread(schedule_rebalance, current_app.jobs, cabinet_id)
+
+        await current_app.db.notes.update_one(
+            {'_id': ObjectId(note_id)},
+            {'$set': {'order': new_order}}
+        )
+        await bump_cabinet_version(current_app.db, cabinet_id)
+        current_app.changes.publish(cabinet_id, *move.change_event(new_order))
+
+        return jsonify(move.response(new_order))
+
+    except Exception as e:
+        logger.error("Error moving note: %s", e)
+        return jsonify({'error': str(e)}), 500
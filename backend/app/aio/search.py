@@ -0,0 +1,58 @@
+from quart import Blueprint, request, jsonify, current_app
+import asyncio
+import logging
+from ..utils.search_text import search_page
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('search', __name__, url_prefix='/api/search')
+
+@bp.route('', methods=['GET'])
+async def search_notes():
+    """Ranked full-text search over note titles, content, tasks and calendar entries"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        search = (request.args.get('q') or '').strip()
+        if not search:
+            return jsonify({'error': 'q is required'}), 400
+
+        try:
+            limit = int(request.args.get('limit', 20))
+            offset = int(request.args.get('offset', 0))
+        except ValueError:
+            return jsonify({'error': 'limit and offset must be integers'}), 400
+        if limit < 1 or offset < 0:
+            return jsonify({'error': 'limit must be positive and offset non-negative'}), 400
+        limit = min(limit, current_app.config['SEARCH_MAX_LIMIT'])
+
+        cabinet_id = request.args.get('cabinet_id') or None
+
+        # The search runs through the synchronous storage on a worker thread
+        return jsonify(await asyncio.to_thread(search_page, current_app.store, search, cabinet_id, limit, offset))
+    except Exception as e:
+        logger.error("Error searching notes: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/reindex', methods=['POST'])
+async def reindex():
+    """Rebuild the derived search fields in a background job, e.g. for notes written before search existed"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        params = {}
+        cabinet_id = request.args.get('cabinet_id')
+        if cabinet_id:
+            params['cabinet_id'] = cabinet_id
+
+        job_id = await asyncio.to_thread(
+            current_app.jobs.submit, 'reindex_notes', params, key=f"reindex:{cabinet_id or '*'}"
+        )
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error reindexing notes: %s", e)
+        return jsonify({'error': str(e)}), 500
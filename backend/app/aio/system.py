@@ -0,0 +1,77 @@
+from quart import Blueprint, request, jsonify, current_app
+import asyncio
+import logging
+from ..utils.list_cache import get_list_cache
+from ..utils import sanitizer
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('system', __name__, url_prefix='/api/system')
+
+async def _submit(job_type, params=None):
+    """202 response for a background job, submitted on a worker thread"""
+    job_id = await asyncio.to_thread(current_app.jobs.submit, job_type, params, key=job_type)
+    response = jsonify({'job_id': job_id})
+    response.headers['Location'] = f'/api/jobs/{job_id}'
+    return response, 202
+
+@bp.route('/cache', methods=['GET'])
+async def get_cache_stats():
+    """Hit, miss and eviction counters for the in-process caches"""
+    return jsonify({
+        'list_cache': get_list_cache().stats(),
+        'sanitizer': sanitizer.cache_stats()
+    })
+
+@bp.route('/migrations', methods=['GET'])
+async def get_migrations():
+    """Applied and pending schema migrations"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        applied, pending = await asyncio.to_thread(current_app.store.migration_status)
+        return jsonify({'applied': applied, 'pending': pending})
+    except Exception as e:
+        logger.error("Error listing migrations: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/calendar', methods=['POST'])
+async def migrate_calendar():
+    """Move inline calendarData arrays into the calendar_entries collection in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        return await _submit('migrate_calendar_data')
+    except Exception as e:
+        logger.error("Error migrating calendar data: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/compress-content', methods=['POST'])
+async def migrate_content_compression():
+    """Rewrite stored note content to the current compression settings in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        # ?decompress=1 writes everything back as plain text, before turning compression off
+        decompress = request.args.get('decompress', '').lower() in ('1', 'true', 'yes')
+        return await _submit('compress_note_content', {'decompress': decompress})
+    except Exception as e:
+        logger.error("Error migrating note content compression: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/cabinet-ids', methods=['POST'])
+async def migrate_cabinet_ids():
+    """Backfill note and calendar entry cabinet_ids in the CABINET_ID_FORMAT form in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        # ?to_strings=1 writes ObjectIds back as strings, after switching the format back
+        to_strings = request.args.get('to_strings', '').lower() in ('1', 'true', 'yes')
+        return await _submit('migrate_cabinet_refs', {'to_strings': to_strings})
+    except Exception as e:
+        logger.error("Error migrating cabinet ids: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -1,13 +1,33 @@
-from flask import Blueprint, request, jsonify, current_app, make_response
-from bson.objectid import ObjectId
+from flask import Blueprint, request, jsonify, current_app, make_response, Response
 from datetime import datetime
 import logging
+from ..utils.note_listing import ListingError, parse_listing_args, cabinet_listing_response
+from ..utils.versioning import (
+    cabinet_etag, cabinet_version, not_modified, tag_response, version_update
+)
+from ..utils.cabinet_stats import (
+    STATS_FIELD, WITHOUT_STATS, cabinet_projection, wants_stats, with_default_stats
+)
+from ..utils.cabinet_purge import soft_delete_update
+from ..utils.list_cache import get_list_cache
+from ..utils.change_feed import cabinet_update_event
+from ..utils.streaming import NDJSON_MIMETYPE
+from ..utils.tasks import task_counts
+from ..utils.cabinet_transfer import (
+    ZIP_MIMETYPE, TransferError, export_filename, export_lines, import_notes, open_export,
+    upload_lines, zip_stream
+)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('cabinets', __name__, url_prefix='/api/cabinets')
 
+# Cabinet fields maintained by the server that clients may not overwrite
+SERVER_FIELDS = ('_id', 'version', 'last_order', 'deleted_at', 'deleted_name', STATS_FIELD)
+
+def _client_fields(cabinet_data):
+    return {k: v for k, v in cabinet_data.items() if k not in SERVER_FIELDS}
+
 @bp.route('', methods=['OPTIONS'])
 def handle_options():
     response = make_response()
@@ -20,24 +40,21 @@ def handle_options():
 
 @bp.route('', methods=['GET'])
 def get_cabinets():
-    """Get all cabinets"""
-    logger.debug("GET /api/cabinets endpoint called")
+    """Get all cabinets, with their note counters when `with_stats=1`"""
     try:
-        cabinets = list(current_app.db.cabinets.find().sort('created_at', -1))
-        
-        # Convert ObjectId to string for JSON serialization
-        for cabinet in cabinets:
-            cabinet['_id'] = str(cabinet['_id'])
+        with_stats = wants_stats(request)
+        cabinets = current_app.store.cabinets.list(cabinet_projection(with_stats))
+        if with_stats:
+            cabinets = [with_default_stats(cabinet) for cabinet in cabinets]
         
         return jsonify(cabinets)
     except Exception as e:
-        logger.error(f"Error fetching cabinets: {str(e)}")
+        logger.error("Error fetching cabinets: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('', methods=['POST'])
 def create_cabinet():
     """Create a new cabinet"""
-    logger.debug("POST /api/cabinets endpoint called")
     try:
         cabinet_data = request.json
         
@@ -45,50 +62,70 @@ def create_cabinet():
             logger.error("Cabinet name is required")
             return jsonify({'error': 'Cabinet name is required'}), 400
             
+        cabinet_data = _client_fields(cabinet_data)
+
         # Add timestamps
         now = datetime.utcnow()
         cabinet_data['created_at'] = now
         cabinet_data['updated_at'] = now
         
         # Check for duplicate names
-        existing = current_app.db.cabinets.find_one({'name': cabinet_data['name']})
-        if existing:
+        if current_app.store.cabinets.name_taken(cabinet_data['name']):
             logger.error("Cabinet name already exists")
             return jsonify({'error': 'A cabinet with this name already exists'}), 409
             
-        result = current_app.db.cabinets.insert_one(cabinet_data)
+        inserted_id = current_app.store.cabinets.insert(cabinet_data)
         
         # Get the created cabinet
-        new_cabinet = current_app.db.cabinets.find_one({'_id': result.inserted_id})
-        new_cabinet['_id'] = str(new_cabinet['_id'])
-        logger.debug(f"Created new cabinet: {new_cabinet}")
+        new_cabinet = current_app.store.cabinets.get(inserted_id)
+        current_app.changes.publish(str(inserted_id), 'cabinet_created', {'cabinet': new_cabinet})
         
         return jsonify(new_cabinet), 201
     except Exception as e:
-        logger.error(f"Error creating cabinet: {str(e)}")
+        logger.error("Error creating cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/stats/reconcile', methods=['POST'])
+def reconcile_stats():
+    """Recount every cabinet's notes in a background job and repair counters that drifted"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        job_id = current_app.jobs.submit('reconcile_cabinet_stats', key='reconcile_cabinet_stats')
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error reconciling cabinet stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<cabinet_id>', methods=['GET'])
 def get_cabinet(cabinet_id):
-    """Get a specific cabinet"""
-    logger.debug(f"GET /api/cabinets/{cabinet_id} endpoint called")
+    """Get a specific cabinet, with its note counters when `with_stats=1`"""
     try:
-        cabinet = current_app.db.cabinets.find_one({'_id': ObjectId(cabinet_id)})
+        with_stats = wants_stats(request)
+        cabinet = current_app.store.cabinets.get(cabinet_id, cabinet_projection(with_stats))
         
         if not cabinet:
-            logger.error(f"Cabinet not found: {cabinet_id}")
+            logger.error("Cabinet not found: %s", cabinet_id)
             return jsonify({'error': 'Cabinet not found'}), 404
+
+        etag = cabinet_etag(cabinet_id, cabinet.get('version', 0), request)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
             
-        cabinet['_id'] = str(cabinet['_id'])
-        return jsonify(cabinet)
+        if with_stats:
+            with_default_stats(cabinet)
+        return tag_response(jsonify(cabinet), etag)
     except Exception as e:
-        logger.error(f"Error fetching cabinet: {str(e)}")
+        logger.error("Error fetching cabinet: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<cabinet_id>', methods=['PUT'])
 def update_cabinet(cabinet_id):
     """Update a cabinet"""
-    logger.debug(f"PUT /api/cabinets/{cabinet_id} endpoint called")
     try:
         cabinet_data = request.json
         
@@ -97,83 +134,190 @@ def update_cabinet(cabinet_id):
             return jsonify({'error': 'Cabinet name is required'}), 400
             
         # Check for duplicate names excluding current cabinet
-        existing = current_app.db.cabinets.find_one({
-            '_id': {'$ne': ObjectId(cabinet_id)},
-            'name': cabinet_data['name']
-        })
-        if existing:
+        if current_app.store.cabinets.name_taken(cabinet_data['name'], exclude_id=cabinet_id):
             logger.error("Cabinet name already exists")
             return jsonify({'error': 'A cabinet with this name already exists'}), 409
             
         # Update timestamp
+        cabinet_data = _client_fields(cabinet_data)
         cabinet_data['updated_at'] = datetime.utcnow()
         
-        result = current_app.db.cabinets.update_one(
-            {'_id': ObjectId(cabinet_id)},
-            {'$set': cabinet_data}
+        updated = current_app.store.cabinets.update(
+            cabinet_id, dict(version_update(), **{'$set': cabinet_data}), include_deleted=False
         )
         
-        if result.matched_count == 0:
-            logger.error(f"Cabinet not found: {cabinet_id}")
+        if not updated:
+            logger.error("Cabinet not found: %s", cabinet_id)
             return jsonify({'error': 'Cabinet not found'}), 404
+        get_list_cache().invalidate(cabinet_id)
+        current_app.changes.publish(cabinet_id, *cabinet_update_event(cabinet_data))
             
         # Get updated cabinet
-        updated_cabinet = current_app.db.cabinets.find_one({'_id': ObjectId(cabinet_id)})
-        updated_cabinet['_id'] = str(updated_cabinet['_id'])
-        logger.debug(f"Updated cabinet: {updated_cabinet}")
+        updated_cabinet = current_app.store.cabinets.get(cabinet_id, WITHOUT_STATS, include_deleted=True)
         
         return jsonify(updated_cabinet)
     except Exception as e:
-        logger.error(f"Error updating cabinet: {str(e)}")
+        logger.error("Error updating cabinet: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<cabinet_id>', methods=['DELETE'])
 def delete_cabinet(cabinet_id):
-    """Delete a cabinet and optionally its notes"""
-    logger.debug(f"DELETE /api/cabinets/{cabinet_id} endpoint called")
+    """Hide a cabinet immediately and purge its notes in the background"""
     try:
-        # Check if cabinet exists
-        cabinet = current_app.db.cabinets.find_one({'_id': ObjectId(cabinet_id)})
+        cabinet = current_app.store.cabinets.get(cabinet_id, {'name': 1})
         if not cabinet:
-            logger.error(f"Cabinet not found: {cabinet_id}")
+            logger.error("Cabinet not found: %s", cabinet_id)
             return jsonify({'error': 'Cabinet not found'}), 404
-            
-        # Delete all notes in the cabinet
-        current_app.db.notes.delete_many({'cabinet_id': cabinet_id})
-        
-        # Delete the cabinet
-        result = current_app.db.cabinets.delete_one({'_id': ObjectId(cabinet_id)})
-        
-        if result.deleted_count == 0:
-            logger.error(f"Cabinet not found: {cabinet_id}")
+
+        deleted = current_app.store.cabinets.update(
+            cabinet_id, soft_delete_update(cabinet), include_deleted=False
+        )
+        get_list_cache().invalidate(cabinet_id)
+        if not deleted:
+            logger.error("Cabinet not found: %s", cabinet_id)
             return jsonify({'error': 'Cabinet not found'}), 404
-        
-        logger.debug(f"Deleted cabinet and associated notes: {cabinet_id}")    
-        return jsonify({'message': 'Cabinet and associated notes deleted successfully'})
+        current_app.changes.publish(cabinet_id, 'cabinet_deleted', {})
+
+        job_id = current_app.jobs.submit('purge_cabinet', {
+            'cabinet_id': cabinet_id,
+            'batch_size': current_app.config['JOBS_PURGE_BATCH_SIZE']
+        }, key=f'purge:{cabinet_id}')
+        logger.debug("Deleted cabinet %s, purging notes in job %s", cabinet_id, job_id)
+        response = jsonify({'message': 'Cabinet deleted; its notes are being removed', 'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
     except Exception as e:
-        logger.error(f"Error deleting cabinet: {str(e)}")
+        logger.error("Error deleting cabinet: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/<cabinet_id>/notes', methods=['GET'])
 def get_cabinet_notes(cabinet_id):
     """Get all notes in a cabinet"""
-    logger.debug(f"GET /api/cabinets/{cabinet_id}/notes endpoint called")
     try:
-        # Verify cabinet exists
-        cabinet = current_app.db.cabinets.find_one({'_id': ObjectId(cabinet_id)})
+        try:
+            options = parse_listing_args(request.args, current_app.config['NOTES_PAGE_MAX_LIMIT'])
+        except ListingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        response = cabinet_listing_response(
+            current_app.store, cabinet_id, options, request,
+            current_app.config['NOTES_STREAM_BATCH_SIZE']
+        )
+        if response is None:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+        return response
+    except Exception as e:
+        logger.error("Error fetching cabinet notes: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/task-counts', methods=['GET'])
+def get_cabinet_task_counts(cabinet_id):
+    """Open and done task counts per task note of a cabinet and in total"""
+    try:
+        version = cabinet_version(current_app.store, cabinet_id)
+        if version is None:
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        # Every note write bumps the cabinet version, so it tags the counts too
+        etag = cabinet_etag(cabinet_id, version, request)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        notes, totals = task_counts(current_app.store, cabinet_id)
+        return tag_response(jsonify(dict(totals, cabinet_id=cabinet_id, notes=notes)), etag)
+    except Exception as e:
+        logger.error("Error counting cabinet tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/export', methods=['GET'])
+def export_cabinet(cabinet_id):
+    """Stream a cabinet and its notes as NDJSON, or as a zip archive with `format=zip`"""
+    try:
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'zip'):
+            return jsonify({'error': 'format must be ndjson or zip'}), 400
+
+        cabinet = current_app.store.cabinets.get(cabinet_id)
         if not cabinet:
-            logger.error(f"Cabinet not found: {cabinet_id}")
+            logger.error("Cabinet not found: %s", cabinet_id)
             return jsonify({'error': 'Cabinet not found'}), 404
-            
-        notes = list(current_app.db.notes.find(
-            {'cabinet_id': cabinet_id}
-        ).sort('order', 1))
-        
-        # Convert ObjectId to string for JSON serialization
-        for note in notes:
-            note['_id'] = str(note['_id'])
-            
-        return jsonify(notes)
+
+        chunks = export_lines(
+            current_app.store, cabinet_id, _client_fields(cabinet),
+            current_app.config['NOTES_STREAM_BATCH_SIZE']
+        )
+        if export_format == 'zip':
+            response = Response(zip_stream(chunks), mimetype=ZIP_MIMETYPE)
+        else:
+            response = Response(chunks, mimetype=NDJSON_MIMETYPE)
+        filename = export_filename(cabinet.get('name'), export_format)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
     except Exception as e:
-        logger.error(f"Error fetching cabinet notes: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        logger.error("Error exporting cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/import', methods=['POST'])
+def import_cabinet():
+    """Create a cabinet from an export streamed in the request body"""
+    try:
+        try:
+            cabinet_fields, records = open_export(upload_lines(request))
+        except TransferError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # ?name= imports a second copy next to the original
+        cabinet_data = _client_fields(cabinet_fields)
+        if request.args.get('name'):
+            cabinet_data['name'] = request.args['name']
+        if not isinstance(cabinet_data.get('name'), str) or not cabinet_data['name']:
+            return jsonify({'error': 'Cabinet name is required'}), 400
+
+        now = datetime.utcnow()
+        cabinet_data['created_at'] = now
+        cabinet_data['updated_at'] = now
+        if current_app.store.cabinets.name_taken(cabinet_data['name']):
+            return jsonify({'error': 'A cabinet with this name already exists'}), 409
+
+        cabinet_id = str(current_app.store.cabinets.insert(cabinet_data))
+        try:
+            summary = import_notes(
+                current_app.store, cabinet_id, records, current_app.config['IMPORT_BATCH_SIZE']
+            )
+        except TransferError as e:
+            return jsonify({'error': str(e)}), 400
+
+        new_cabinet = current_app.store.cabinets.get(cabinet_id, WITHOUT_STATS)
+        current_app.changes.publish(cabinet_id, 'cabinet_created', {'cabinet': new_cabinet})
+        logger.info("Imported cabinet %s: %s notes", cabinet_id, summary['imported'])
+        return jsonify(dict(summary, cabinet=new_cabinet)), 201
+    except Exception as e:
+        logger.error("Error importing cabinet: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<cabinet_id>/import', methods=['POST'])
+def import_into_cabinet(cabinet_id):
+    """Append the notes of an export streamed in the request body to a cabinet"""
+    try:
+        if not current_app.store.cabinets.get(cabinet_id, {'_id': 1}):
+            logger.error("Cabinet not found: %s", cabinet_id)
+            return jsonify({'error': 'Cabinet not found'}), 404
+
+        try:
+            _, records = open_export(upload_lines(request))
+            summary = import_notes(
+                current_app.store, cabinet_id, records, current_app.config['IMPORT_BATCH_SIZE']
+            )
+        except TransferError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # One event for the whole import; clients refetch rather than replay it
+        current_app.changes.publish(cabinet_id, 'notes_imported', {'count': summary['imported']})
+        logger.info("Imported %s notes into cabinet %s", summary['imported'], cabinet_id)
+        return jsonify(summary)
+    except Exception as e:
+        logger.error("Error importing notes: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,96 @@
+from flask import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+import logging
+from ..utils.cabinet_stats import touch_cabinet
+from ..utils.calendar_entries import (
+    CalendarEntryError, load_note, parse_date, serialize_entry, upsert_entry
+)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('calendar', __name__, url_prefix='/api/notes/<note_id>/calendar')
+
+@bp.route('', methods=['GET'])
+def get_entries(note_id):
+    """Get the calendar entries of a note between `from` and `to` (inclusive)"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            start = parse_date(request.args['from'], 'from') if request.args.get('from') else None
+            end = parse_date(request.args['to'], 'to') if request.args.get('to') else None
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note = load_note(current_app.store, ObjectId(note_id))
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        entries = current_app.store.calendar_entries.list(note['_id'], start, end)
+
+        return jsonify([serialize_entry(entry) for entry in entries])
+    except Exception as e:
+        logger.error("Error fetching calendar entries: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<date>', methods=['PUT'])
+def put_entry(note_id, date):
+    """Create or replace the entry of a single day"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        entry_data = request.get_json()
+        if not entry_data or not isinstance(entry_data.get('content'), str):
+            return jsonify({'error': 'content must be a string'}), 400
+
+        try:
+            date = parse_date(date)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note = load_note(current_app.store, ObjectId(note_id))
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        upsert_entry(current_app.store, note['_id'], note.get('cabinet_id'), date, entry_data['content'])
+        touch_cabinet(current_app.store, note.get('cabinet_id'))
+        return jsonify({'date': date, 'content': entry_data['content']})
+    except Exception as e:
+        logger.error("Error saving calendar entry: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<date>', methods=['DELETE'])
+def delete_entry(note_id, date):
+    """Remove the entry of a single day"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            date = parse_date(date)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        note = load_note(current_app.store, ObjectId(note_id))
+        if not note:
+            return jsonify({'error': 'Note not found'}), 404
+
+        if not current_app.store.calendar_entries.delete(note['_id'], date):
+            return jsonify({'error': 'Calendar entry not found'}), 404
+        touch_cabinet(current_app.store, note.get('cabinet_id'))
+
+        return jsonify({'message': 'Calendar entry deleted successfully'})
+    except Exception as e:
+        logger.error("Error deleting calendar entry: %s", e)
+        return jsonify({'error': str(e)}), 500
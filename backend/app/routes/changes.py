@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify, current_app, Response
+from bson.objectid import ObjectId
+import logging
+from ..utils.change_feed import EVENT_STREAM_MIMETYPE, event_stream
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+def resume_token_arg(req):
+    """Resume token from an EventSource reconnect, or one passed explicitly"""
+    return req.headers.get('Last-Event-ID') or req.args.get('last_event_id')
+
+def event_stream_response(body):
+    response = Response(body, mimetype=EVENT_STREAM_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep reverse proxies from holding events back in their buffers
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('', methods=['GET'])
+def get_changes():
+    """Stream note and cabinet change events as Server-Sent Events, optionally for one cabinet"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        cabinet_id = request.args.get('cabinet_id') or None
+        if cabinet_id is not None:
+            if not ObjectId.is_valid(cabinet_id):
+                return jsonify({'error': 'Invalid cabinet ID format'}), 400
+            if not current_app.store.cabinets.get(cabinet_id, {'_id': 1}):
+                return jsonify({'error': 'Cabinet not found'}), 404
+
+        return event_stream_response(event_stream(
+            current_app.changes,
+            cabinet_id,
+            resume_token_arg(request),
+            current_app.config['CHANGE_FEED_HEARTBEAT_SECONDS'],
+            current_app.config['CHANGE_FEED_MAX_SECONDS']
+        ))
+    except Exception as e:
+        logger.error("Error opening change feed: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, current_app
+import logging
+from ..utils.jobs import JOB_TYPES, serialize_job
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('jobs', __name__, url_prefix='/api/jobs')
+
+# Most jobs returned by one listing request
+MAX_JOB_LISTING = 100
+
+@bp.route('', methods=['GET'])
+def get_jobs():
+    """List recent jobs, optionally filtered by type and status"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        job_type = request.args.get('type')
+        if job_type and job_type not in JOB_TYPES:
+            return jsonify({'error': f'Unknown job type: {job_type}'}), 400
+        status = request.args.get('status')
+
+        try:
+            limit = min(int(request.args.get('limit', 20)), MAX_JOB_LISTING)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        jobs = current_app.store.jobs.list(job_type, status, max(limit, 1))
+        return jsonify([serialize_job(job) for job in jobs])
+    except Exception as e:
+        logger.error("Error listing jobs: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, progress and result of a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        job = current_app.jobs.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(serialize_job(job))
+    except Exception as e:
+        logger.error("Error fetching job: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -1,10 +1,26 @@
 from flask import Blueprint, request, jsonify, current_app, make_response
 from bson.objectid import ObjectId
 import logging
-import bleach
-from bs4 import BeautifulSoup
+from ..utils.note_listing import (
+    ListingError, parse_listing_args, listing_response, cabinet_listing_response,
+    strip_internal_fields, build_projection
+)
+from ..utils.note_writes import EXISTING_NOTE_FIELDS, prepare_new_note, build_put_update
+from ..utils.note_batch import BatchError, NoteBatch, parse_batch
+from ..utils.note_patch import PatchError, NotePatch
+from ..utils.note_move import MoveError, NoteMove, OrderUpdate
+from ..utils.streaming import wants_stream
+from ..utils.versioning import bump_cabinet_version
+from ..utils.cabinet_stats import STATS_NOTE_FIELDS, note_footprint, stats_change, updated_footprint
+from ..utils.cabinet_refs import cabinet_key, cabinet_ref
+from ..utils.calendar_entries import CalendarEntryError, replace_entries
+from ..utils.storage import UpdateError
+from ..utils.revisions import delete_revisions
+from ..utils.change_feed import note_created_event, note_update_event
+from ..utils.ordering import (
+    allocate_order, allocate_orders, raise_order_floor, rebalance_cabinet, schedule_rebalance
+)
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 bp = Blueprint('notes', __name__, url_prefix='/api/notes')
@@ -14,78 +30,53 @@ def handle_options():
     response = make_response()
     response.headers.add("Access-Control-Allow-Origin", "http://localhost:3000")
     response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
-    response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
+    response.headers.add("Access-Control-Allow-Methods", "GET,PUT,PATCH,POST,DELETE,OPTIONS")
     response.headers.add("Access-Control-Allow-Credentials", "true")
     response.headers.add("Access-Control-Max-Age", "3600")
     return response
 
-def sanitize_html(content):
-    if not content:
-        return ''
-        
-    # Define allowed tags and attributes
-    allowed_tags = [
-        'p', 'div', 'span',
-        'h1', 'h2', 'h3',
-        'strong', 'em', 'u', 's',
-        'ul', 'ol', 'li',
-        'pre', 'code',
-        'blockquote', 'a',
-        'input'
-    ]
-    
-    allowed_attributes = {
-        '*': ['class', 'style', 'data-type'],
-        'a': ['href'],
-        'input': ['type', 'checked']
-    }
-    
-    # Clean the HTML
-    cleaned_html = bleach.clean(
-        content,
-        tags=allowed_tags,
-        attributes=allowed_attributes,
-        strip=True
-    )
-    
-    return cleaned_html
-
 @bp.route('', methods=['GET'])
 def get_notes():
     """Get all notes, optionally filtered by cabinet"""
-    logger.debug("GET /api/notes endpoint called")
     try:
-        if not hasattr(current_app, 'db'):
+        if not hasattr(current_app, 'store'):
             logger.error("Database not initialized")
             return jsonify({'error': 'Database not initialized'}), 500
             
         # Get cabinet_id from query parameters
         cabinet_id = request.args.get('cabinet_id')
         
-        # Build query
-        query = {}
+        try:
+            options = parse_listing_args(request.args, current_app.config['NOTES_PAGE_MAX_LIMIT'])
+        except ListingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        batch_size = current_app.config['NOTES_STREAM_BATCH_SIZE']
+
+        # Cabinet listings are cached and versioned; unknown cabinets fall
+        # through to a plain (empty) listing as before
         if cabinet_id:
-            query['cabinet_id'] = cabinet_id
-            
-        notes = list(current_app.db.notes.find(query).sort('order', 1))
-        
-        # Convert ObjectId to string for JSON serialization
-        for note in notes:
-            note['_id'] = str(note['_id'])
-        
-        logger.debug(f"Successfully retrieved {len(notes)} notes")
-        return jsonify(notes)
+            response = cabinet_listing_response(
+                current_app.store, cabinet_id, options, request, batch_size
+            )
+            if response is not None:
+                return response
+
+        return listing_response(
+            current_app.store, cabinet_id or None, options,
+            stream=wants_stream(request),
+            batch_size=batch_size
+        )
     except Exception as e:
-        logger.error(f"Server error: {str(e)}")
+        logger.error("Server error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('', methods=['POST'])
 def create_note():
     """Create a new note"""
     note_data = request.get_json()
-    logger.debug(f"Raw note data received: {note_data}")
     try:
-        if not hasattr(current_app, 'db'):
+        if not hasattr(current_app, 'store'):
             return jsonify({'error': 'Database not initialized'}), 500
             
         if not note_data:
@@ -96,67 +87,43 @@ def create_note():
         if not cabinet_id:
             return jsonify({'error': 'cabinet_id is required'}), 400
             
-        try:
-            # Convert string ID to ObjectId
-            cabinet_object_id = ObjectId(cabinet_id)
-            # Verify cabinet exists
-            cabinet = current_app.db.cabinets.find_one({'_id': cabinet_object_id})
-            if not cabinet:
-                return jsonify({'error': 'Cabinet not found'}), 404
-        except Exception as e:
-            logger.error(f"Invalid cabinet ID format: {str(e)}")
+        if not ObjectId.is_valid(cabinet_id):
+            logger.error("Invalid cabinet ID format: %s", cabinet_id)
             return jsonify({'error': 'Invalid cabinet ID format'}), 400
 
-        # Sanitize HTML content if present
-        if 'content' in note_data:
-            note_data['content'] = sanitize_html(note_data['content'])
-
-        # Initialize based on note type
-        note_type = note_data.get('type', 'standard')
-        if note_type == 'task':
-            note_data.setdefault('tasks', [])
-            note_data.setdefault('content', '')
-        elif note_type == 'calendar':
-            note_data.setdefault('viewType', 'month')
-            note_data.setdefault('calendarData', [])
-            note_data.setdefault('views', [{
-                'id': 'view-1',
-                'viewType': 'month',
-                'selectedDate': note_data.get('timestamp')
-            }])
-            note_data.setdefault('content', '')
-        else:
-            note_data.setdefault('content', '')
+        # Reserve the order at the end of the cabinet; this also verifies the
+        # cabinet exists, in one round trip
+        order = allocate_order(current_app.store, cabinet_id)
+        if order is None:
+            return jsonify({'error': 'Cabinet not found'}), 404
 
-        # Common fields
-        note_data.setdefault('title', '')
-        note_data.setdefault('timestamp', '')
-        
-        # Get the maximum order value for the specific cabinet
-        last_note = current_app.db.notes.find_one(
-            {'cabinet_id': cabinet_id},
-            sort=[("order", -1)]
-        )
-        note_data['order'] = (last_note['order'] + 1000 if last_note else 0)
-            
-        result = current_app.db.notes.insert_one(note_data)
-        inserted_note = current_app.db.notes.find_one({'_id': result.inserted_id})
-        inserted_note['_id'] = str(inserted_note['_id'])
+        try:
+            calendar_entries = prepare_new_note(note_data)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+        note_data['order'] = order
+        note_data['cabinet_id'] = cabinet_ref(cabinet_id)
+
+        inserted_id = current_app.store.notes.insert(note_data)
+        if calendar_entries:
+            replace_entries(current_app.store, inserted_id, cabinet_id, calendar_entries)
+        bump_cabinet_version(current_app.store, cabinet_id, stats_change(after=note_footprint(note_data)))
+        current_app.revisions.record(inserted_id)
+        inserted_note = current_app.store.notes.get(inserted_id)
+        strip_internal_fields(inserted_note)
+        current_app.changes.publish(cabinet_id, *note_created_event(inserted_note))
         
         return jsonify(inserted_note), 201
         
     except Exception as e:
-        logger.error(f"Error creating note: {str(e)}")
+        logger.error("Error creating note: %s", e)
         return jsonify({'error': str(e)}), 500
 
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger(__name__)
-
 @bp.route('/<note_id>', methods=['PUT'])
 def update_note(note_id):
     """Update a note"""
     try:
-        if not hasattr(current_app, 'db'):
+        if not hasattr(current_app, 'store'):
             return jsonify({'error': 'Database not initialized'}), 500
             
         note_data = request.get_json()
@@ -170,133 +137,255 @@ def update_note(note_id):
         except Exception as e:
             return jsonify({'error': 'Invalid note ID format'}), 400
 
-        # Get existing note to verify cabinet_id and preserve data
-        existing_note = current_app.db.notes.find_one({'_id': ObjectId(note_id)})
+        # Get existing note to verify cabinet_id and skip unchanged content
+        existing_note = current_app.store.notes.get(object_id, EXISTING_NOTE_FIELDS)
         
         if not existing_note:
             return jsonify({'error': 'Note not found'}), 404
 
-        # Build update data carefully
-        update_data = {}
-        
-        # If this is just an order update, preserve all existing data
-        if set(note_data.keys()) == {'order'}:
-            # Copy all existing note data
-            update_data = {k: v for k, v in existing_note.items() if k != '_id'}
-            # Update only the order
-            update_data['order'] = note_data['order']
-        else:
-            # Handle normal update logic
-            if 'title' in note_data:
-                update_data['title'] = note_data['title']
-                
-            if 'order' in note_data:
-                update_data['order'] = note_data['order']
-                
-            if 'type' in note_data:
-                update_data['type'] = note_data['type']
-                
-            if 'isExpanded' in note_data:
-                update_data['isExpanded'] = note_data['isExpanded']
-                
-            # Keep existing cabinet_id
-            update_data['cabinet_id'] = existing_note['cabinet_id']
-
-            # Handle content based on note type
-            note_type = note_data.get('type', existing_note.get('type', 'standard'))
-            if note_type == 'task':
-                if 'tasks' in note_data:
-                    update_data['tasks'] = note_data['tasks']
-            elif note_type == 'calendar':
-                if 'viewType' in note_data:
-                    update_data['viewType'] = note_data['viewType']
-                if 'calendarData' in note_data:
-                    update_data['calendarData'] = note_data['calendarData']
-                if 'views' in note_data:
-                    update_data['views'] = note_data['views']
-            else:
-                if 'content' in note_data:
-                    update_data['content'] = sanitize_html(note_data['content'])
-        
-        # Perform the update
-        result = current_app.db.notes.update_one(
-            {'_id': ObjectId(note_id)},
-            {'$set': update_data}
-        )
-        
-        if result.matched_count == 0:
+        try:
+            update, calendar_entries = build_put_update(existing_note, note_data)
+        except CalendarEntryError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not current_app.store.notes.update(object_id, update):
             return jsonify({'error': 'Note not found'}), 404
+        cabinet_id = cabinet_key(existing_note['cabinet_id'])
+        if calendar_entries is not None:
+            replace_entries(current_app.store, object_id, cabinet_id, calendar_entries)
+        before = note_footprint(existing_note)
+        bump_cabinet_version(
+            current_app.store, cabinet_id,
+            stats_change(before, updated_footprint(before, update['$set']))
+        )
+        current_app.revisions.record(object_id)
         
         # Get the updated note
-        updated_note = current_app.db.notes.find_one({'_id': ObjectId(note_id)})
+        updated_note = current_app.store.notes.get(object_id)
         if updated_note:
-            updated_note['_id'] = str(updated_note['_id'])
+            strip_internal_fields(updated_note)
+            current_app.changes.publish(cabinet_id, *note_update_event(
+                object_id, updated_note.get('version'), update['$set']
+            ))
         
         return jsonify(updated_note)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _version_conflict(object_id):
+    """409 with the note's current version, or 404 if it no longer exists"""
+    current = current_app.store.notes.get(object_id, {'version': 1})
+    if not current:
+        return jsonify({'error': 'Note not found'}), 404
+    return jsonify({'error': 'Version conflict', 'version': current.get('version', 0)}), 409
+
+@bp.route('/<note_id>', methods=['PATCH'])
+def patch_note(note_id):
+    """Apply text deltas or JSON-patch operations to a note at a base version"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        patch_data = request.get_json()
+        if not patch_data:
+            return jsonify({'error': 'No data provided'}), 400
+
+        try:
+            object_id = ObjectId(note_id)
+        except Exception:
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            patch = NotePatch(patch_data)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+
+        base = None
+        projection = patch.base_projection()
+        if projection is not None:
+            base = current_app.store.notes.get(object_id, projection, version=patch.base_version)
+            if base is None:
+                return _version_conflict(object_id)
+        try:
+            patch.resolve(base)
+        except PatchError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            updated_note = current_app.store.notes.update_and_get(
+                object_id, patch.update(), version=patch.base_version,
+                projection=patch.result_projection()
+            )
+        except UpdateError as e:
+            return jsonify({'error': f'Patch could not be applied: {str(e)}'}), 400
+
+        if updated_note is None:
+            return _version_conflict(object_id)
+        search_update = patch.search_update(updated_note)
+        if search_update:
+            current_app.store.notes.update(
+                object_id, search_update, expect={'version': updated_note['version']}
+            )
+        cabinet_id = cabinet_key(updated_note.pop('cabinet_id', None))
+        bump_cabinet_version(current_app.store, cabinet_id, patch.stats_change())
+        current_app.revisions.record(object_id)
+        current_app.changes.publish(cabinet_id, *patch.change_event(object_id, updated_note))
+
+        return jsonify(patch.response(updated_note))
+
+    except Exception as e:
+        logger.error("Error patching note: %s", e)
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/<note_id>', methods=['DELETE'])
 def delete_note(note_id):
     """Delete a note"""
-    logger.debug(f"DELETE /api/notes/{note_id} endpoint called")
     try:
-        if not hasattr(current_app, 'db'):
+        if not hasattr(current_app, 'store'):
             logger.error("Database not initialized")
             return jsonify({'error': 'Database not initialized'}), 500
             
-        result = current_app.db.notes.delete_one({'_id': ObjectId(note_id)})
+        deleted_note = current_app.store.notes.delete(
+            ObjectId(note_id), dict(STATS_NOTE_FIELDS, cabinet_id=1)
+        )
         
-        if result.deleted_count == 0:
+        if deleted_note is None:
             return jsonify({'error': 'Note not found'}), 404
+        current_app.store.calendar_entries.delete_for_notes([deleted_note['_id']])
+        delete_revisions(current_app.store, [deleted_note['_id']])
+        cabinet_id = cabinet_key(deleted_note.get('cabinet_id'))
+        bump_cabinet_version(
+            current_app.store, cabinet_id, stats_change(before=note_footprint(deleted_note))
+        )
+        current_app.changes.publish(cabinet_id, 'note_deleted', {'_id': deleted_note['_id']})
             
         return jsonify({'message': 'Note deleted successfully'}), 200
     except Exception as e:
-        logger.error(f"Server error: {str(e)}")
+        logger.error("Server error: %s", e)
         return jsonify({'error': str(e)}), 500
     
 @bp.route('/batch-update-order', methods=['POST'])
 def batch_update_order():
     """Update the order of multiple notes atomically"""
     try:
-        if not hasattr(current_app, 'db'):
+        if not hasattr(current_app, 'store'):
             return jsonify({'error': 'Database not initialized'}), 500
-            
-        updates = request.get_json()
-        if not updates or not isinstance(updates, list):
-            return jsonify({'error': 'Invalid update data'}), 400
 
-        # Verify all notes exist and are in the same cabinet
-        note_ids = [ObjectId(update['_id']) for update in updates]
-        existing_notes = list(current_app.db.notes.find({'_id': {'$in': note_ids}}))
-        
-        if len(existing_notes) != len(updates):
-            return jsonify({'error': 'Some notes not found'}), 404
-            
-        # Verify all notes are in the same cabinet
-        cabinet_ids = set(note['cabinet_id'] for note in existing_notes)
-        if len(cabinet_ids) != 1:
-            return jsonify({'error': 'Notes must be in the same cabinet'}), 400
-
-        # Update each note's order
-        for update in updates:
-            current_app.db.notes.update_one(
-                {'_id': ObjectId(update['_id'])},
-                {'$set': {'order': update['order']}}
-            )
+        try:
+            reorder = OrderUpdate(request.get_json())
+            # Every note must exist, and all of them in the same cabinet
+            cabinet_id = reorder.check(current_app.store.notes.find(reorder.note_ids, {'cabinet_id': 1}))
+        except MoveError as e:
+            return jsonify({'error': str(e)}), e.status
+
+        # Update every note's order in a single round trip
+        current_app.store.notes.bulk_update(reorder.updates())
+        raise_order_floor(current_app.store, cabinet_id, reorder.max_order)
+        bump_cabinet_version(current_app.store, cabinet_id)
+        current_app.changes.publish(cabinet_id, *reorder.change_event())
 
         # Return the updated notes in their new order
-        updated_notes = list(current_app.db.notes.find(
-            {'_id': {'$in': note_ids}}
-        ).sort('order', 1))
-        
-        # Convert ObjectIds to strings
-        for note in updated_notes:
-            note['_id'] = str(note['_id'])
+        updated_notes = sorted(
+            current_app.store.notes.find(reorder.note_ids, build_projection(None)), key=lambda note: note['order']
+        )
 
         return jsonify(updated_notes)
 
     except Exception as e:
-        logger.error(f"Error in batch order update: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        logger.error("Error in batch order update: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/batch', methods=['POST'])
+def batch_notes():
+    """Apply a batch of creates, updates and deletes with a single bulk write"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        try:
+            ordered, operations = parse_batch(
+                request.get_json(silent=True), current_app.config['NOTES_BATCH_MAX_OPS']
+            )
+        except BatchError as e:
+            return jsonify({'error': str(e), 'errors': e.errors}), 400
+
+        store = current_app.store
+        batch = NoteBatch(operations, ordered)
+        # Every note the batch touches is read in one query
+        existing = {}
+        if batch.note_ids():
+            existing = {
+                note['_id']: note
+                for note in store.notes.find(batch.note_ids(), batch.existing_projection())
+            }
+        # Creates reserve one block of orders per cabinet
+        orders = {
+            cabinet_id: allocate_orders(store, cabinet_id, count)
+            for cabinet_id, count in batch.create_counts().items()
+        }
+
+        writes = batch.build_writes(existing, orders)
+        batch.record_write(store.notes.write_batch(writes, ordered) if writes else [])
+
+        updated_ids = batch.updated_ids()
+        if updated_ids:
+            batch.verify({
+                note['_id']: note.get('version', 0)
+                for note in store.notes.find(updated_ids, {'version': 1})
+            })
+
+        for object_id, cabinet_id, entries in batch.calendar_writes():
+            replace_entries(store, object_id, cabinet_id, entries)
+        deleted_ids = batch.deleted_ids()
+        if deleted_ids:
+            store.calendar_entries.delete_for_notes(deleted_ids)
+            delete_revisions(store, deleted_ids)
+        stats = batch.stats_changes()
+        for cabinet_id in batch.touched_cabinets():
+            bump_cabinet_version(store, cabinet_id, stats.get(cabinet_id))
+        current_app.revisions.record(*batch.written_ids())
+        for cabinet_id, event_type, data in batch.change_events():
+            current_app.changes.publish(cabinet_id, event_type, data)
+
+        return jsonify(batch.response())
+
+    except Exception as e:
+        logger.error("Error in note batch: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<note_id>/move', methods=['POST'])
+def move_note(note_id):
+    """Move a note between two neighbours, writing only the moved note"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        try:
+            move = NoteMove(note_id, request.get_json() or {})
+            # The moved note and both neighbours come back in one query
+            cabinet_id = move.check(current_app.store.notes.find(move.note_ids, {'order': 1, 'cabinet_id': 1}))
+        except MoveError as e:
+            return jsonify({'error': str(e)}), e.status
+
+        if move.to_end:
+            new_order = allocate_order(current_app.store, cabinet_id)
+        else:
+            new_order = move.new_order()
+            if new_order is None:
+                # Gap exhausted: renumber now, then place the note in the new gap
+                rebalance_cabinet(current_app.store, cabinet_id)
+                move.refresh(current_app.store.notes.find(move.note_ids, {'order': 1}))
+                new_order = move.new_order()
+            elif move.wants_rebalance():
+                schedule_rebalance(current_app.jobs, cabinet_id)
+
+        current_app.store.notes.update(ObjectId(note_id), {'$set': {'order': new_order}})
+        bump_cabinet_version(current_app.store, cabinet_id)
+        current_app.changes.publish(cabinet_id, *move.change_event(new_order))
+
+        return jsonify(move.response(new_order))
+
+    except Exception as e:
+        logger.error("Error moving note: %s", e)
+        return jsonify({'error': str(e)}), 500
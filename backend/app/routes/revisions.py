@@ -0,0 +1,90 @@
+from flask import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+import logging
+from ..utils.note_listing import strip_internal_fields
+from ..utils.change_feed import note_update_event
+from ..utils.revisions import (
+    RevisionError, restore_revision as restore_note_revision, revision_state, serialize_revision
+)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('revisions', __name__, url_prefix='/api/notes/<note_id>/revisions')
+
+# Most revisions returned by one listing request
+MAX_REVISION_LISTING = 200
+
+@bp.route('', methods=['GET'])
+def get_revisions(note_id):
+    """List the revisions of a note, newest first, before an optional `before` seq"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        try:
+            limit = min(int(request.args.get('limit', 50)), MAX_REVISION_LISTING)
+            before = int(request.args['before']) if request.args.get('before') else None
+        except ValueError:
+            return jsonify({'error': 'limit and before must be integers'}), 400
+
+        revisions = current_app.store.revisions.list(ObjectId(note_id), before, max(limit, 1))
+
+        return jsonify([serialize_revision(revision) for revision in revisions])
+    except Exception as e:
+        logger.error("Error listing revisions: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:seq>', methods=['GET'])
+def get_revision(note_id, seq):
+    """The note fields as they were at one revision"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+
+        state = revision_state(current_app.store, ObjectId(note_id), seq)
+        if state is None:
+            return jsonify({'error': 'Revision not found'}), 404
+
+        return jsonify({'seq': seq, 'note': state})
+    except Exception as e:
+        logger.error("Error fetching revision: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:seq>/restore', methods=['POST'])
+def restore_revision(note_id, seq):
+    """Put a note back to one of its revisions, optionally at a `base_version`"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        base_version = (request.get_json(silent=True) or {}).get('base_version')
+        if base_version is not None and (not isinstance(base_version, int) or isinstance(base_version, bool)):
+            return jsonify({'error': 'base_version must be an integer'}), 400
+
+        try:
+            restored_note, update = restore_note_revision(current_app.store, object_id, seq, base_version)
+        except RevisionError as e:
+            if e.version is not None:
+                return jsonify({'error': str(e), 'version': e.version}), e.status
+            return jsonify({'error': str(e)}), e.status
+
+        current_app.revisions.record(object_id)
+        current_app.changes.publish(restored_note.get('cabinet_id'), *note_update_event(
+            object_id, restored_note.get('version'), update['$set'], update.get('$unset', ())
+        ))
+
+        strip_internal_fields(restored_note)
+        return jsonify(restored_note)
+    except Exception as e:
+        logger.error("Error restoring revision: %s", e)
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,82 @@
+from flask import Blueprint, request, jsonify, current_app
+import logging
+from ..utils.list_cache import get_list_cache
+from ..utils import sanitizer
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('system', __name__, url_prefix='/api/system')
+
+@bp.route('/cache', methods=['GET'])
+def get_cache_stats():
+    """Hit, miss and eviction counters for the in-process caches"""
+    return jsonify({
+        'list_cache': get_list_cache().stats(),
+        'sanitizer': sanitizer.cache_stats()
+    })
+
+@bp.route('/migrations', methods=['GET'])
+def get_migrations():
+    """Applied and pending schema migrations"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        applied, pending = current_app.store.migration_status()
+        return jsonify({'applied': applied, 'pending': pending})
+    except Exception as e:
+        logger.error("Error listing migrations: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/calendar', methods=['POST'])
+def migrate_calendar():
+    """Move inline calendarData arrays into the calendar_entries collection in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        job_id = current_app.jobs.submit('migrate_calendar_data', key='migrate_calendar_data')
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error migrating calendar data: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/compress-content', methods=['POST'])
+def migrate_content_compression():
+    """Rewrite stored note content to the current compression settings in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        # ?decompress=1 writes everything back as plain text, before turning compression off
+        decompress = request.args.get('decompress', '').lower() in ('1', 'true', 'yes')
+        job_id = current_app.jobs.submit(
+            'compress_note_content', {'decompress': decompress}, key='compress_note_content'
+        )
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error migrating note content compression: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/migrations/cabinet-ids', methods=['POST'])
+def migrate_cabinet_ids():
+    """Backfill note and calendar entry cabinet_ids in the CABINET_ID_FORMAT form in a background job"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        # ?to_strings=1 writes ObjectIds back as strings, after switching the format back
+        to_strings = request.args.get('to_strings', '').lower() in ('1', 'true', 'yes')
+        job_id = current_app.jobs.submit(
+            'migrate_cabinet_refs', {'to_strings': to_strings}, key='migrate_cabinet_refs'
+        )
+        response = jsonify({'job_id': job_id})
+        response.headers['Location'] = f'/api/jobs/{job_id}'
+        return response, 202
+    except Exception as e:
+        logger.error("Error migrating cabinet ids: %s", e)
+        return jsonify({'error': str(e)}), 500
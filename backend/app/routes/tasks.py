@@ -0,0 +1,161 @@
+from flask import Blueprint, request, jsonify, current_app
+from bson.objectid import ObjectId
+import logging
+from ..utils.tasks import (
+    TaskError, check_task_note, move_task as move_task_in_note, new_task, task_counts, task_fields,
+    task_position, write_task
+)
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint('tasks', __name__, url_prefix='/api/notes/<note_id>/tasks')
+
+# A move rewrites the array at the version it read; tries before giving up with 409
+MOVE_ATTEMPTS = 3
+
+@bp.route('', methods=['POST'])
+def add_task(note_id):
+    """Add one task to a task note, at `position` or at the end"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        data = request.get_json(silent=True)
+        try:
+            task = new_task(data)
+            position = task_position(data)
+            note = write_task(
+                current_app.store, object_id,
+                lambda projection: current_app.store.notes.add_task(object_id, task, position, projection),
+                refresh_search=bool(task['text']),
+                missing=TaskError('A task with this id already exists', 409)
+            )
+        except TaskError as e:
+            return jsonify({'error': str(e)}), e.status
+        current_app.revisions.record(object_id)
+
+        current_app.changes.publish(note.get('cabinet_id'), 'task_added', {
+            '_id': object_id, 'version': note['version'], 'task': task, 'position': position
+        })
+        return jsonify({'_id': object_id, 'version': note['version'], 'task': task}), 201
+    except Exception as e:
+        logger.error("Error adding task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<task_id>', methods=['PATCH'])
+def update_task(note_id, task_id):
+    """Edit the text of one task or tick it off, without resending the others"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        try:
+            fields = task_fields(request.get_json(silent=True), partial=True)
+            note = write_task(
+                current_app.store, object_id,
+                lambda projection: current_app.store.notes.update_task(object_id, task_id, fields, projection),
+                refresh_search='text' in fields,
+                missing=TaskError('Task not found', 404)
+            )
+        except TaskError as e:
+            return jsonify({'error': str(e)}), e.status
+        current_app.revisions.record(object_id)
+
+        data = {'_id': object_id, 'version': note['version'], 'task_id': task_id, 'fields': fields}
+        current_app.changes.publish(note.get('cabinet_id'), 'task_updated', data)
+        return jsonify(data)
+    except Exception as e:
+        logger.error("Error updating task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<task_id>', methods=['DELETE'])
+def delete_task(note_id, task_id):
+    """Remove one task from a task note"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        try:
+            note = write_task(
+                current_app.store, object_id,
+                lambda projection: current_app.store.notes.remove_task(object_id, task_id, projection),
+                refresh_search=True,
+                missing=TaskError('Task not found', 404)
+            )
+        except TaskError as e:
+            return jsonify({'error': str(e)}), e.status
+        current_app.revisions.record(object_id)
+
+        data = {'_id': object_id, 'version': note['version'], 'task_id': task_id}
+        current_app.changes.publish(note.get('cabinet_id'), 'task_deleted', data)
+        return jsonify(data)
+    except Exception as e:
+        logger.error("Error deleting task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<task_id>/move', methods=['POST'])
+def move_task(note_id, task_id):
+    """Move one task to another `position` in its note"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        data = request.get_json(silent=True) or {}
+        try:
+            position = task_position(data)
+            if position is None:
+                raise TaskError('position is required')
+            note, tasks, task = move_task_in_note(current_app.store, object_id, task_id, position, MOVE_ATTEMPTS)
+        except TaskError as e:
+            return jsonify({'error': str(e)}), e.status
+        version = note.get('version', 0)
+        if tasks is None:
+            return jsonify({'error': 'Version conflict', 'version': version}), 409
+        current_app.revisions.record(object_id)
+
+        position = min(position, len(tasks) - 1)
+        current_app.changes.publish(note.get('cabinet_id'), 'task_moved', {
+            '_id': object_id, 'version': version + 1, 'task_id': task_id, 'position': position
+        })
+        return jsonify({'_id': object_id, 'version': version + 1, 'task': task, 'position': position})
+    except Exception as e:
+        logger.error("Error moving task: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/counts', methods=['GET'])
+def get_task_counts(note_id):
+    """Open and done task counts of a task note, sized on the server"""
+    try:
+        if not hasattr(current_app, 'store'):
+            return jsonify({'error': 'Database not initialized'}), 500
+
+        if not ObjectId.is_valid(note_id):
+            return jsonify({'error': 'Invalid note ID format'}), 400
+        object_id = ObjectId(note_id)
+
+        try:
+            notes, _ = task_counts(current_app.store, note_id=object_id)
+            if not notes:
+                check_task_note(current_app.store, object_id)
+        except TaskError as e:
+            return jsonify({'error': str(e)}), e.status
+        return jsonify(notes[0])
+    except Exception as e:
+        logger.error("Error counting tasks: %s", e)
+        return jsonify({'error': str(e)}), 500
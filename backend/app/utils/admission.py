@@ -0,0 +1,145 @@
+# backend/app/utils/admission.py
+import logging
+import threading
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rejection statuses: the client is over its own share, or the process is full
+TOO_MANY_REQUESTS = 429
+SERVICE_UNAVAILABLE = 503
+
+
+class AdmissionControl:
+    """Caps the requests a process handles at once, overall and per client.
+
+    A request over either limit is turned away straight away with a
+    Retry-After hint rather than queueing behind the others, so latency
+    stays bounded under bursts. A limit of 0 turns that check off. Counts
+    are per process; with several workers the effective limits multiply.
+    """
+
+    def __init__(self, max_concurrent=0, max_per_client=0, retry_after=1):
+        self.max_concurrent = max_concurrent
+        self.max_per_client = max_per_client
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._per_client = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_concurrent > 0 or self.max_per_client > 0
+
+    def acquire(self, client):
+        """Admit a request from `client`; returns None, or the status to reject it with"""
+        with self._lock:
+            if self.max_per_client and self._per_client.get(client, 0) >= self.max_per_client:
+                status, reason = TOO_MANY_REQUESTS, 'client'
+            elif self.max_concurrent and self._in_flight >= self.max_concurrent:
+                status, reason = SERVICE_UNAVAILABLE, 'global'
+            else:
+                self._in_flight += 1
+                self._per_client[client] = self._per_client.get(client, 0) + 1
+                metrics.ADMISSION_IN_FLIGHT.inc()
+                return None
+        metrics.ADMISSION_REJECTED.inc(reason)
+        return status
+
+    def release(self, client):
+        with self._lock:
+            self._in_flight -= 1
+            remaining = self._per_client.get(client, 0) - 1
+            if remaining > 0:
+                self._per_client[client] = remaining
+            else:
+                self._per_client.pop(client, None)
+        metrics.ADMISSION_IN_FLIGHT.dec()
+
+    def in_flight(self):
+        return self._in_flight
+
+
+def from_config(config):
+    if config['ADMISSION_MAX_PER_CLIENT'] and not config['ADMISSION_CLIENT_HEADER']:
+        logger.warning(
+            "ADMISSION_MAX_PER_CLIENT is set without ADMISSION_CLIENT_HEADER; clients are "
+            "told apart by peer address, so behind a proxy they all share one allowance"
+        )
+    return AdmissionControl(
+        max_concurrent=config['ADMISSION_MAX_CONCURRENT'],
+        max_per_client=config['ADMISSION_MAX_PER_CLIENT'],
+        retry_after=config['ADMISSION_RETRY_AFTER_SECONDS']
+    )
+
+
+def client_key(request, header):
+    """Who a request counts against: the first address in `header` when set, else the peer address"""
+    if header:
+        forwarded = request.headers.get(header, '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+
+def _exempt(request, exempt_paths):
+    return request.method == 'OPTIONS' or request.path.startswith(exempt_paths)
+
+
+def _rejection(status, retry_after):
+    error = 'Too many concurrent requests' if status == TOO_MANY_REQUESTS else 'Server is busy'
+    return {'error': error}, status, {'Retry-After': str(retry_after)}
+
+
+def init_app(app):
+    """Apply admission control to a Flask app's requests"""
+    from flask import g, request
+    control = app.admission = from_config(app.config)
+    if not control.enabled:
+        return
+    header = app.config['ADMISSION_CLIENT_HEADER']
+    exempt_paths = tuple(app.config['ADMISSION_EXEMPT_PATHS'])
+
+    @app.before_request
+    def admit_request():
+        if _exempt(request, exempt_paths):
+            return None
+        client = client_key(request, header)
+        status = control.acquire(client)
+        if status is not None:
+            return _rejection(status, control.retry_after)
+        g.admitted_client = client
+        return None
+
+    @app.teardown_request
+    def release_request(exc):
+        client = g.pop('admitted_client', None)
+        if client is not None:
+            control.release(client)
+
+
+def init_async_app(app):
+    """init_app for the Quart app in app.aio"""
+    from quart import g, request
+    control = app.admission = from_config(app.config)
+    if not control.enabled:
+        return
+    header = app.config['ADMISSION_CLIENT_HEADER']
+    exempt_paths = tuple(app.config['ADMISSION_EXEMPT_PATHS'])
+
+    @app.before_request
+    async def admit_request():
+        if _exempt(request, exempt_paths):
+            return None
+        client = client_key(request, header)
+        status = control.acquire(client)
+        if status is not None:
+            return _rejection(status, control.retry_after)
+        g.admitted_client = client
+        return None
+
+    @app.teardown_request
+    async def release_request(exc):
+        client = g.pop('admitted_client', None)
+        if client is not None:
+            control.release(client)
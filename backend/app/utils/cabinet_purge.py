@@ -0,0 +1,94 @@
+# backend/app/utils/cabinet_purge.py
+import logging
+from datetime import datetime
+from collections import Counter
+from bson.objectid import ObjectId
+from .cabinet_stats import STATS_NOTE_FIELDS, note_footprint, stats_change
+from .jobs import job_type
+from .revisions import delete_revisions
+from .versioning import LIVE_CABINET
+
+logger = logging.getLogger(__name__)
+
+# Notes deleted per round trip while purging a cabinet
+PURGE_BATCH_SIZE = 1000
+
+
+def soft_delete_update(cabinet):
+    """Update that hides a cabinet until its purge job removes it.
+
+    The name is swapped for a placeholder so the unique name index lets a new
+    cabinet take the old name straight away; the original is kept alongside.
+    """
+    now = datetime.utcnow()
+    return {
+        '$set': {
+            'deleted_at': now,
+            'updated_at': now,
+            'deleted_name': cabinet.get('name'),
+            'name': f"deleted:{cabinet['_id']}",
+        },
+        '$inc': {'version': 1},
+    }
+
+
+def soft_delete_filter(cabinet_id):
+    return dict(LIVE_CABINET, _id=ObjectId(cabinet_id))
+
+
+def _purge_notes(store, cabinet_id, batch_size, progress):
+    """Delete a cabinet's notes with their entries and revisions, a batch at a time.
+
+    `progress(deleted)` is called after each batch. Returns how many notes
+    were deleted.
+    """
+    deleted = 0
+    while True:
+        notes = list(store.notes.list(cabinet_id, STATS_NOTE_FIELDS, limit=batch_size))
+        if not notes:
+            break
+        note_ids = [note['_id'] for note in notes]
+        # Entries and revisions go first so an interrupted purge never leaves them orphaned
+        store.calendar_entries.delete_for_notes(note_ids)
+        delete_revisions(store, note_ids)
+        deleted += store.notes.delete_many(note_ids)
+        stats = Counter()
+        for note in notes:
+            stats.update(stats_change(before=note_footprint(note)))
+        store.cabinets.update(cabinet_id, {'$inc': dict(stats)})
+        progress(deleted)
+
+    store.calendar_entries.delete_for_cabinet(cabinet_id)
+    return deleted
+
+
+@job_type('purge_cabinet')
+def purge_cabinet(store, job):
+    """Delete a soft-deleted cabinet's notes and calendar entries in chunks, then the cabinet.
+
+    Each chunk is a bounded delete by _id, so no single command holds the
+    collection for long and progress survives an interrupted run. The
+    cabinet's counters go down with each chunk, so they stay true for a
+    purge that is interrupted and resumed.
+    """
+    cabinet_id = job.params['cabinet_id']
+    batch_size = job.params.get('batch_size') or PURGE_BATCH_SIZE
+    if store.cabinets.get(cabinet_id, {'_id': 1}):
+        raise ValueError(f'Cabinet {cabinet_id} has not been deleted')
+
+    total = store.notes.count(cabinet_id)
+    job.progress(0, total)
+    deleted = _purge_notes(store, cabinet_id, batch_size, lambda done: job.progress(done, max(total, done)))
+    store.cabinets.delete(cabinet_id)
+
+    # A create that reserved its order before the soft delete can still
+    # insert after the sweep above. With the cabinet document gone no new
+    # create can start, so a last sweep removes those stragglers.
+    late = _purge_notes(
+        store, cabinet_id, batch_size, lambda done: job.progress(deleted + done, max(total, deleted + done))
+    )
+    if late:
+        logger.info("Purged %s notes created in cabinet %s while it was being deleted", late, cabinet_id)
+    deleted += late
+    logger.info("Purged cabinet %s: %s notes deleted", cabinet_id, deleted)
+    return {'cabinet_id': cabinet_id, 'notes_deleted': deleted}
@@ -0,0 +1,156 @@
+# backend/app/utils/cabinet_refs.py
+import logging
+import time
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from .jobs import job_type
+
+logger = logging.getLogger(__name__)
+
+# Collections whose documents point at their cabinet through `cabinet_id`
+REFERENCING_COLLECTIONS = ('notes', 'calendar_entries')
+
+# How `cabinet_id` is written: 'string' (the 24-character hex form older
+# releases wrote and read) or 'objectid' (the cabinet's native _id, half the
+# size in every document and index entry). Reads match both either way.
+STRING = 'string'
+OBJECTID = 'objectid'
+
+MIGRATE_BATCH_SIZE = 500
+MIGRATE_PAUSE_SECONDS = 0.1
+
+_settings = {
+    'format': STRING,
+    'batch_size': MIGRATE_BATCH_SIZE,
+    'pause_seconds': MIGRATE_PAUSE_SECONDS,
+}
+
+
+def configure(config):
+    """Apply the app's cabinet reference settings to later writes and migrations"""
+    id_format = config['CABINET_ID_FORMAT'].lower()
+    if id_format not in (STRING, OBJECTID):
+        raise ValueError(f'CABINET_ID_FORMAT must be {STRING!r} or {OBJECTID!r}, not {id_format!r}')
+    _settings.update(
+        format=id_format,
+        batch_size=config['CABINET_ID_MIGRATION_BATCH_SIZE'],
+        pause_seconds=config['CABINET_ID_MIGRATION_PAUSE_SECONDS'],
+    )
+
+
+def cabinet_key(value):
+    """A stored cabinet reference as the string form used in URLs, events and cache keys"""
+    return None if value is None else str(value)
+
+
+def cabinet_ref(cabinet_id):
+    """Form of `cabinet_id` to write into a document under the current setting"""
+    if cabinet_id is None:
+        return None
+    if _settings['format'] == OBJECTID and ObjectId.is_valid(cabinet_id):
+        return ObjectId(cabinet_id)
+    return str(cabinet_id)
+
+
+def cabinet_match(cabinet_id):
+    """Query condition matching `cabinet_id` stored in either form.
+
+    Used for every lookup by cabinet, so documents written before, during
+    and after the migration are all found; on the (cabinet_id, order, _id)
+    index it costs one more index seek.
+    """
+    if cabinet_id is None:
+        return None
+    cabinet_id = str(cabinet_id)
+    if not ObjectId.is_valid(cabinet_id):
+        return cabinet_id
+    return {'$in': [cabinet_id, ObjectId(cabinet_id)]}
+
+
+def cabinets_match(cabinet_ids):
+    """cabinet_match for any of several cabinets"""
+    refs = []
+    for cabinet_id in cabinet_ids:
+        refs.append(str(cabinet_id))
+        if ObjectId.is_valid(cabinet_id):
+            refs.append(ObjectId(cabinet_id))
+    return {'$in': refs}
+
+
+def migrate_cabinet_refs(db, collection, to_strings=False, batch_size=MIGRATE_BATCH_SIZE,
+                         pause_seconds=MIGRATE_PAUSE_SECONDS, progress=None):
+    """Rewrite `cabinet_id` in one collection into the other form; safe to re-run.
+
+    Documents are taken in _id order, `batch_size` at a time, with a pause of
+    `pause_seconds` after each batch so the rewrite does not crowd out
+    requests. Only documents still in the old form are read, so a run that
+    was interrupted carries on where it stopped. Each write is guarded on
+    the value that was read. `progress(rewritten)` is called after each
+    batch when given. Returns (rewritten, skipped): references that are not
+    valid ObjectIds are left as they are and counted as skipped.
+    """
+    old_type = 'objectId' if to_strings else 'string'
+    rewritten = skipped = 0
+    last_id = None
+    while True:
+        query = {'cabinet_id': {'$type': old_type}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        documents = list(db[collection].find(query, {'cabinet_id': 1}).sort('_id', 1).limit(batch_size))
+        if not documents:
+            return rewritten, skipped
+        last_id = documents[-1]['_id']
+        operations = []
+        for document in documents:
+            stored = document['cabinet_id']
+            if to_strings:
+                target = str(stored)
+            elif ObjectId.is_valid(stored):
+                target = ObjectId(stored)
+            else:
+                skipped += 1
+                continue
+            operations.append(UpdateOne(
+                {'_id': document['_id'], 'cabinet_id': stored}, {'$set': {'cabinet_id': target}}
+            ))
+        if operations:
+            rewritten += db[collection].bulk_write(operations, ordered=False).modified_count
+        if progress:
+            progress(rewritten)
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+@job_type('migrate_cabinet_refs')
+def _migrate_cabinet_refs_job(store, job):
+    """Backfill `cabinet_id` as an ObjectId (or back to a string with `to_strings`).
+
+    Nothing a client sees changes, so neither note nor cabinet versions are
+    bumped and cached listings stay valid. Only MongoDB stores the two forms
+    differently; SQLite keeps references as text either way.
+    """
+    to_strings = bool(job.params.get('to_strings'))
+    if store.backend != 'mongo':
+        return {'rewritten': 0, 'skipped': 0, 'reason': f'{store.backend} storage keeps one form'}
+    if to_strings == (_settings['format'] == OBJECTID):
+        return {'rewritten': 0, 'skipped': 0, 'reason': f"CABINET_ID_FORMAT is {_settings['format']!r}"}
+    db = store.db
+    batch_size = job.params.get('batch_size') or _settings['batch_size']
+    pause_seconds = job.params.get('pause_seconds', _settings['pause_seconds'])
+    old_type = 'objectId' if to_strings else 'string'
+    total = sum(
+        db[collection].count_documents({'cabinet_id': {'$type': old_type}})
+        for collection in REFERENCING_COLLECTIONS
+    )
+    job.progress(0, total)
+    result = {'rewritten': 0, 'skipped': 0}
+    for collection in REFERENCING_COLLECTIONS:
+        done = result['rewritten'] + result['skipped']
+        rewritten, skipped = migrate_cabinet_refs(
+            db, collection, to_strings, batch_size, pause_seconds,
+            progress=lambda rewritten: job.progress(done + rewritten, total)
+        )
+        result['rewritten'] += rewritten
+        result['skipped'] += skipped
+        logger.info("Rewrote %d cabinet references in %s (%d skipped)", rewritten, collection, skipped)
+    return result
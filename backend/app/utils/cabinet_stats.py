@@ -0,0 +1,203 @@
+# backend/app/utils/cabinet_stats.py
+import logging
+from collections import Counter, defaultdict
+from datetime import datetime
+from bson.objectid import ObjectId
+from .cabinet_refs import cabinet_key, cabinets_match
+from .content_codec import decompress_text
+from .jobs import job_type
+from .list_cache import get_list_cache
+
+logger = logging.getLogger(__name__)
+
+# Cabinet field holding the materialized counters:
+#   notes          - number of notes
+#   types          - note count per note type
+#   content_bytes  - UTF-8 size of the notes' stored `content`
+#   last_activity  - time of the latest write to the cabinet or its notes
+# It is created by the first write and left out of cabinet responses unless
+# asked for with `?with_stats=1`.
+STATS_FIELD = 'stats'
+
+# Cabinet projection for responses without the counters
+WITHOUT_STATS = {STATS_FIELD: 0}
+
+# Note fields a write must know the previous value of to adjust the counters
+STATS_NOTE_FIELDS = {'type': 1, 'content_bytes': 1}
+
+# Client-writable note fields whose changes move the counters
+STATS_SOURCES = frozenset({'type', 'content'})
+
+# Counted under this type when a note's type cannot be used as a field name
+OTHER_TYPE = 'other'
+
+RECONCILE_BATCH_SIZE = 500
+
+
+def content_bytes(content):
+    """Stored size of a note's content; kept on the note as `content_bytes`"""
+    return len(content.encode('utf-8')) if isinstance(content, str) else 0
+
+
+def empty_stats(last_activity=None):
+    return {'notes': 0, 'types': {}, 'content_bytes': 0, 'last_activity': last_activity}
+
+
+def wants_stats(request):
+    """True when the client asked for cabinet counters via `?with_stats=1`"""
+    return request.args.get('with_stats', '').lower() in ('1', 'true', 'yes')
+
+
+def cabinet_projection(with_stats):
+    return None if with_stats else WITHOUT_STATS
+
+
+def with_default_stats(cabinet):
+    """Fill in the counters of a cabinet nothing has been written to yet"""
+    stats = empty_stats(cabinet.get('updated_at'))
+    stats.update(cabinet.get(STATS_FIELD) or {})
+    cabinet[STATS_FIELD] = stats
+    return cabinet
+
+
+def _type_key(note_type):
+    if note_type is None:
+        return 'standard'
+    if not isinstance(note_type, str) or not note_type or '.' in note_type or note_type.startswith('$'):
+        return OTHER_TYPE
+    return note_type
+
+
+def note_footprint(note):
+    """(type, content bytes) a stored note adds to its cabinet's counters"""
+    return _type_key(note.get('type')), note.get('content_bytes') or 0
+
+
+def updated_footprint(before, fields, removed=()):
+    """Footprint of a note with footprint `before` after setting `fields` and unsetting `removed`"""
+    note = {'type': before[0], 'content_bytes': before[1]}
+    for name in removed:
+        note.pop(name, None)
+    note.update({name: value for name, value in fields.items() if name in STATS_NOTE_FIELDS})
+    return note_footprint(note)
+
+
+def stats_change(before=None, after=None):
+    """`$inc` amounts that move a cabinet's counters from one note footprint to another.
+
+    Either side may be None, for a note that is being created or deleted.
+    Changes of several notes add up with `Counter.update`; `+` would drop
+    the negative amounts.
+    """
+    change = Counter()
+    for footprint, sign in ((before, -1), (after, 1)):
+        if footprint is None:
+            continue
+        note_type, size = footprint
+        change[f'{STATS_FIELD}.notes'] += sign
+        change[f'{STATS_FIELD}.types.{note_type}'] += sign
+        change[f'{STATS_FIELD}.content_bytes'] += sign * size
+    return change
+
+
+def touch_cabinet(store, cabinet_id):
+    """Move a cabinet's last activity forward for writes that leave its version alone"""
+    if cabinet_id and ObjectId.is_valid(cabinet_id):
+        store.cabinets.update(cabinet_id, {'$max': {f'{STATS_FIELD}.last_activity': datetime.utcnow()}})
+
+
+def stats_pipeline(cabinet_ids):
+    """Note count and content size per cabinet and note type"""
+    return [
+        {'$match': {'cabinet_id': cabinets_match(cabinet_ids)}},
+        {'$group': {
+            '_id': {'cabinet_id': '$cabinet_id', 'type': '$type'},
+            'notes': {'$sum': 1},
+            'content_bytes': {'$sum': '$content_bytes'},
+        }},
+    ]
+
+
+def backfill_content_bytes(store, batch_size=RECONCILE_BATCH_SIZE):
+    """Store `content_bytes` on notes written before it existed; returns how many were filled"""
+    filled = 0
+    while True:
+        notes = store.notes.without_field('content_bytes', {'content': 1}, batch_size)
+        if not notes:
+            return filled
+        # A write that lands in between sets the field itself, so the guard skips it
+        store.notes.bulk_update([
+            (
+                note['_id'],
+                {'$set': {'content_bytes': content_bytes(decompress_text(note.get('content')))}},
+                {'content_bytes': None}
+            )
+            for note in notes
+        ])
+        filled += len(notes)
+
+
+def counted_stats(store, cabinet_ids):
+    """Counters recomputed from the notes themselves, by cabinet id"""
+    counted = defaultdict(empty_stats)
+    for cabinet_id, note_type, notes, size in store.notes.type_totals(cabinet_ids):
+        stats = counted[cabinet_key(cabinet_id)]
+        note_type = _type_key(note_type)
+        stats['notes'] += notes
+        stats['types'][note_type] = stats['types'].get(note_type, 0) + notes
+        stats['content_bytes'] += size
+    return counted
+
+
+def _drifted(stored, counted):
+    stored = stored or {}
+    stored_types = {name: count for name, count in (stored.get('types') or {}).items() if count}
+    return (
+        stored.get('notes', 0) != counted['notes']
+        or stored.get('content_bytes', 0) != counted['content_bytes']
+        or stored_types != counted['types']
+    )
+
+
+@job_type('reconcile_cabinet_stats')
+def reconcile_cabinet_stats(store, job):
+    """Recount every live cabinet's notes and overwrite counters that drifted.
+
+    Counters can drift when a process dies between a note write and the
+    cabinet update that follows it, and cabinets that had notes before the
+    counters existed start without them. Each repair is guarded by the
+    cabinet version read before counting, so a cabinet written to in the
+    meantime is left for the next run rather than overwritten with stale
+    numbers.
+    """
+    batch_size = job.params.get('batch_size') or RECONCILE_BATCH_SIZE
+    backfilled = backfill_content_bytes(store, batch_size)
+
+    cabinets = store.cabinets.list({'version': 1, STATS_FIELD: 1, 'updated_at': 1})
+    job.progress(0, len(cabinets))
+    repaired = 0
+    for start in range(0, len(cabinets), batch_size):
+        chunk = cabinets[start:start + batch_size]
+        counted = counted_stats(store, [str(cabinet['_id']) for cabinet in chunk])
+        for cabinet in chunk:
+            cabinet_id = str(cabinet['_id'])
+            expected = counted[cabinet_id]
+            stored = cabinet.get(STATS_FIELD)
+            if not _drifted(stored, expected):
+                continue
+            update = {
+                '$set': {
+                    f'{STATS_FIELD}.notes': expected['notes'],
+                    f'{STATS_FIELD}.types': expected['types'],
+                    f'{STATS_FIELD}.content_bytes': expected['content_bytes'],
+                },
+                '$inc': {'version': 1},
+            }
+            if cabinet.get('updated_at') is not None:
+                update['$max'] = {f'{STATS_FIELD}.last_activity': cabinet['updated_at']}
+            if store.cabinets.update(cabinet_id, update, expect={'version': cabinet.get('version')}):
+                repaired += 1
+                get_list_cache().invalidate(cabinet_id)
+                logger.info("Repaired stats of cabinet %s: %s -> %s", cabinet_id, stored, expected)
+        job.progress(start + len(chunk), len(cabinets))
+    return {'cabinets': len(cabinets), 'repaired': repaired, 'backfilled': backfilled}
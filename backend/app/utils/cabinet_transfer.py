@@ -0,0 +1,310 @@
+# backend/app/utils/cabinet_transfer.py
+import io
+import logging
+import shutil
+import tempfile
+import zipfile
+from collections import Counter, defaultdict
+from datetime import datetime
+from bson.objectid import ObjectId
+from .cabinet_refs import cabinet_ref
+from .cabinet_stats import note_footprint, stats_change
+from .calendar_entries import CalendarEntryError, serialize_entry
+from .json_provider import dumps_bytes, loads_bytes
+from .note_listing import INTERNAL_FIELDS
+from .note_writes import prepare_new_note
+from .ordering import allocate_orders
+from .versioning import bump_cabinet_version
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the layout of an export changes incompatibly
+EXPORT_FORMAT = 1
+
+# Name of the NDJSON file inside zip exports
+ARCHIVE_MEMBER = 'cabinet.ndjson'
+
+ZIP_MIMETYPE = 'application/zip'
+
+# Stored note fields left out of exports; they are rebuilt on import
+EXPORT_PROJECTION = dict({name: 0 for name in INTERNAL_FIELDS}, cabinet_id=0, version=0)
+
+# Note fields an import never takes from the file
+IMPORT_IGNORED_FIELDS = frozenset(INTERNAL_FIELDS) | {'_id', 'cabinet_id', 'version', 'order'}
+
+# Uploads up to this size are spooled in memory before the zip is opened
+ARCHIVE_SPOOL_BYTES = 8 * 1024 * 1024
+
+READ_CHUNK_BYTES = 64 * 1024
+
+# Most per-line errors listed in an import summary; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class TransferError(ValueError):
+    """Raised when an import upload is not a readable cabinet export"""
+
+
+def export_lines(store, cabinet_id, cabinet_fields, batch_size):
+    """NDJSON chunks of a cabinet export: a header line, then the notes in order.
+
+    Notes are read with one cursor and written out a batch at a time.
+    Calendar notes get their entries inlined as `calendarData`, fetched
+    with one query per batch.
+    """
+    yield dumps_bytes({'kind': 'cabinet', 'format': EXPORT_FORMAT, 'cabinet': cabinet_fields}) + b'\n'
+
+    cursor = store.notes.list(cabinet_id, EXPORT_PROJECTION, batch_size=batch_size)
+    batch = []
+    try:
+        for note in cursor:
+            batch.append(note)
+            if len(batch) >= batch_size:
+                yield _export_batch(store, batch)
+                batch = []
+        if batch:
+            yield _export_batch(store, batch)
+    except Exception as e:
+        # Headers are already sent; a truncated export fails to import cleanly
+        logger.error("Error while exporting cabinet %s: %s", cabinet_id, e)
+    finally:
+        cursor.close()
+
+
+def _export_batch(store, notes):
+    calendar_ids = [note['_id'] for note in notes if note.get('type') == 'calendar']
+    entries = defaultdict(list)
+    if calendar_ids:
+        for entry in store.calendar_entries.for_notes(calendar_ids):
+            entries[entry['note_id']].append(serialize_entry(entry))
+
+    lines = []
+    for note in notes:
+        if note.get('type') == 'calendar':
+            note['calendarData'] = entries.get(note['_id'], [])
+        lines.append(dumps_bytes({'kind': 'note', 'note': note}))
+    return b'\n'.join(lines) + b'\n'
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable file that hands back whatever was written to it"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def zip_stream(chunks, member_name=ARCHIVE_MEMBER):
+    """Deflate NDJSON chunks into a single-file zip archive as they arrive.
+
+    zipfile falls back to data descriptors on an unseekable file, so the
+    archive is produced front to back without knowing its size up front.
+    """
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(member_name, 'w', force_zip64=True) as member:
+            for chunk in chunks:
+                member.write(chunk)
+                data = sink.take()
+                if data:
+                    yield data
+    yield sink.take()
+
+
+def iter_lines(stream, chunk_size=READ_CHUNK_BYTES):
+    """Yield the lines of a binary stream without reading all of it"""
+    # Pieces of a line longer than one chunk are joined once, not per chunk
+    partial = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = chunk.split(b'\n')
+        if len(lines) == 1:
+            partial.append(chunk)
+            continue
+        lines[0] = b''.join(partial) + lines[0]
+        partial = [lines.pop()]
+        yield from lines
+    tail = b''.join(partial)
+    if tail:
+        yield tail
+
+
+def archive_lines(stream, chunk_size=READ_CHUNK_BYTES):
+    """Lines of the NDJSON file inside an uploaded zip export.
+
+    The central directory sits at the end of a zip, so the upload is spooled
+    (to disk past ARCHIVE_SPOOL_BYTES) before the member is read line by line.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_BYTES) as spool:
+        shutil.copyfileobj(stream, spool, chunk_size)
+        spool.seek(0)
+        yield from _member_lines(spool, chunk_size)
+
+
+def _member_lines(spool, chunk_size):
+    try:
+        archive = zipfile.ZipFile(spool)
+    except zipfile.BadZipFile:
+        raise TransferError('The upload is not a zip archive')
+    with archive:
+        names = [name for name in archive.namelist() if name.endswith('.ndjson')]
+        if not names:
+            raise TransferError('The archive holds no .ndjson file')
+        with archive.open(names[0]) as member:
+            yield from iter_lines(member, chunk_size)
+
+
+def upload_lines(request):
+    """Lines of an import upload, zipped or plain NDJSON depending on its Content-Type"""
+    if request.mimetype == ZIP_MIMETYPE:
+        return archive_lines(request.stream)
+    return iter_lines(request.stream)
+
+
+def spooled_upload_lines(mimetype, spool):
+    """upload_lines for an upload already copied to a seekable file, which must stay open"""
+    spool.seek(0)
+    if mimetype == ZIP_MIMETYPE:
+        return _member_lines(spool, READ_CHUNK_BYTES)
+    return iter_lines(spool)
+
+
+def _records(lines):
+    """(line number, parsed object or the parse error) for each non-blank line"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, loads_bytes(line)
+        except ValueError as e:
+            yield number, TransferError(f'Invalid JSON: {e}')
+
+
+def read_header(records):
+    """Cabinet fields from the first record of an export; the remaining records are notes"""
+    _, header = next(records, (0, None))
+    if (
+        not isinstance(header, dict) or header.get('kind') != 'cabinet'
+        or not isinstance(header.get('cabinet'), dict)
+    ):
+        raise TransferError('The first line must be a cabinet export header')
+    if header.get('format') != EXPORT_FORMAT:
+        raise TransferError(f"Unsupported export format: {header.get('format')}")
+    return header['cabinet']
+
+
+def open_export(lines):
+    """Parse the header of an export; returns its cabinet fields and an iterator of note records"""
+    records = _records(lines)
+    return read_header(records), records
+
+
+class NoteImport:
+    """Writes the notes of an export into a cabinet, a batch at a time.
+
+    Each batch is sanitized and prepared like POST /api/notes would, gets
+    its orders from one increment of the cabinet counter and is written with
+    one bulk insert (plus one for calendar entries), so memory stays
+    bounded by the batch size whatever the size of the export. Notes keep
+    their relative order and are appended after any already in the cabinet.
+    `stats` sums the cabinet counter changes of the notes written, for the
+    version bump that follows the import.
+    """
+
+    def __init__(self, store, cabinet_id, batch_size):
+        self.store = store
+        self.cabinet_id = cabinet_id
+        self.batch_size = batch_size
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.stats = Counter()
+
+    def _fail(self, number, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': number, 'error': str(error)})
+
+    def run(self, records):
+        batch = []
+        for number, record in records:
+            if isinstance(record, Exception):
+                self._fail(number, record)
+                continue
+            if not isinstance(record, dict) or record.get('kind') != 'note' or not isinstance(record.get('note'), dict):
+                self._fail(number, 'Expected a note record')
+                continue
+            batch.append((number, record['note']))
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+        return self.summary()
+
+    def _write(self, batch):
+        notes = []
+        entries = []
+        now = datetime.utcnow()
+        for number, note in batch:
+            note = {name: value for name, value in note.items() if name not in IMPORT_IGNORED_FIELDS}
+            note['cabinet_id'] = cabinet_ref(self.cabinet_id)
+            try:
+                calendar_entries = prepare_new_note(note)
+            except CalendarEntryError as e:
+                self._fail(number, e)
+                continue
+            note['_id'] = ObjectId()
+            notes.append(note)
+            for date, content in (calendar_entries or {}).items():
+                entries.append({
+                    'note_id': note['_id'], 'date': date, 'content': content,
+                    'cabinet_id': cabinet_ref(self.cabinet_id), 'updated_at': now
+                })
+        if not notes:
+            return
+
+        orders = allocate_orders(self.store, self.cabinet_id, len(notes))
+        if orders is None:
+            raise TransferError('Cabinet not found')
+        for note, order in zip(notes, orders):
+            note['order'] = order
+        self.store.notes.insert_many(notes)
+        if entries:
+            self.store.calendar_entries.insert_many(entries)
+        self.imported += len(notes)
+        for note in notes:
+            self.stats.update(stats_change(after=note_footprint(note)))
+
+    def summary(self):
+        return {'imported': self.imported, 'failed': self.failed, 'errors': self.errors}
+
+
+def import_notes(store, cabinet_id, records, batch_size):
+    """Run a NoteImport of `records` into a cabinet and bump its version; the summary"""
+    importer = NoteImport(store, cabinet_id, batch_size)
+    try:
+        return importer.run(records)
+    finally:
+        # Batches written before a failure still count
+        bump_cabinet_version(store, cabinet_id, importer.stats)
+
+
+def export_filename(name, extension):
+    """Download name for a cabinet export, reduced to characters safe in a header"""
+    stem = ''.join(c if (c.isascii() and c.isalnum()) or c in '-_' else '-' for c in (name or 'cabinet')).strip('-')
+    return f"{stem or 'cabinet'}.{extension}"
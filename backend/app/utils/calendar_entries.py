@@ -0,0 +1,102 @@
+# backend/app/utils/calendar_entries.py
+import logging
+from datetime import datetime
+from .jobs import job_type
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarEntryError(ValueError):
+    """Raised when a calendar date or entry payload is malformed"""
+
+
+def parse_date(value, name='date'):
+    """Validate a YYYY-MM-DD day; stored as a string so ranges compare lexicographically"""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise CalendarEntryError(f'{name} must be a YYYY-MM-DD date')
+
+
+def serialize_entry(entry):
+    return {'date': entry['date'], 'content': entry.get('content', '')}
+
+
+def normalize_entries(entries):
+    """Map of date -> content for an inline calendarData array, last entry per day wins"""
+    if not isinstance(entries, list):
+        raise CalendarEntryError('calendarData must be a list')
+    normalized = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise CalendarEntryError('Each calendar entry must be an object')
+        content = entry.get('content', '')
+        if not isinstance(content, str):
+            raise CalendarEntryError('Calendar entry content must be a string')
+        normalized[parse_date(entry.get('date'))] = content
+    return normalized
+
+
+def upsert_entry(store, note_object_id, cabinet_id, date, content):
+    store.calendar_entries.upsert(note_object_id, cabinet_id, {date: content})
+
+
+def replace_entries(store, note_object_id, cabinet_id, normalized):
+    """Make the stored entries of a note match a normalized calendarData array"""
+    store.calendar_entries.upsert(note_object_id, cabinet_id, normalized)
+    store.calendar_entries.delete_other_dates(note_object_id, normalized)
+
+
+def migrate_note(store, note):
+    """Move a note's inline calendarData into the entries collection.
+
+    The inline array is only removed if nobody rewrote it in the meantime.
+    Returns True when the note was migrated.
+    """
+    inline = note.get('calendarData')
+    if inline is None:
+        return False
+    try:
+        normalized = normalize_entries(inline)
+    except CalendarEntryError as e:
+        logger.error("Skipping calendar migration of note %s: %s", note['_id'], e)
+        return False
+
+    store.calendar_entries.upsert(note['_id'], note.get('cabinet_id'), normalized)
+    return store.notes.update(
+        note['_id'], {'$unset': {'calendarData': '', 'search_calendar': ''}},
+        expect={'calendarData': inline}
+    )
+
+
+def load_note(store, note_object_id):
+    """A note's _id and cabinet, moving any inline calendarData into the entries collection first"""
+    note = store.notes.get(note_object_id, {'cabinet_id': 1, 'calendarData': 1})
+    if note and 'calendarData' in note:
+        migrate_note(store, note)
+    return note
+
+
+def migrate_inline_calendar_data(store, batch_size=200, progress=None):
+    """Migrate every note that still stores calendarData inline; safe to re-run.
+
+    `progress(migrated)` is called after every `batch_size` notes when given.
+    """
+    migrated = 0
+    cursor = store.notes.with_field('calendarData', {'calendarData': 1, 'cabinet_id': 1}, batch_size)
+    for seen, note in enumerate(cursor, 1):
+        if migrate_note(store, note):
+            migrated += 1
+        if progress and seen % batch_size == 0:
+            progress(migrated)
+    return migrated
+
+
+@job_type('migrate_calendar_data')
+def _migrate_calendar_job(store, job):
+    total = store.notes.count(field='calendarData')
+    job.progress(0, total)
+    migrated = migrate_inline_calendar_data(
+        store, progress=lambda migrated: job.progress(migrated, total)
+    )
+    return {'migrated': migrated}
@@ -0,0 +1,387 @@
+# backend/app/utils/change_feed.py
+import logging
+import secrets
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+from . import metrics
+from .cabinet_refs import cabinet_key, cabinet_match
+from .content_codec import COMPRESSED_FIELDS
+from .json_provider import dumps_bytes
+from .note_listing import INTERNAL_FIELDS, strip_internal_fields
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_SOURCES = ('auto', 'mongo', 'local')
+
+EVENT_STREAM_MIMETYPE = 'text/event-stream'
+
+# How long EventSource clients wait before reconnecting
+RETRY_MS = 2000
+
+# `token` is the resume token a client hands back to pick up after this event
+ChangeEvent = namedtuple('ChangeEvent', ['token', 'cabinet_id', 'type', 'data'])
+
+# First event of every stream. `ready` means nothing was missed since the
+# resume token (if any); `reset` means events were lost and the client should
+# refetch the cabinet before applying what follows.
+READY = 'ready'
+RESET = 'reset'
+
+# Note fields that never appear in events
+HIDDEN_NOTE_FIELDS = frozenset(INTERNAL_FIELDS) | {'_id', 'cabinet_id', 'version'}
+
+# Cabinet fields the server maintains for its own bookkeeping
+HIDDEN_CABINET_FIELDS = frozenset({'_id', 'version', 'last_order', 'deleted_name', 'stats'})
+
+# A change stream delete only carries the document key, not the cabinet the
+# note was in, so with change streams the delete routes also insert a short
+# lived record here and subscribers hear of the delete through it
+NOTE_DELETIONS_COLLECTION = 'note_deletions'
+NOTE_DELETION_TTL_SECONDS = 3600
+
+
+def _visible(values, hidden):
+    return {
+        name: value for name, value in values.items()
+        if name.split('.', 1)[0] not in hidden
+    }
+
+
+def note_update_event(note_id, version, fields, removed=()):
+    """(type, data) for a write that set `fields` and unset `removed` on a note.
+
+    `fields` may be a raw $set document; internal fields are dropped. Writes
+    that only moved the note become a `notes_reordered` event.
+    """
+    fields = _visible(fields, HIDDEN_NOTE_FIELDS)
+    removed = [name for name in removed if name.split('.', 1)[0] not in HIDDEN_NOTE_FIELDS]
+    if set(fields) == {'order'} and not removed:
+        return 'notes_reordered', {'notes': [{'_id': note_id, 'order': fields['order']}]}
+    return 'note_updated', {'_id': note_id, 'version': version, 'fields': fields, 'removed': removed}
+
+
+def note_created_event(note):
+    """(type, data) for a newly inserted note document"""
+    note = dict(note)
+    strip_internal_fields(note)
+    return 'note_created', {'note': note}
+
+
+def cabinet_update_event(fields):
+    """(type, data) for a cabinet write, or None for bookkeeping-only writes"""
+    if 'deleted_at' in fields:
+        return 'cabinet_deleted', {}
+    fields = _visible(fields, HIDDEN_CABINET_FIELDS)
+    if not fields:
+        return None
+    return 'cabinet_updated', {'fields': fields}
+
+
+def note_deletion_record(cabinet_id, note_id):
+    """Document announcing a note delete to change stream subscribers of its cabinet"""
+    return {'cabinet_id': cabinet_key(cabinet_id), 'note_id': note_id, 'deleted_at': datetime.utcnow()}
+
+
+def publish_events(feed, events):
+    """Publish (cabinet_id, type, data) triples; run off the event loop in app.aio"""
+    for cabinet_id, event_type, data in events:
+        feed.publish(cabinet_id, event_type, data)
+
+
+def sse_frame(event):
+    """Encode a ChangeEvent, or None for a keepalive, as a Server-Sent Events frame"""
+    if event is None:
+        return b': keepalive\n\n'
+    data = dict(event.data, cabinet_id=event.cabinet_id)
+    frame = b'event: ' + event.type.encode('utf-8') + b'\ndata: ' + dumps_bytes(data) + b'\n\n'
+    if event.token is not None:
+        frame = b'id: ' + event.token.encode('utf-8') + b'\n' + frame
+    return frame
+
+
+def event_stream(feed, cabinet_id, token, heartbeat_seconds, max_seconds):
+    """Body of a change feed response, closed after `max_seconds`.
+
+    EventSource reconnects on its own with the last id it saw, so ending
+    long-lived streams only frees the worker, it loses nothing.
+    """
+    deadline = time.monotonic() + max_seconds
+    metrics.CHANGE_FEED_SUBSCRIBERS.inc()
+    try:
+        yield f'retry: {RETRY_MS}\n\n'.encode('utf-8')
+        for event in feed.listen(cabinet_id, token, heartbeat_seconds):
+            if event is not None:
+                metrics.CHANGE_FEED_EVENTS.inc(event.type)
+            yield sse_frame(event)
+            if time.monotonic() >= deadline:
+                break
+    finally:
+        metrics.CHANGE_FEED_SUBSCRIBERS.dec()
+
+
+class LocalChangeFeed:
+    """In-process pub/sub fed by the write routes themselves.
+
+    Events go into one bounded buffer shared by all cabinets, numbered by a
+    sequence that is only meaningful within this process; tokens carry a
+    per-process epoch so a token from another worker or an earlier run is
+    recognized and answered with a `reset`. Only writes handled by this
+    process are seen, so multi-worker deployments need change streams.
+    """
+
+    source = 'local'
+
+    def __init__(self, buffer_size=10000):
+        self._epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._events = deque(maxlen=buffer_size)
+        self._condition = threading.Condition()
+        self._async_waiters = set()
+
+    def _token(self, seq):
+        return f'{self._epoch}-{seq}'
+
+    def _parse(self, token):
+        """Sequence number a token refers to, or None when it cannot be replayed from"""
+        epoch, _, seq = (token or '').partition('-')
+        if epoch != self._epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def publish(self, cabinet_id, event_type, data):
+        # Notes may hold their cabinet reference in either stored form
+        cabinet_id = cabinet_key(cabinet_id)
+        with self._condition:
+            self._seq += 1
+            self._events.append(ChangeEvent(self._token(self._seq), cabinet_id, event_type, data))
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, flag in waiters:
+            loop.call_soon_threadsafe(flag.set)
+
+    def add_waiter(self, waiter):
+        """Register a (loop, asyncio.Event) pair to be set on every publish"""
+        with self._condition:
+            self._async_waiters.add(waiter)
+
+    def remove_waiter(self, waiter):
+        with self._condition:
+            self._async_waiters.discard(waiter)
+
+    def _marker(self, cabinet_id, kind, seq):
+        return ChangeEvent(self._token(seq), cabinet_id, kind, {'source': self.source})
+
+    def _oldest_seq(self):
+        return self._seq - len(self._events) + 1
+
+    def start(self, cabinet_id, token):
+        """Position to stream from and the `ready` or `reset` event to open with"""
+        with self._condition:
+            seq = self._parse(token) if token else self._seq
+            if seq is None or seq > self._seq or seq < self._oldest_seq() - 1:
+                return self._seq, self._marker(cabinet_id, RESET, self._seq)
+            return seq, self._marker(cabinet_id, READY, seq)
+
+    def poll(self, cabinet_id, seq):
+        """Events for a cabinet (None for all) published after `seq`, and the new position"""
+        with self._condition:
+            if seq < self._oldest_seq() - 1:
+                # The subscriber fell further behind than the buffer reaches
+                return [self._marker(cabinet_id, RESET, self._seq)], self._seq
+            # Indexing a deque is cheap near its ends, where new events are
+            count = len(self._events)
+            events = [
+                event for event in (self._events[i] for i in range(count - (self._seq - seq), count))
+                if cabinet_id is None or event.cabinet_id in (cabinet_id, None)
+            ]
+            return events, self._seq
+
+    def wait(self, seq, timeout):
+        """Block until something is published after `seq`, or `timeout` passes"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._seq > seq, timeout)
+
+    def listen(self, cabinet_id, token, timeout):
+        """Yield events as they are published; None after each idle `timeout`"""
+        seq, first = self.start(cabinet_id, token)
+        yield first
+        last_sent = time.monotonic()
+        while True:
+            events, seq = self.poll(cabinet_id, seq)
+            for event in events:
+                yield event
+            if events:
+                last_sent = time.monotonic()
+                continue
+            # Events for other cabinets wake us too, so idleness is timed here
+            idle = time.monotonic() - last_sent
+            if idle >= timeout:
+                yield None
+                last_sent = time.monotonic()
+            else:
+                self.wait(seq, timeout - idle)
+
+
+def change_pipeline(cabinet_id):
+    """Change stream pipeline for the note and cabinet events of one cabinet (None for all)"""
+    match = {
+        'ns.coll': {'$in': ['notes', 'cabinets', NOTE_DELETIONS_COLLECTION]},
+        'operationType': {'$in': ['insert', 'update', 'replace', 'delete']},
+        # Note deletes cannot be told apart by cabinet; their deletion records
+        # are followed instead, and the records' own expiry is not news
+        '$nor': [
+            {'ns.coll': 'notes', 'operationType': 'delete'},
+            {'ns.coll': NOTE_DELETIONS_COLLECTION, 'operationType': {'$ne': 'insert'}},
+        ],
+    }
+    if cabinet_id is not None:
+        match['$or'] = [
+            {'fullDocument.cabinet_id': cabinet_match(cabinet_id)},
+            {'ns.coll': 'cabinets', 'documentKey._id': ObjectId(cabinet_id)},
+        ]
+    return [
+        {'$match': match},
+        # Only inserts and replaces need the whole document
+        {'$project': {
+            'operationType': 1, 'ns': 1, 'documentKey': 1, 'updateDescription': 1,
+            'fullDocument': {'$cond': [
+                {'$in': ['$operationType', ['insert', 'replace']]},
+                '$fullDocument',
+                {'cabinet_id': '$fullDocument.cabinet_id'},
+            ]},
+        }},
+    ]
+
+
+def change_event(change):
+    """ChangeEvent for one change stream document, or None when clients need not hear of it"""
+    token = change['_id']['_data']
+    operation = change['operationType']
+    document_id = change['documentKey']['_id']
+    document = change.get('fullDocument') or {}
+
+    if change['ns']['coll'] == 'cabinets':
+        cabinet_id = str(document_id)
+        if operation == 'insert':
+            return ChangeEvent(token, cabinet_id, 'cabinet_created', {'cabinet': document})
+        if operation == 'delete':
+            # Purges remove the document long after the soft delete was announced
+            return None
+        if operation == 'replace':
+            fields = dict(document)
+        else:
+            fields = change['updateDescription']['updatedFields']
+        event = cabinet_update_event(fields)
+        return ChangeEvent(token, cabinet_id, *event) if event else None
+
+    if change['ns']['coll'] == NOTE_DELETIONS_COLLECTION:
+        if operation != 'insert':
+            return None
+        return ChangeEvent(token, document.get('cabinet_id'), 'note_deleted', {'_id': document.get('note_id')})
+
+    if operation == 'delete':
+        # Announced through NOTE_DELETIONS_COLLECTION with the cabinet it was in
+        return None
+    cabinet_id = cabinet_key(document.get('cabinet_id'))
+    if operation == 'insert':
+        return ChangeEvent(token, cabinet_id, *note_created_event(document))
+    if operation == 'replace':
+        event_type, data = note_update_event(document_id, document.get('version'), document)
+        return ChangeEvent(token, cabinet_id, event_type, data)
+
+    description = change['updateDescription']
+    updated = description.get('updatedFields', {})
+    removed = description.get('removedFields', [])
+    if 'version' not in updated and not removed and set(updated) <= set(COMPRESSED_FIELDS):
+        # Every edit bumps the version; a rewrite of content alone without
+        # one only changed how it is stored (content_codec's migration)
+        return None
+    event_type, data = note_update_event(
+        document_id, updated.get('version'), updated, removed
+    )
+    if event_type == 'note_updated' and not data['fields'] and not data['removed']:
+        return None
+    return ChangeEvent(token, cabinet_id, event_type, data)
+
+
+def watch_options(token, timeout):
+    """Options for a change stream resuming after `token` (None to start now)"""
+    options = {'full_document': 'updateLookup', 'max_await_time_ms': int(timeout * 1000)}
+    if token:
+        options['resume_after'] = {'_data': token}
+    return options
+
+
+def resume_token(stream):
+    token = stream.resume_token
+    return token['_data'] if token else None
+
+
+class MongoChangeFeed:
+    """Change feed read from MongoDB change streams.
+
+    Every write reaches subscribers no matter which process made it, so
+    `publish` only has to record note deletes, whose own change events do
+    not say which cabinet the note was in. Tokens are the change stream's
+    own resume tokens; a token whose history has rolled out of the oplog
+    gets a `reset`.
+    """
+
+    source = 'mongo'
+
+    def __init__(self, db):
+        self.db = db
+
+    def publish(self, cabinet_id, event_type, data):
+        if event_type == 'note_deleted':
+            self.db[NOTE_DELETIONS_COLLECTION].insert_one(note_deletion_record(cabinet_id, data['_id']))
+
+    def listen(self, cabinet_id, token, timeout):
+        """Yield events from a change stream; None after each idle `timeout`"""
+        pipeline = change_pipeline(cabinet_id)
+        first = READY
+        try:
+            stream = self.db.watch(pipeline, **watch_options(token, timeout))
+        except OperationFailure as e:
+            if not token:
+                raise
+            logger.info("Cannot resume change stream, resetting: %s", e)
+            first = RESET
+            stream = self.db.watch(pipeline, **watch_options(None, timeout))
+
+        with stream:
+            yield ChangeEvent(resume_token(stream), cabinet_id, first, {'source': self.source})
+            while stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    yield None
+                    continue
+                event = change_event(change)
+                if event is not None:
+                    yield event
+
+
+def change_streams_available(db):
+    """Whether `db` supports change streams (a replica set or sharded cluster)"""
+    try:
+        with db.watch(max_await_time_ms=1):
+            return True
+    except Exception as e:
+        logger.debug("Change streams unavailable: %s", e)
+        return False
+
+
+def open_change_feed(store, config):
+    """The change feed CHANGE_FEED_SOURCE asks for; 'auto' prefers change streams"""
+    source = config['CHANGE_FEED_SOURCE']
+    if source not in CHANGE_FEED_SOURCES:
+        raise ValueError(f'Unknown CHANGE_FEED_SOURCE: {source}')
+    if source != 'local' and store.backend == 'mongo' and change_streams_available(store.db):
+        return MongoChangeFeed(store.db)
+    if source == 'mongo':
+        raise ValueError('CHANGE_FEED_SOURCE=mongo requires a replica set or sharded cluster')
+    return LocalChangeFeed(config['CHANGE_FEED_BUFFER'])
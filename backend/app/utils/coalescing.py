@@ -0,0 +1,113 @@
+# backend/app/utils/coalescing.py
+import asyncio
+import logging
+import threading
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is running wait for it and get the same result, or the same
+    exception. A waiter that gives up after `wait_seconds` runs the function
+    itself rather than failing. Keys must identify everything the result
+    depends on, so nothing older than a caller could have read is shared.
+    """
+
+    def __init__(self, name, enabled=True, wait_seconds=30):
+        self.name = name
+        self.enabled = enabled
+        self.wait_seconds = wait_seconds
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        if not self.enabled:
+            return function()
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            if call.done.wait(self.wait_seconds):
+                metrics.COALESCED_CALLS.inc(self.name)
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            logger.warning("Gave up waiting for a shared %s call after %ss", self.name, self.wait_seconds)
+            return function()
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop.
+
+    The shared call runs as its own task, so a caller that is cancelled
+    (say, its client went away) does not cancel it for the others.
+    """
+
+    def __init__(self, name, enabled=True, wait_seconds=30):
+        self.name = name
+        self.enabled = enabled
+        self.wait_seconds = wait_seconds
+        self._calls = {}
+
+    async def do(self, key, function):
+        if not self.enabled:
+            return await function()
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(function())
+            task.add_done_callback(lambda done: self._finished(key, done))
+            return await asyncio.shield(task)
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), self.wait_seconds)
+        except asyncio.TimeoutError:
+            logger.warning("Gave up waiting for a shared %s call after %ss", self.name, self.wait_seconds)
+            return await function()
+        metrics.COALESCED_CALLS.inc(self.name)
+        return result
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Keeps asyncio from logging an error nobody was left to receive
+        if not task.cancelled():
+            task.exception()
+
+
+# Cabinet note listings, the read many tabs issue at once for the same cabinet
+listings = SingleFlight('cabinet_listing', enabled=False)
+async_listings = AsyncSingleFlight('cabinet_listing', enabled=False)
+
+
+def configure(config):
+    """Switch request coalescing on or off according to the app config"""
+    for flight in (listings, async_listings):
+        flight.enabled = config['COALESCE_ENABLED']
+        flight.wait_seconds = config['COALESCE_WAIT_SECONDS']
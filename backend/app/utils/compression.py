@@ -0,0 +1,120 @@
+# backend/app/utils/compression.py
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip is offered without it
+    brotli = None
+
+# Text formats worth compressing; note listings are mostly HTML inside JSON
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv',
+})
+
+
+def negotiate(accept_encodings):
+    """Content coding to answer a request's Accept-Encoding with, or None for identity"""
+    offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+    # max keeps the first offer on a tie, so brotli wins over gzip at equal quality
+    best = max(offers, key=lambda coding: accept_encodings[coding])
+    return best if accept_encodings[best] > 0 else None
+
+
+def compress(data, coding, gzip_level=6, brotli_quality=5):
+    if coding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level)
+
+
+def compress_stream(chunks, coding, gzip_level=6, brotli_quality=5):
+    """Compress a streamed body chunk by chunk, flushing so every chunk can be decoded on arrival"""
+    if coding == 'br':
+        compressor = brotli.Compressor(quality=brotli_quality)
+        for chunk in chunks:
+            data = compressor.process(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _compressible(request, response):
+    if request.method == 'HEAD' or not 200 <= response.status_code < 300 or response.status_code in (204, 206):
+        return False
+    return 'Content-Encoding' not in response.headers and response.mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _mark_encoded(response, coding):
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The encoded bytes differ from the identity representation
+        response.set_etag(etag, weak=True)
+
+
+def init_app(app):
+    """Compress Flask responses for clients that accept gzip or brotli"""
+    from flask import request
+    min_bytes = app.config['COMPRESSION_MIN_BYTES']
+    levels = {
+        'gzip_level': app.config['COMPRESSION_GZIP_LEVEL'],
+        'brotli_quality': app.config['COMPRESSION_BROTLI_QUALITY'],
+    }
+
+    @app.after_request
+    def compress_response(response):
+        if not _compressible(request, response):
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = negotiate(request.accept_encodings)
+        if coding is None:
+            return response
+
+        if response.is_streamed:
+            # NDJSON listings: their size is unknown up front, so always compress
+            response.response = compress_stream(response.response, coding, **levels)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_bytes:
+                return response
+            response.set_data(compress(data, coding, **levels))
+        _mark_encoded(response, coding)
+        return response
+
+
+def init_async_app(app):
+    """init_app for the Quart app in app.aio; streamed bodies are sent as is"""
+    from quart import request
+    from quart.wrappers.response import DataBody
+    min_bytes = app.config['COMPRESSION_MIN_BYTES']
+    levels = {
+        'gzip_level': app.config['COMPRESSION_GZIP_LEVEL'],
+        'brotli_quality': app.config['COMPRESSION_BROTLI_QUALITY'],
+    }
+
+    @app.after_request
+    async def compress_response(response):
+        if not _compressible(request, response):
+            return response
+        response.vary.add('Accept-Encoding')
+        coding = negotiate(request.accept_encodings)
+        if coding is None or not isinstance(response.response, DataBody):
+            return response
+
+        data = await response.get_data()
+        if len(data) < min_bytes:
+            return response
+        response.set_data(compress(data, coding, **levels))
+        _mark_encoded(response, coding)
+        return response
@@ -0,0 +1,123 @@
+# backend/app/utils/content_codec.py
+import zlib
+from bson.binary import Binary
+from .jobs import job_type
+
+# Note fields stored compressed once they reach the size threshold. Task
+# lists stay plain arrays: the per-task endpoints update them in place and
+# the task counts are aggregated from them.
+COMPRESSED_FIELDS = ('content',)
+
+# A compressed value is BSON binary of this user-defined subtype holding a
+# codec byte followed by the compressed UTF-8 text, so stored documents
+# say how to read them back whatever the settings are now
+COMPRESSED_SUBTYPE = 0x80
+CODEC_ZLIB = 1
+
+MIGRATE_BATCH_SIZE = 200
+
+_settings = {'enabled': False, 'min_bytes': 4096, 'level': 6}
+
+
+def configure(config):
+    """Apply the app's compression settings to later writes"""
+    _settings.update(
+        enabled=config['NOTE_COMPRESSION_ENABLED'],
+        min_bytes=config['NOTE_COMPRESSION_MIN_BYTES'],
+        level=config['NOTE_COMPRESSION_LEVEL'],
+    )
+
+
+def is_compressed(value):
+    return isinstance(value, Binary) and value.subtype == COMPRESSED_SUBTYPE
+
+
+def compress_text(value, min_bytes=None, level=None):
+    """Stored form of a text field: compressed when large enough and it pays off, else unchanged"""
+    if not isinstance(value, str):
+        return value
+    raw = value.encode('utf-8')
+    if len(raw) < (_settings['min_bytes'] if min_bytes is None else min_bytes):
+        return value
+    packed = zlib.compress(raw, _settings['level'] if level is None else level)
+    if len(packed) + 1 >= len(raw):
+        return value
+    return Binary(bytes([CODEC_ZLIB]) + packed, COMPRESSED_SUBTYPE)
+
+
+def decompress_text(value):
+    """Plain text of a stored field; values that were not compressed come back as they are"""
+    if not is_compressed(value):
+        return value
+    data = bytes(value)
+    if data[:1] != bytes([CODEC_ZLIB]):
+        raise ValueError(f'Unknown compression codec {data[0] if data else None}')
+    return zlib.decompress(data[1:]).decode('utf-8')
+
+
+def compress_fields(fields):
+    """Compress the large text fields of a note write in place, if compression is on.
+
+    Called last, once everything derived from the plain text (hash, size,
+    search fields) has been computed.
+    """
+    if _settings['enabled']:
+        for field in COMPRESSED_FIELDS:
+            if field in fields:
+                fields[field] = compress_text(fields[field])
+    return fields
+
+
+def plain_fields(note):
+    """Decompress the compressed fields of a stored note in place"""
+    for field in COMPRESSED_FIELDS:
+        if field in note:
+            note[field] = decompress_text(note[field])
+    return note
+
+
+def migrate_note_content(store, decompress=False, batch_size=MIGRATE_BATCH_SIZE, progress=None):
+    """Rewrite stored note content to match the compression settings; safe to re-run.
+
+    With `decompress` every compressed value is written back as plain text,
+    for turning compression off again. Each write is guarded on the value
+    that was read, so a note saved in the meantime is left as the save
+    wrote it. Versions are not bumped: what clients see does not change.
+    `progress(scanned)` is called after each batch when given. Returns how
+    many values were rewritten.
+    """
+    projection = dict.fromkeys(COMPRESSED_FIELDS, 1)
+    rewritten = scanned = 0
+    last_id = None
+    while True:
+        notes = store.notes.scan(projection, last_id, batch_size)
+        if not notes:
+            return rewritten
+        last_id = notes[-1]['_id']
+        scanned += len(notes)
+        operations = []
+        for note in notes:
+            for field in COMPRESSED_FIELDS:
+                stored = note.get(field)
+                if decompress:
+                    target = decompress_text(stored)
+                else:
+                    target = compress_text(decompress_text(stored))
+                if type(target) is not type(stored) or target != stored:
+                    operations.append((note['_id'], {'$set': {field: target}}, {field: stored}))
+        rewritten += store.notes.bulk_update(operations)
+        if progress:
+            progress(scanned)
+
+
+@job_type('compress_note_content')
+def _compress_content_job(store, job):
+    decompress = bool(job.params.get('decompress'))
+    if not decompress and not _settings['enabled']:
+        return {'rewritten': 0, 'skipped': 'compression is disabled'}
+    total = store.notes.count()
+    job.progress(0, total)
+    rewritten = migrate_note_content(
+        store, decompress, progress=lambda scanned: job.progress(scanned, total)
+    )
+    return {'rewritten': rewritten}
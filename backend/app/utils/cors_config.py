@@ -10,8 +10,8 @@ def configure_cors(app):
              r"/api/*": {
                  "origins": ["http://localhost:3000"],
                  "methods": ["GET", "HEAD", "POST", "OPTIONS", "PUT", "PATCH", "DELETE"],
-                 "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"],
-                 "expose_headers": ["Content-Type", "X-Total-Count"],
+                 "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "If-None-Match"],
+                 "expose_headers": ["Content-Type", "X-Total-Count", "ETag"],
                  "supports_credentials": True,
                  "send_wildcard": False,
                  "max_age": 86400
@@ -23,7 +23,7 @@ def configure_cors(app):
         if request.method == "OPTIONS":
             response = current_app.make_default_options_response()
             response.headers.add('Access-Control-Allow-Origin', 'http://localhost:3000')
-            response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
+            response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With,If-None-Match')
             response.headers.add('Access-Control-Allow-Methods', 'GET,HEAD,POST,OPTIONS,PUT,PATCH,DELETE')
             response.headers.add('Access-Control-Allow-Credentials', 'true')
             response.headers.add('Access-Control-Max-Age', '86400')
@@ -34,14 +34,16 @@ def configure_cors(app):
         origin = request.headers.get('Origin')
         if origin and origin == 'http://localhost:3000':
             response.headers.add('Access-Control-Allow-Origin', origin)
-            response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With')
+            response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Requested-With,If-None-Match')
             response.headers.add('Access-Control-Allow-Methods', 'GET,HEAD,POST,OPTIONS,PUT,PATCH,DELETE')
             response.headers.add('Access-Control-Allow-Credentials', 'true')
             response.headers.add('Access-Control-Max-Age', '86400')
-            response.headers.add('Access-Control-Expose-Headers', 'Content-Type,X-Total-Count')
-            # Prevent caching of responses
-            response.headers.add('Cache-Control', 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0')
-            response.headers.add('Pragma', 'no-cache')
+            response.headers.add('Access-Control-Expose-Headers', 'Content-Type,X-Total-Count,ETag')
+            # Prevent caching of responses, except versioned reads that
+            # clients revalidate with If-None-Match
+            if 'ETag' not in response.headers:
+                response.headers.add('Cache-Control', 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0')
+                response.headers.add('Pragma', 'no-cache')
         return response
 
     return app
\ No newline at end of file
@@ -0,0 +1,193 @@
+# backend/app/utils/jobs.py
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# One document per job; finished jobs expire through a TTL index on expires_at
+JOBS_COLLECTION = 'jobs'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# job type -> function(store, job), see job_type
+JOB_TYPES = {}
+
+
+def job_type(name):
+    """Register `function(store, job)` as the handler for jobs of type `name`.
+
+    Handlers run on a worker thread, report progress through `job.progress`
+    and return a JSON-serializable result. A job interrupted by a restart is
+    run again from the start, so handlers must be safe to re-run.
+    """
+    def register(function):
+        if name in JOB_TYPES:
+            raise ValueError(f'Duplicate job type {name}')
+        JOB_TYPES[name] = function
+        return function
+    return register
+
+
+class Job:
+    """What a running handler sees of its job"""
+
+    def __init__(self, runner, document):
+        self.id = document['_id']
+        self.params = document.get('params') or {}
+        self._runner = runner
+
+    def progress(self, done, total=None):
+        """Record progress; this doubles as the heartbeat that keeps the job claimed"""
+        progress = {'done': done}
+        if total is not None:
+            progress['total'] = total
+        self._runner.store.jobs.update(
+            self.id, {'$set': {'progress': progress, 'updated_at': datetime.utcnow()}}, status=RUNNING
+        )
+
+
+class JobRunner:
+    """Runs registered job types on a thread pool, persisting their state in storage.
+
+    The stored jobs are the source of truth, so any worker process can
+    answer a status poll, and jobs left queued or stalled by a crashed process
+    are picked up again by `resume`. Claiming is a conditional update, so a
+    job only ever runs in one place at a time.
+    """
+
+    def __init__(self, store, max_workers=2, stale_seconds=300, retention_seconds=86400):
+        self.store = store
+        self.stale_seconds = stale_seconds
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._stopping = threading.Event()
+
+    def submit(self, name, params=None, key=None):
+        """Queue a job and return its id.
+
+        With a `key`, at most one job per key is queued or running at a time;
+        submitting again while it is returns the id of the existing job.
+        """
+        if name not in JOB_TYPES:
+            raise ValueError(f'Unknown job type: {name}')
+        now = datetime.utcnow()
+        document = {
+            'type': name,
+            'params': params or {},
+            'status': QUEUED,
+            'progress': {'done': 0},
+            'attempts': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        if key:
+            document['active_key'] = key
+        if not self.store.jobs.insert(document):
+            existing = self.store.jobs.find_active(key)
+            if existing:
+                return str(existing)
+            # The other job finished in between; the key is free again
+            self.store.jobs.insert(document)
+        self._executor.submit(self._run, document['_id'])
+        return str(document['_id'])
+
+    def get(self, job_id):
+        if not ObjectId.is_valid(job_id):
+            return None
+        return self.store.jobs.get(ObjectId(job_id))
+
+    def resume(self):
+        """Queue every job that is waiting, or whose worker stopped heartbeating"""
+        stale = datetime.utcnow() - timedelta(seconds=self.stale_seconds)
+        resumed = 0
+        for job_id in self.store.jobs.claimable(stale):
+            self._executor.submit(self._run, job_id)
+            resumed += 1
+        if resumed:
+            logger.info("Resuming %s unfinished jobs", resumed)
+        return resumed
+
+    def schedule(self, name, params=None, interval_seconds=3600, delay_seconds=60):
+        """Submit a job every `interval_seconds`, the first after `delay_seconds`.
+
+        Submissions use the job type as their key, so a run that is still
+        going when the next one is due is not doubled up. Every process
+        schedules its own runs; with several of them the key keeps it to one
+        at a time, not one per interval.
+        """
+        if name not in JOB_TYPES:
+            raise ValueError(f'Unknown job type: {name}')
+
+        def loop():
+            delay = delay_seconds
+            while not self._stopping.wait(timeout=delay):
+                delay = interval_seconds
+                try:
+                    self.submit(name, params, key=name)
+                except Exception as e:
+                    logger.error("Error scheduling %s job: %s", name, e)
+
+        threading.Thread(target=loop, name=f'schedule-{name}', daemon=True).start()
+
+    def shutdown(self, wait=True):
+        self._stopping.set()
+        self._executor.shutdown(wait=wait)
+
+    def _claim(self, job_id):
+        now = datetime.utcnow()
+        return self.store.jobs.claim(
+            job_id, now - timedelta(seconds=self.stale_seconds),
+            {'$set': {'status': RUNNING, 'started_at': now, 'updated_at': now},
+             '$inc': {'attempts': 1}}
+        )
+
+    def _run(self, job_id):
+        document = self._claim(job_id)
+        if document is None:
+            # Already claimed by another worker, or finished
+            return
+
+        started = time.perf_counter()
+        handler = JOB_TYPES.get(document['type'])
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job type: {document['type']}")
+            result = handler(self.store, Job(self, document))
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job_id, document['type'], e)
+            self._finish(job_id, FAILED, error=str(e))
+        else:
+            self._finish(job_id, SUCCEEDED, result=result)
+        finally:
+            metrics.JOB_SECONDS.observe(time.perf_counter() - started, document['type'])
+
+    def _finish(self, job_id, status, **fields):
+        now = datetime.utcnow()
+        document = self.store.jobs.update_and_get(
+            job_id,
+            {'$set': dict(
+                fields, status=status, finished_at=now, updated_at=now,
+                expires_at=now + timedelta(seconds=self.retention_seconds)
+            ), '$unset': {'active_key': ''}},
+            projection={'type': 1}
+        )
+        if document:
+            metrics.JOBS_FINISHED.inc(document['type'], status)
+
+
+def serialize_job(document):
+    """Public view of a job document"""
+    job = {
+        key: value for key, value in document.items()
+        if key not in ('_id', 'active_key', 'expires_at')
+    }
+    job['_id'] = str(document['_id'])
+    return job
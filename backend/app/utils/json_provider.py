@@ -0,0 +1,71 @@
+# backend/app/utils/json_provider.py
+import json
+from bson.objectid import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from .content_codec import is_compressed, decompress_text
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is used instead
+    orjson = None
+
+
+def encode_default(value):
+    """JSON form of ObjectIds and compressed note text, then of everything Flask's encoder knows (dates as HTTP dates)"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if is_compressed(value):
+        # Decompressed here, so only the fields a response actually includes pay for it
+        return decompress_text(value)
+    return DefaultJSONProvider.default(value)
+
+
+def dumps_bytes(obj, indent=False, sort_keys=False):
+    """Serialize `obj` to UTF-8 JSON, with orjson when it is installed"""
+    if orjson is not None:
+        # Datetimes go through encode_default so both encoders emit the same format
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        try:
+            return orjson.dumps(obj, default=encode_default, option=option)
+        except TypeError:
+            # Integers beyond 64 bits or non-string keys; the stdlib copes with both
+            pass
+    return json.dumps(
+        obj, default=encode_default, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if indent else None, separators=None if indent else (',', ':')
+    ).encode('utf-8')
+
+
+def loads_bytes(data):
+    """Parse UTF-8 JSON, with orjson when it is installed; raises ValueError when malformed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider for the Flask and Quart apps.
+
+    Documents can be returned as read from MongoDB: ObjectIds are encoded
+    as strings and compressed note text as the text itself by the provider,
+    so handlers need no conversion loops.
+    """
+
+    default = staticmethod(encode_default)
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and set(kwargs) <= {'indent', 'separators'}:
+            return dumps_bytes(obj, bool(kwargs.get('indent')), self.sort_keys).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(
+            dumps_bytes(obj, indent, self.sort_keys) + b'\n', mimetype=self.mimetype
+        )
@@ -0,0 +1,217 @@
+# backend/app/utils/list_cache.py
+import fcntl
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+CachedListing = namedtuple('CachedListing', ['etag', 'body', 'mimetype', 'generation', 'stored_at'])
+
+
+class LocalGenerations:
+    """Per-cabinet invalidation counters visible to this process only"""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, cabinet_id):
+        return self._counters.get(cabinet_id, 0)
+
+    def bump(self, cabinet_id):
+        with self._lock:
+            self._counters[cabinet_id] = self._counters.get(cabinet_id, 0) + 1
+
+    def close(self):
+        pass
+
+
+class SharedMemoryGenerations:
+    """Invalidation counters shared by every worker process on the host.
+
+    Cabinets hash into a fixed array of 64-bit slots in a named shared memory
+    block. Two cabinets sharing a slot only cause extra invalidations. Bumps
+    are serialized across processes with a lock file; reads are lock-free.
+    """
+
+    SLOT = struct.Struct('Q')
+
+    def __init__(self, name, slots):
+        from multiprocessing import shared_memory, resource_tracker
+
+        self.slots = slots
+        size = slots * self.SLOT.size
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._shm = shared_memory.SharedMemory(name=name)
+        # Workers come and go; the block must outlive whichever one created it
+        try:
+            resource_tracker.unregister(self._shm._name, 'shared_memory')
+        except Exception:
+            pass
+
+        self._lock_file = open(os.path.join(tempfile.gettempdir(), f'{name}.lock'), 'a')
+        self._thread_lock = threading.Lock()
+
+    def _offset(self, cabinet_id):
+        digest = hashlib.blake2b(cabinet_id.encode('utf-8'), digest_size=8).digest()
+        return (int.from_bytes(digest, 'little') % self.slots) * self.SLOT.size
+
+    def get(self, cabinet_id):
+        return self.SLOT.unpack_from(self._shm.buf, self._offset(cabinet_id))[0]
+
+    def bump(self, cabinet_id):
+        offset = self._offset(cabinet_id)
+        with self._thread_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                value = self.SLOT.unpack_from(self._shm.buf, offset)[0]
+                self.SLOT.pack_into(self._shm.buf, offset, (value + 1) % (1 << 64))
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        self._shm.close()
+        self._lock_file.close()
+
+
+class ListCache:
+    """Read-through cache of serialized cabinet note listings.
+
+    Entries are keyed by cabinet and request variant (page, projection,
+    representation) and hold the response bytes plus their ETag. They are
+    evicted least-recently-used by count and total size, expire after `ttl`
+    seconds, and are dropped when the cabinet's invalidation generation moves.
+    Readers pass the ETag of the cabinet version they just read, so an entry
+    a write in another worker left behind is never served.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, ttl=300,
+                 generations=None, enabled=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.generations = generations or LocalGenerations()
+        self._entries = OrderedDict()
+        self._by_cabinet = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def generation(self, cabinet_id):
+        return self.generations.get(cabinet_id)
+
+    def get(self, cabinet_id, variant, etag):
+        """Cached listing of a cabinet, if one was stored under `etag`"""
+        if not self.enabled:
+            return None
+        key = (cabinet_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expired = time.monotonic() - entry.stored_at > self.ttl
+            stale = entry.etag != etag or entry.generation != self.generations.get(cabinet_id)
+            if expired or stale:
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, cabinet_id, variant, etag, body, mimetype, generation):
+        """Store a listing read at `generation`; skipped if a write landed since"""
+        if not self.enabled or len(body) > self.max_bytes:
+            return
+        key = (cabinet_id, variant)
+        with self._lock:
+            if generation != self.generations.get(cabinet_id):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = CachedListing(etag, body, mimetype, generation, time.monotonic())
+            self._by_cabinet.setdefault(cabinet_id, set()).add(variant)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, cabinet_id):
+        """Drop every cached listing of a cabinet here and, via the generation, in other workers"""
+        if not cabinet_id:
+            return
+        cabinet_id = str(cabinet_id)
+        self.generations.bump(cabinet_id)
+        with self._lock:
+            for variant in list(self._by_cabinet.get(cabinet_id, ())):
+                self._remove((cabinet_id, variant))
+            self.invalidations += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        variants = self._by_cabinet.get(key[0])
+        if variants is not None:
+            variants.discard(key[1])
+            if not variants:
+                del self._by_cabinet[key[0]]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_cabinet.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'backend': type(self.generations).__name__,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+list_cache = ListCache(enabled=False)
+
+
+def configure(config):
+    """Replace the shared list cache according to the app config"""
+    global list_cache
+    if config['LIST_CACHE_BACKEND'] == 'shm':
+        generations = SharedMemoryGenerations(
+            config['LIST_CACHE_SHM_NAME'], config['LIST_CACHE_SHM_SLOTS']
+        )
+    else:
+        generations = LocalGenerations()
+    list_cache.generations.close()
+    list_cache = ListCache(
+        max_entries=config['LIST_CACHE_MAX_ENTRIES'],
+        max_bytes=config['LIST_CACHE_MAX_BYTES'],
+        ttl=config['LIST_CACHE_TTL'],
+        generations=generations,
+        enabled=config['LIST_CACHE_ENABLED']
+    )
+    return list_cache
+
+
+def get_list_cache():
+    return list_cache
@@ -0,0 +1,70 @@
+# backend/app/utils/logs.py
+import json
+import logging
+import random
+import sys
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+access_logger = logging.getLogger('app.access')
+
+_request_sample_rate = 0.0
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per record, with `extra` fields as top-level keys.
+
+    The message is only interpolated here, so calls that use lazy %-style
+    arguments cost nothing when their level is disabled.
+    """
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(config):
+    """Install one root handler according to the LOG_* settings; safe to call again"""
+    global _request_sample_rate
+    _request_sample_rate = config['LOG_REQUEST_SAMPLE_RATE']
+
+    handler = logging.StreamHandler(sys.stderr)
+    if config['LOG_FORMAT'] == 'json':
+        handler.setFormatter(StructuredFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler._notes_manager = True
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if getattr(h, '_notes_manager', False)]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(config['LOG_LEVEL'])
+
+
+def log_request(method, endpoint, status, duration, mongo):
+    """Access log for a sampled share of requests; server errors are always logged"""
+    if status < 500 and (not _request_sample_rate or random.random() >= _request_sample_rate):
+        return
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    access_logger.info('%s %s %s', method, endpoint, status, extra={
+        'method': method,
+        'endpoint': endpoint,
+        'status': status,
+        'duration_ms': round(duration * 1000, 2),
+        'mongo_ms': round(mongo.seconds * 1000, 2),
+        'mongo_commands': mongo.commands,
+        'sample_rate': 1.0 if status >= 500 else _request_sample_rate,
+    })
@@ -0,0 +1,377 @@
+# backend/app/utils/metrics.py
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from pymongo import monitoring
+
+# Request latency and MongoDB time, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Request and response body sizes, in bytes
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Background jobs run from milliseconds (small rebalances) to many minutes (purges)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+PREFIX = 'notesmanager_'
+
+EXPOSITION_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            yield self.name, list(zip(self.labelnames, labelvalues)), value
+
+
+class Gauge:
+    """Point-in-time value; either set directly or read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def samples(self):
+        if self.callback is not None:
+            values = sorted(self.callback().items())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        for labelvalues, value in values:
+            if not isinstance(labelvalues, tuple):
+                labelvalues = (labelvalues,)
+            yield self.name, list(zip(self.labelnames, labelvalues)), value
+
+
+class Histogram:
+    """Cumulative bucket histogram keyed by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket counts plus +Inf, then sum and count
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labelvalues):
+        series = self._series.get(labelvalues)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for labelvalues, (counts, total, count) in snapshot:
+            labels = list(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                yield self.name + '_bucket', labels + [('le', le)], cumulative
+            yield self.name + '_sum', labels, total
+            yield self.name + '_count', labels, count
+
+
+class Registry:
+    """Ordered set of metrics rendered together in the text exposition format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(PREFIX + name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(PREFIX + name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(PREFIX + name, documentation, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by route, method and status',
+    ('method', 'endpoint', 'status')
+)
+REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request',
+    ('method', 'endpoint')
+)
+REQUEST_BYTES = registry.histogram(
+    'http_request_size_bytes', 'Request body size', ('method', 'endpoint'), SIZE_BUCKETS
+)
+RESPONSE_BYTES = registry.histogram(
+    'http_response_size_bytes', 'Response body size; streamed responses are not counted',
+    ('method', 'endpoint'), SIZE_BUCKETS
+)
+REQUEST_MONGO_SECONDS = registry.histogram(
+    'http_request_mongo_seconds', 'MongoDB command time spent within a request',
+    ('method', 'endpoint')
+)
+MONGO_COMMAND_SECONDS = registry.histogram(
+    'mongo_command_duration_seconds', 'MongoDB command round trip time', ('command',)
+)
+MONGO_COMMAND_FAILURES = registry.counter(
+    'mongo_command_failures_total', 'MongoDB commands that returned an error', ('command',)
+)
+
+JOBS_FINISHED = registry.counter(
+    'jobs_finished_total', 'Background jobs that finished, by type and final status',
+    ('type', 'status')
+)
+JOB_SECONDS = registry.histogram(
+    'job_duration_seconds', 'Time a background job spent running', ('type',), JOB_BUCKETS
+)
+
+CHANGE_FEED_SUBSCRIBERS = registry.gauge(
+    'change_feed_subscribers', 'Open change feed streams'
+)
+CHANGE_FEED_EVENTS = registry.counter(
+    'change_feed_events_total', 'Change events sent to subscribers, by type', ('type',)
+)
+
+COALESCED_CALLS = registry.counter(
+    'coalesced_calls_total', 'Reads answered with the result of an identical read already in flight',
+    ('call',)
+)
+ADMISSION_IN_FLIGHT = registry.gauge(
+    'admission_in_flight', 'Requests admitted and not yet finished'
+)
+ADMISSION_REJECTED = registry.counter(
+    'admission_rejected_total',
+    'Requests turned away by admission control, by the limit they hit (client or global)',
+    ('limit',)
+)
+
+
+def _cache_sizes(field):
+    from . import sanitizer
+    from .list_cache import get_list_cache
+    return {
+        'list': get_list_cache().stats()[field],
+        'sanitizer': sanitizer.cache_stats()[field],
+    }
+
+
+CACHE_ENTRIES = registry.gauge(
+    'cache_entries', 'Entries held by the in-process caches', ('cache',),
+    callback=lambda: _cache_sizes('entries')
+)
+CACHE_BYTES = registry.gauge(
+    'cache_bytes', 'Bytes held by the in-process caches', ('cache',),
+    callback=lambda: _cache_sizes('bytes')
+)
+
+
+class RequestMongoTime:
+    """MongoDB time and command count accumulated by one request"""
+
+    __slots__ = ('seconds', 'commands')
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.commands = 0
+
+
+# Context variables follow both worker threads and asyncio tasks, so the
+# command listener can attribute time to whichever request issued it
+_request_mongo = ContextVar('request_mongo', default=None)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """pymongo command listener feeding the Mongo histograms"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        MONGO_COMMAND_FAILURES.inc(event.command_name)
+        self._record(event)
+
+    def _record(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMAND_SECONDS.observe(seconds, event.command_name)
+        tracker = _request_mongo.get()
+        if tracker is not None:
+            tracker.seconds += seconds
+            tracker.commands += 1
+
+
+command_timer = CommandTimer()
+
+
+class RequestTimer:
+    """Latency and Mongo time of one request, started when the request arrives"""
+
+    __slots__ = ('started', 'mongo')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.mongo = RequestMongoTime()
+        _request_mongo.set(self.mongo)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def observe_request(timer, method, endpoint, status, request_bytes, response_bytes):
+    """Record a finished request; `response_bytes` is None for streamed bodies"""
+    duration = timer.elapsed()
+    REQUESTS.inc(method, endpoint, str(status))
+    REQUEST_SECONDS.observe(duration, method, endpoint)
+    REQUEST_MONGO_SECONDS.observe(timer.mongo.seconds, method, endpoint)
+    REQUEST_BYTES.observe(request_bytes or 0, method, endpoint)
+    if response_bytes is not None:
+        RESPONSE_BYTES.observe(response_bytes, method, endpoint)
+    return duration
+
+
+def endpoint_label(request):
+    """Route template such as /api/notes/<note_id>, so label cardinality stays bounded"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def init_app(app):
+    """Time every request of a Flask app and serve the registry at /metrics"""
+    from flask import Response, g, request
+    from .logs import log_request
+
+    @app.before_request
+    def start_request_timer():
+        g.request_timer = RequestTimer()
+
+    @app.after_request
+    def record_request(response):
+        timer = g.pop('request_timer', None)
+        if timer is None:
+            return response
+        endpoint = endpoint_label(request)
+        response_bytes = None if response.is_streamed else response.calculate_content_length()
+        duration = observe_request(
+            timer, request.method, endpoint, response.status_code,
+            request.content_length, response_bytes
+        )
+        log_request(request.method, endpoint, response.status_code, duration, timer.mongo)
+        return response
+
+    def metrics():
+        return Response(registry.render(), mimetype=EXPOSITION_MIMETYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
+
+
+def init_async_app(app):
+    """init_app for the Quart app in app.aio"""
+    from quart import Response, g, request
+    from .logs import log_request
+
+    @app.before_request
+    async def start_request_timer():
+        g.request_timer = RequestTimer()
+
+    @app.after_request
+    async def record_request(response):
+        timer = g.pop('request_timer', None)
+        if timer is None:
+            return response
+        endpoint = endpoint_label(request)
+        duration = observe_request(
+            timer, request.method, endpoint, response.status_code,
+            request.content_length, response.content_length
+        )
+        log_request(request.method, endpoint, response.status_code, duration, timer.mongo)
+        return response
+
+    async def metrics():
+        return Response(registry.render(), mimetype=EXPOSITION_MIMETYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics, methods=['GET'])
@@ -0,0 +1,158 @@
+# backend/app/utils/migrations.py
+import logging
+import time
+from datetime import datetime
+from pymongo import ASCENDING, TEXT, IndexModel
+from pymongo.errors import DuplicateKeyError
+from .search_text import TEXT_INDEX_WEIGHTS
+from .change_feed import NOTE_DELETIONS_COLLECTION, NOTE_DELETION_TTL_SECONDS
+from .jobs import JOBS_COLLECTION
+from .revisions import REVISIONS_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+# Applied versions are recorded here, one document per migration
+MIGRATIONS_COLLECTION = 'schema_migrations'
+
+# version -> (description, function(db)), applied in ascending version order
+MIGRATIONS = {}
+
+
+class MigrationError(RuntimeError):
+    """Raised when a registered migration fails; later versions are not attempted"""
+
+
+def migration(version, description):
+    """Register `function(db)` as schema migration `version`.
+
+    Migrations may run more than once (two workers booting together, or a
+    crash before the version was recorded), so they must be idempotent.
+    """
+    def register(function):
+        if version in MIGRATIONS:
+            raise ValueError(f'Duplicate migration version {version}')
+        MIGRATIONS[version] = (description, function)
+        return function
+    return register
+
+
+def ensure_indexes(collection, indexes):
+    """Create whichever of `indexes` the collection does not have yet.
+
+    Live indexes are matched by name or by key pattern, so an equivalent index
+    created under another name is not duplicated. Returns the created names.
+    """
+    live = collection.index_information()
+    live_keys = {tuple(info['key']) for info in live.values()}
+    missing = [
+        index for index in indexes
+        if index.document['name'] not in live
+        and tuple(index.document['key'].items()) not in live_keys
+    ]
+    if missing:
+        collection.create_indexes(missing)
+    return [index.document['name'] for index in missing]
+
+
+def drop_index_if_exists(collection, name):
+    if name in collection.index_information():
+        collection.drop_index(name)
+        return True
+    return False
+
+
+@migration(1, 'Cabinet name and note order indexes')
+def _base_indexes(db):
+    # _id breaks order ties so keyset pagination never needs an in-memory sort
+    ensure_indexes(db.notes, [IndexModel(
+        [('cabinet_id', ASCENDING), ('order', ASCENDING), ('_id', ASCENDING)],
+        background=True
+    )])
+    ensure_indexes(db.cabinets, [IndexModel('name', unique=True, background=True)])
+
+
+@migration(2, 'Drop the (cabinet_id, order) index superseded by (cabinet_id, order, _id)')
+def _drop_order_index(db):
+    drop_index_if_exists(db.notes, 'cabinet_id_1_order_1')
+
+
+@migration(3, 'Full-text index over note titles and derived search fields')
+def _notes_text_index(db):
+    ensure_indexes(db.notes, [IndexModel(
+        [(field, TEXT) for field in TEXT_INDEX_WEIGHTS],
+        weights=TEXT_INDEX_WEIGHTS,
+        name='notes_text',
+        background=True
+    )])
+
+
+@migration(4, 'Calendar entry indexes')
+def _calendar_entry_indexes(db):
+    # Entries are read by day ranges within a note
+    ensure_indexes(db.calendar_entries, [
+        IndexModel([('note_id', ASCENDING), ('date', ASCENDING)], unique=True, background=True),
+        IndexModel('cabinet_id', background=True),
+        IndexModel([('content', TEXT)], name='calendar_entries_text', background=True),
+    ])
+
+
+@migration(5, 'Background job indexes')
+def _job_indexes(db):
+    # active_key is only present while a job is queued or running
+    ensure_indexes(db[JOBS_COLLECTION], [
+        IndexModel('active_key', unique=True, sparse=True, background=True),
+        IndexModel([('status', ASCENDING), ('updated_at', ASCENDING)], background=True),
+        IndexModel('expires_at', expireAfterSeconds=0, background=True),
+    ])
+
+
+@migration(6, 'Note revision indexes')
+def _revision_indexes(db):
+    # Revisions are read as chains by seq within a note; compaction scans by age
+    ensure_indexes(db[REVISIONS_COLLECTION], [
+        IndexModel([('note_id', ASCENDING), ('seq', ASCENDING)], unique=True, background=True),
+        IndexModel('started_at', background=True),
+    ])
+
+
+@migration(7, 'Expire change feed note deletion records')
+def _note_deletion_indexes(db):
+    # The records only need to exist long enough to reach the change streams
+    ensure_indexes(db[NOTE_DELETIONS_COLLECTION], [
+        IndexModel('deleted_at', expireAfterSeconds=NOTE_DELETION_TTL_SECONDS, background=True),
+    ])
+
+
+def applied_versions(db):
+    return {doc['_id'] for doc in db[MIGRATIONS_COLLECTION].find({}, {'_id': 1})}
+
+
+def pending_migrations(db):
+    applied = applied_versions(db)
+    return [version for version in sorted(MIGRATIONS) if version not in applied]
+
+
+def run_migrations(db):
+    """Apply every registered migration not yet recorded; one query when up to date"""
+    applied = []
+    for version in pending_migrations(db):
+        description, function = MIGRATIONS[version]
+        started = time.monotonic()
+        try:
+            function(db)
+        except Exception as e:
+            raise MigrationError(f'Migration {version} ({description}) failed: {str(e)}') from e
+
+        try:
+            db[MIGRATIONS_COLLECTION].insert_one({
+                '_id': version,
+                'description': description,
+                'applied_at': datetime.utcnow(),
+                'duration_ms': round((time.monotonic() - started) * 1000, 1)
+            })
+        except DuplicateKeyError:
+            # Another worker finished the same migration first
+            pass
+        logger.info("Applied migration %s: %s", version, description)
+        applied.append(version)
+    return applied
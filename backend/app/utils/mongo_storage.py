@@ -0,0 +1,552 @@
+# backend/app/utils/mongo_storage.py
+from datetime import datetime
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, DeleteMany, DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from .cabinet_refs import cabinet_match, cabinet_ref
+from .cabinet_stats import stats_pipeline
+from .jobs import JOBS_COLLECTION, QUEUED, RUNNING
+from .migrations import MIGRATIONS, MIGRATIONS_COLLECTION, pending_migrations, run_migrations
+from .note_listing import apply_cursor
+from .note_patch import version_filter
+from .revisions import REVISIONS_COLLECTION
+from .storage import UpdateError
+from .tasks import task_counts_pipeline, task_id_filter
+from .versioning import LIVE_CABINET
+
+# Listings, exports and rebalances all walk a cabinet on the
+# (cabinet_id, order, _id) index
+LISTING_SORT = [('order', ASCENDING), ('_id', ASCENDING)]
+
+TEXT_SCORE = {'$meta': 'textScore'}
+
+
+def note_filter(note_id, version=None, expect=None):
+    """Match one note, optionally only at `version` and while fields still hold `expect`"""
+    query = version_filter(note_id, version) if version is not None else {'_id': note_id}
+    if expect:
+        query.update(expect)
+    return query
+
+
+def range_filter(note_id, start=None, end=None):
+    """Entries of one note between two days, both inclusive"""
+    query = {'note_id': note_id}
+    if start or end:
+        query['date'] = {}
+        if start:
+            query['date']['$gte'] = start
+        if end:
+            query['date']['$lte'] = end
+    return query
+
+
+def entry_upserts(note_id, cabinet_id, entries):
+    """UpdateOne requests creating or overwriting a note's entries from a map of date -> content"""
+    now = datetime.utcnow()
+    return [
+        UpdateOne(
+            {'note_id': note_id, 'date': date},
+            {'$set': {'content': content, 'cabinet_id': cabinet_ref(cabinet_id), 'updated_at': now}},
+            upsert=True
+        )
+        for date, content in entries.items()
+    ]
+
+
+def other_dates_filter(note_id, dates):
+    """A note's entries for every day not in `dates`"""
+    return {'note_id': note_id, 'date': {'$nin': list(dates)}}
+
+
+def update_requests(updates):
+    """UpdateOne requests for (note_id, update, expect) triples"""
+    return [UpdateOne(note_filter(note_id, None, expect), update) for note_id, update, expect in updates]
+
+
+def mongo_requests(writes):
+    """bulk_write requests for a batch of NoteWrites"""
+    requests = []
+    for write in writes:
+        if write.op == 'insert':
+            requests.append(InsertOne(write.document))
+        elif write.op == 'update':
+            requests.append(UpdateOne(note_filter(write.note_id, write.base_version), write.document))
+        else:
+            requests.append(DeleteOne(note_filter(write.note_id, write.base_version)))
+    return requests
+
+
+class MongoNotes:
+    """The notes collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, note_id, projection=None, version=None):
+        """One note, or None; with `version` only while it is at that version"""
+        return self.collection.find_one(note_filter(note_id, version), projection)
+
+    def find(self, note_ids, projection=None):
+        """The notes among `note_ids` that exist, in no particular order"""
+        return list(self.collection.find({'_id': {'$in': list(note_ids)}}, projection))
+
+    def list(self, cabinet_id=None, projection=None, after=None, limit=None, batch_size=None):
+        """Cursor over a cabinet's notes (every note when None) in (order, _id) order.
+
+        `after` is an (order, _id) position to resume after; the _id may be
+        None to skip every note at that order. The cursor is lazy, so large
+        listings can be streamed a batch at a time.
+        """
+        query = {'cabinet_id': cabinet_match(cabinet_id)} if cabinet_id is not None else {}
+        if after is not None:
+            query = apply_cursor(query, *after)
+        cursor = self.collection.find(query, projection).sort(LISTING_SORT)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def scan(self, projection=None, after_id=None, limit=None):
+        """Every note in _id order, for maintenance jobs that resume where they stopped"""
+        query = {'_id': {'$gt': after_id}} if after_id is not None else {}
+        cursor = self.collection.find(query, projection).sort('_id', ASCENDING)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def with_field(self, field, projection=None, batch_size=None):
+        """Cursor over the notes that store `field` at all"""
+        cursor = self.collection.find({field: {'$exists': True}}, projection)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return cursor
+
+    def without_field(self, field, projection=None, limit=None):
+        """Up to `limit` notes that do not store `field`"""
+        cursor = self.collection.find({field: {'$exists': False}}, projection)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def count(self, cabinet_id=None, field=None):
+        """Number of notes in a cabinet (or in all), only counting those storing `field` if given"""
+        query = {'cabinet_id': cabinet_match(cabinet_id)} if cabinet_id is not None else {}
+        if field:
+            query[field] = {'$exists': True}
+        return self.collection.count_documents(query)
+
+    def max_order(self, cabinet_id):
+        """Highest order in a cabinet, or None when it has no notes"""
+        last = self.collection.find_one(
+            {'cabinet_id': cabinet_match(cabinet_id)}, {'order': 1}, sort=[('order', DESCENDING)]
+        )
+        return last['order'] if last else None
+
+    def insert(self, note):
+        """Store a new note; sets and returns its _id"""
+        return self.collection.insert_one(note).inserted_id
+
+    def insert_many(self, notes):
+        self.collection.insert_many(notes, ordered=False)
+
+    def update(self, note_id, update, version=None, expect=None):
+        """Apply an update document to one note; True when the note matched.
+
+        `version` pins the write to that version (missing counts as 0) and
+        `expect` maps top-level fields to the values they must still hold,
+        None standing for absent. Updates use $set, $unset, $inc, $max and
+        $push (with $each and $position) on dotted paths.
+        """
+        try:
+            return self.collection.update_one(note_filter(note_id, version, expect), update).matched_count == 1
+        except OperationFailure as e:
+            raise UpdateError(str(e)) from e
+
+    def update_and_get(self, note_id, update, version=None, projection=None):
+        """Like update, returning the note as written, or None when it did not match"""
+        try:
+            return self.collection.find_one_and_update(
+                note_filter(note_id, version), update,
+                projection=projection, return_document=ReturnDocument.AFTER
+            )
+        except OperationFailure as e:
+            raise UpdateError(str(e)) from e
+
+    def bulk_update(self, updates):
+        """Apply (note_id, update, expect) triples in one round trip; returns how many notes changed"""
+        if not updates:
+            return 0
+        return self.collection.bulk_write(update_requests(updates), ordered=False).modified_count
+
+    def write_batch(self, writes, ordered):
+        """Apply NoteWrites in one round trip; returns the write errors by index into `writes`.
+
+        Updates and deletes that no longer match their base version are not
+        errors; callers read the versions back. With `ordered` the first
+        error stops the rest of the batch.
+        """
+        try:
+            self.collection.bulk_write(mongo_requests(writes), ordered=ordered)
+        except BulkWriteError as e:
+            return e.details.get('writeErrors', [])
+        return []
+
+    def delete(self, note_id, projection=None):
+        """Delete one note; returns it as it was, or None when there was none"""
+        return self.collection.find_one_and_delete({'_id': note_id}, projection=projection)
+
+    def delete_many(self, note_ids):
+        return self.collection.delete_many({'_id': {'$in': list(note_ids)}}).deleted_count
+
+    def _write_task(self, query, update, projection):
+        update['$inc'] = {'version': 1}
+        return self.collection.find_one_and_update(
+            dict(query, type='task'), update, projection=projection, return_document=ReturnDocument.AFTER
+        )
+
+    def add_task(self, note_id, task, position, projection=None):
+        """Insert a task at `position` (None for the end) of a task note and bump its version.
+
+        Returns the note as written, or None when it is missing, not a task
+        note or already has a task with this id.
+        """
+        push = {'$each': [task]}
+        if position is not None:
+            push['$position'] = position
+        return self._write_task(
+            {'_id': note_id, 'tasks.id': {'$ne': task['id']}}, {'$push': {'tasks': push}}, projection
+        )
+
+    def update_task(self, note_id, task_id, fields, projection=None):
+        """Set fields of the task `task_id` (see tasks.task_id_filter); like add_task otherwise"""
+        # The positional $ stands for the task the filter matched
+        return self._write_task(
+            {'_id': note_id, 'tasks.id': task_id_filter(task_id)},
+            {'$set': {f'tasks.$.{field}': value for field, value in fields.items()}}, projection
+        )
+
+    def remove_task(self, note_id, task_id, projection=None):
+        """Remove the task `task_id` from a task note; like add_task otherwise"""
+        match = task_id_filter(task_id)
+        return self._write_task(
+            {'_id': note_id, 'tasks.id': match}, {'$pull': {'tasks': {'id': match}}}, projection
+        )
+
+    def task_counts(self, cabinet_id=None, note_id=None):
+        """(note _id, total, done) for the task notes of a cabinet, or for one note"""
+        query = {'_id': note_id} if note_id is not None else {'cabinet_id': cabinet_match(cabinet_id)}
+        return [
+            (row['_id'], row['total'], row['done'])
+            for row in self.collection.aggregate(task_counts_pipeline(query))
+        ]
+
+    def type_totals(self, cabinet_ids):
+        """(stored cabinet_id, type, notes, content bytes) for each cabinet and note type"""
+        return [
+            (row['_id']['cabinet_id'], row['_id'].get('type'), row['notes'], row['content_bytes'])
+            for row in self.collection.aggregate(stats_pipeline(cabinet_ids))
+        ]
+
+    def search(self, text, cabinet_id=None, limit=20, projection=None):
+        """Up to `limit` notes matching a full-text search, best first, each with a `score`"""
+        query = {'$text': {'$search': text}}
+        if cabinet_id:
+            query['cabinet_id'] = cabinet_match(cabinet_id)
+        return list(self.collection.find(
+            query, dict(projection or {}, score=TEXT_SCORE)
+        ).sort([('score', TEXT_SCORE)]).limit(limit))
+
+
+class MongoCabinets:
+    """The cabinets collection; soft-deleted cabinets are skipped unless asked for"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    @staticmethod
+    def _filter(cabinet_id, include_deleted=False):
+        query = {'_id': ObjectId(cabinet_id)}
+        return query if include_deleted else dict(LIVE_CABINET, **query)
+
+    def list(self, projection=None):
+        """Every live cabinet, newest first"""
+        return list(self.collection.find(LIVE_CABINET, projection).sort('created_at', DESCENDING))
+
+    def get(self, cabinet_id, projection=None, include_deleted=False):
+        return self.collection.find_one(self._filter(cabinet_id, include_deleted), projection)
+
+    def name_taken(self, name, exclude_id=None):
+        """Whether another cabinet, deleted or not, goes by `name`"""
+        query = {'name': name}
+        if exclude_id is not None:
+            query['_id'] = {'$ne': ObjectId(exclude_id)}
+        return self.collection.find_one(query, {'_id': 1}) is not None
+
+    def insert(self, cabinet):
+        """Store a new cabinet; sets and returns its _id"""
+        return self.collection.insert_one(cabinet).inserted_id
+
+    def update(self, cabinet_id, update, include_deleted=True, expect=None):
+        """Apply an update document to a cabinet; True when it matched.
+
+        Soft-deleted cabinets are updated too unless `include_deleted` is
+        False; `expect` maps top-level fields to the values they must still
+        hold, None standing for absent.
+        """
+        query = self._filter(cabinet_id, include_deleted)
+        if expect:
+            query.update(expect)
+        return self.collection.update_one(query, update).matched_count == 1
+
+    def delete(self, cabinet_id):
+        """Remove a soft-deleted cabinet for good"""
+        return self.collection.delete_one(
+            {'_id': ObjectId(cabinet_id), 'deleted_at': {'$exists': True}}
+        ).deleted_count == 1
+
+    def reserve_orders(self, cabinet_id, amount):
+        """Add `amount` to a live cabinet's `last_order` counter and return the new value.
+
+        None when the cabinet does not exist or has no counter yet.
+        """
+        cabinet = self.collection.find_one_and_update(
+            dict(self._filter(cabinet_id), last_order={'$exists': True}),
+            {'$inc': {'last_order': amount}},
+            projection={'last_order': 1},
+            return_document=ReturnDocument.AFTER
+        )
+        return cabinet['last_order'] if cabinet else None
+
+    def seed_last_order(self, cabinet_id, order):
+        """Start the `last_order` counter of a cabinet that has none"""
+        self.collection.update_one(
+            {'_id': ObjectId(cabinet_id), 'last_order': {'$exists': False}},
+            {'$set': {'last_order': order}}
+        )
+
+    def raise_order_floor(self, cabinet_id, order):
+        """Move `last_order` up to `order` if it is lower, for cabinets that have the counter"""
+        self.collection.update_one(
+            {'_id': ObjectId(cabinet_id), 'last_order': {'$exists': True}},
+            {'$max': {'last_order': order}}
+        )
+
+
+class MongoCalendarEntries:
+    """The calendar_entries collection, one document per note and day"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def list(self, note_id, start=None, end=None):
+        """Entries of a note between two days (both inclusive), by date"""
+        return list(self.collection.find(
+            range_filter(note_id, start, end), {'date': 1, 'content': 1, '_id': 0}
+        ).sort('date', ASCENDING))
+
+    def for_notes(self, note_ids):
+        """Entries of several notes, by date"""
+        return list(self.collection.find(
+            {'note_id': {'$in': list(note_ids)}}, {'note_id': 1, 'date': 1, 'content': 1}
+        ).sort('date', ASCENDING))
+
+    def upsert(self, note_id, cabinet_id, entries):
+        """Create or overwrite a note's entries from a map of date -> content"""
+        operations = entry_upserts(note_id, cabinet_id, entries)
+        if operations:
+            self.collection.bulk_write(operations, ordered=False)
+
+    def insert_many(self, entries):
+        self.collection.insert_many(entries, ordered=False)
+
+    def delete(self, note_id, date):
+        """Remove one day's entry; True when there was one"""
+        return self.collection.delete_one({'note_id': note_id, 'date': date}).deleted_count == 1
+
+    def delete_other_dates(self, note_id, dates):
+        """Remove a note's entries for every day not in `dates`"""
+        self.collection.delete_many(other_dates_filter(note_id, dates))
+
+    def delete_for_notes(self, note_ids):
+        self.collection.delete_many({'note_id': {'$in': list(note_ids)}})
+
+    def delete_for_cabinet(self, cabinet_id):
+        self.collection.delete_many({'cabinet_id': cabinet_match(cabinet_id)})
+
+    def search(self, text, cabinet_id=None, limit=20):
+        """Up to `limit` entries matching a full-text search, best first, each with a `score`"""
+        query = {'$text': {'$search': text}}
+        if cabinet_id:
+            query['cabinet_id'] = cabinet_match(cabinet_id)
+        return list(self.collection.find(
+            query, {'score': TEXT_SCORE, 'note_id': 1, 'date': 1, 'content': 1}
+        ).sort([('score', TEXT_SCORE)]).limit(limit))
+
+
+class MongoRevisions:
+    """The note_revisions collection, numbered by `seq` within each note"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def latest(self, note_id, kind=None, max_seq=None, started_before=None):
+        """_id and seq of a note's newest revision of `kind`, at or before `max_seq`
+        and started before `started_before`; None when there is none"""
+        query = {'note_id': note_id}
+        if kind is not None:
+            query['kind'] = kind
+        if max_seq is not None:
+            query['seq'] = {'$lte': max_seq}
+        if started_before is not None:
+            query['started_at'] = {'$lt': started_before}
+        return self.collection.find_one(query, {'seq': 1}, sort=[('seq', DESCENDING)])
+
+    def chain(self, note_id, first_seq=None, last_seq=None):
+        """A note's revisions from `first_seq` to `last_seq` (both inclusive), by seq"""
+        query = {'note_id': note_id}
+        bounds = {}
+        if first_seq is not None:
+            bounds['$gte'] = first_seq
+        if last_seq is not None:
+            bounds['$lte'] = last_seq
+        if bounds:
+            query['seq'] = bounds
+        return list(self.collection.find(query).sort('seq', ASCENDING))
+
+    def list(self, note_id, before=None, limit=50):
+        """A note's revisions without their data, newest first, before seq `before`"""
+        query = {'note_id': note_id}
+        if before is not None:
+            query['seq'] = {'$lt': before}
+        return list(self.collection.find(query, {'data': 0}).sort('seq', DESCENDING).limit(limit))
+
+    def insert(self, revision):
+        """Store a new revision; False when the note already has one with its seq"""
+        try:
+            self.collection.insert_one(revision)
+        except DuplicateKeyError:
+            return False
+        return True
+
+    def update(self, revision_id, fields, updated_at):
+        """Set fields of a revision unless it was written again since `updated_at`"""
+        return self.collection.update_one(
+            {'_id': revision_id, 'updated_at': updated_at}, {'$set': fields}
+        ).matched_count == 1
+
+    def rewrite(self, updates, dropped_ids):
+        """Set fields of several revisions and delete others in one ordered round trip"""
+        operations = [UpdateOne({'_id': revision_id}, {'$set': fields}) for revision_id, fields in updates]
+        if dropped_ids:
+            operations.append(DeleteMany({'_id': {'$in': list(dropped_ids)}}))
+        if operations:
+            self.collection.bulk_write(operations, ordered=True)
+
+    def notes_to_compact(self, cutoff):
+        """Ids of the notes with revisions started before `cutoff` that were never compacted"""
+        return self.collection.distinct(
+            'note_id', {'started_at': {'$lt': cutoff}, 'compacted': {'$ne': True}}
+        )
+
+    def delete_for_notes(self, note_ids):
+        self.collection.delete_many({'note_id': {'$in': list(note_ids)}})
+
+
+def _claimable(stale_before):
+    return {'$or': [
+        {'status': QUEUED},
+        {'status': RUNNING, 'updated_at': {'$lt': stale_before}},
+    ]}
+
+
+class MongoJobs:
+    """The jobs collection; finished jobs expire through a TTL index on expires_at"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def insert(self, job):
+        """Store a new job; False when another queued or running job holds its `active_key`"""
+        try:
+            self.collection.insert_one(job)
+        except DuplicateKeyError:
+            job.pop('_id', None)
+            return False
+        return True
+
+    def find_active(self, key):
+        """_id of the queued or running job holding `key`, or None"""
+        job = self.collection.find_one({'active_key': key}, {'_id': 1})
+        return job['_id'] if job else None
+
+    def get(self, job_id):
+        return self.collection.find_one({'_id': job_id})
+
+    def list(self, job_type=None, status=None, limit=20):
+        """Newest jobs first, optionally of one type and status"""
+        query = {}
+        if job_type:
+            query['type'] = job_type
+        if status:
+            query['status'] = status
+        return list(self.collection.find(query).sort('created_at', DESCENDING).limit(limit))
+
+    def claimable(self, stale_before):
+        """_ids of the jobs that are queued, or running without a heartbeat since `stale_before`"""
+        return [job['_id'] for job in self.collection.find(_claimable(stale_before), {'_id': 1})]
+
+    def claim(self, job_id, stale_before, update):
+        """Apply `update` to a job if it is still claimable; returns the job as written, or None"""
+        query = _claimable(stale_before)
+        query['_id'] = job_id
+        return self.collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+
+    def update(self, job_id, update, status=None):
+        """Apply `update` to a job, only while it has `status` if given; True when it matched"""
+        query = {'_id': job_id}
+        if status is not None:
+            query['status'] = status
+        return self.collection.update_one(query, update).matched_count == 1
+
+    def update_and_get(self, job_id, update, projection=None):
+        """Like update, returning the job as it was before, or None"""
+        return self.collection.find_one_and_update({'_id': job_id}, update, projection=projection)
+
+
+class MongoStorage:
+    """Storage backed by a MongoDB database.
+
+    The pymongo Database stays reachable as `db` for what only MongoDB has:
+    change streams and the schema migrations that build its indexes.
+    """
+
+    backend = 'mongo'
+
+    def __init__(self, client, db_name):
+        self.client = client
+        self.db = client[db_name]
+        self.notes = MongoNotes(self.db.notes)
+        self.cabinets = MongoCabinets(self.db.cabinets)
+        self.calendar_entries = MongoCalendarEntries(self.db.calendar_entries)
+        self.revisions = MongoRevisions(self.db[REVISIONS_COLLECTION])
+        self.jobs = MongoJobs(self.db[JOBS_COLLECTION])
+
+    def migrate(self):
+        """Apply pending schema migrations; returns the versions applied"""
+        return run_migrations(self.db)
+
+    def migration_status(self):
+        """(applied migration records, pending migrations) for /api/system/migrations"""
+        applied = list(self.db[MIGRATIONS_COLLECTION].find().sort('_id', ASCENDING))
+        for record in applied:
+            record['version'] = record.pop('_id')
+        pending = [
+            {'version': version, 'description': MIGRATIONS[version][0]}
+            for version in pending_migrations(self.db)
+        ]
+        return applied, pending
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,324 @@
+# backend/app/utils/note_batch.py
+from collections import Counter, namedtuple
+from bson.objectid import ObjectId
+from .cabinet_refs import cabinet_key, cabinet_ref
+from .cabinet_stats import note_footprint, stats_change, updated_footprint
+from .calendar_entries import CalendarEntryError
+from .change_feed import note_created_event, note_update_event
+from .note_writes import EXISTING_NOTE_FIELDS, prepare_new_note, build_put_update
+
+BATCH_OPS = ('create', 'update', 'delete')
+
+# One write of a batch: 'insert' carries the new note as `document`,
+# 'update' an update document; updates and deletes only apply while the
+# note is still at `base_version` when that is not None
+NoteWrite = namedtuple('NoteWrite', ['op', 'note_id', 'document', 'base_version'])
+
+# Write error codes that mean the request itself was at fault
+DUPLICATE_KEY = 11000
+
+
+class BatchError(ValueError):
+    """Raised when a batch is malformed; `errors` lists the offending operations"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _base_version(op):
+    base_version = op.get('base_version')
+    if base_version is None:
+        return None
+    if not isinstance(base_version, int) or isinstance(base_version, bool) or base_version < 0:
+        raise ValueError('base_version must be a non-negative integer')
+    return base_version
+
+
+def _parse_op(op):
+    if not isinstance(op, dict):
+        raise ValueError('Each operation must be an object')
+    kind = op.get('op')
+    if kind not in BATCH_OPS:
+        raise ValueError(f'op must be one of {", ".join(BATCH_OPS)}')
+
+    parsed = {'op': kind, 'object_id': None, 'note': None, 'base_version': None}
+    if kind == 'create':
+        note = op.get('note')
+        if not isinstance(note, dict) or not note:
+            raise ValueError('create needs a note')
+        if not ObjectId.is_valid(note.get('cabinet_id') or ''):
+            raise ValueError('Invalid cabinet ID format')
+        parsed['note'] = {k: v for k, v in note.items() if k not in ('_id', 'version', 'order')}
+        return parsed
+
+    if not ObjectId.is_valid(op.get('_id') or ''):
+        raise ValueError('Invalid note ID format')
+    parsed['object_id'] = ObjectId(op['_id'])
+    parsed['base_version'] = _base_version(op)
+    if kind == 'update':
+        note = op.get('note')
+        if not isinstance(note, dict) or not note:
+            raise ValueError('update needs a note')
+        parsed['note'] = {k: v for k, v in note.items() if k not in ('_id', 'version', 'cabinet_id')}
+        if not parsed['note']:
+            raise ValueError('update needs a note')
+    return parsed
+
+
+def parse_batch(payload, max_ops):
+    """Validate a whole batch up front.
+
+    Returns (ordered, operations). Raises BatchError listing every invalid
+    operation, so nothing is written unless the batch as a whole is sound.
+    """
+    if not isinstance(payload, dict):
+        raise BatchError('No data provided')
+    ordered = payload.get('ordered', True)
+    if not isinstance(ordered, bool):
+        raise BatchError('ordered must be a boolean')
+    ops = payload.get('ops')
+    if not isinstance(ops, list) or not ops:
+        raise BatchError('ops must be a non-empty list')
+    if len(ops) > max_ops:
+        raise BatchError(f'A batch may contain at most {max_ops} operations')
+
+    operations = []
+    errors = []
+    for index, op in enumerate(ops):
+        try:
+            operations.append(_parse_op(op))
+        except ValueError as e:
+            operations.append(None)
+            errors.append({'index': index, 'error': str(e)})
+
+    # One note may only be touched once per batch, or results would depend on order
+    seen = Counter(op['object_id'] for op in operations if op and op['object_id'])
+    for index, op in enumerate(operations):
+        if op and seen[op['object_id']] > 1:
+            errors.append({'index': index, 'error': 'Note appears more than once in the batch'})
+    if errors:
+        raise BatchError('Invalid batch', sorted(errors, key=lambda error: error['index']))
+    return ordered, operations
+
+
+class NoteBatch:
+    """Plan and bookkeeping for one batch of note writes.
+
+    The routes do the I/O in this order: read the existing notes
+    (`note_ids`), reserve orders for creates (`create_counts`), build and
+    send the writes (`build_writes`, `record_write`), read back
+    versions (`verify`), then apply side effects (`calendar_writes`,
+    `deleted_ids`, `touched_cabinets`, `stats_changes`) and return `results`.
+    """
+
+    def __init__(self, operations, ordered=True):
+        self.operations = operations
+        self.ordered = ordered
+        self.results = [
+            {'index': index, 'op': op['op'], 'status': None}
+            for index, op in enumerate(operations)
+        ]
+        for op, result in zip(operations, self.results):
+            if op['object_id']:
+                result['_id'] = str(op['object_id'])
+        self._writes = []
+        self._sent = []
+        self._calendar = {}
+        self._written = {}
+        self._stats = {}
+
+    def note_ids(self):
+        return [op['object_id'] for op in self.operations if op['object_id']]
+
+    @staticmethod
+    def existing_projection():
+        return dict(EXISTING_NOTE_FIELDS, version=1)
+
+    def create_counts(self):
+        """Number of creates per cabinet, for reserving orders in one block each"""
+        return Counter(op['note']['cabinet_id'] for op in self.operations if op['op'] == 'create')
+
+    def _fail(self, index, status, error):
+        self.results[index].update(status=status, error=error)
+
+    def _skip_rest(self, start):
+        for result in self.results[start:]:
+            if result['status'] is None:
+                result.update(status=424, error='Skipped after an earlier failure')
+
+    def build_writes(self, existing, orders):
+        """NoteWrites for every operation that can be attempted.
+
+        `existing` maps note ObjectIds to their stored EXISTING_NOTE_FIELDS and
+        `orders` maps cabinet ids to the reserved order lists (None when the
+        cabinet does not exist). Sanitizes content, so it is CPU bound.
+        """
+        orders = {cabinet_id: list(block or []) for cabinet_id, block in orders.items()}
+        missing_cabinets = {cabinet_id for cabinet_id, block in orders.items() if not block}
+        for index, op in enumerate(self.operations):
+            try:
+                write = self._build_write(index, op, existing, orders, missing_cabinets)
+            except CalendarEntryError as e:
+                self._fail(index, 400, str(e))
+                write = None
+            if write is None:
+                if self.ordered:
+                    self._skip_rest(index + 1)
+                    break
+                continue
+            self._writes.append(write)
+            self._sent.append(index)
+        return self._writes
+
+    def _build_write(self, index, op, existing, orders, missing_cabinets):
+        if op['op'] == 'create':
+            cabinet_id = op['note']['cabinet_id']
+            if cabinet_id in missing_cabinets:
+                self._fail(index, 404, 'Cabinet not found')
+                return None
+            note = dict(op['note'])
+            calendar_entries = prepare_new_note(note)
+            note['order'] = orders[cabinet_id].pop(0)
+            note['cabinet_id'] = cabinet_ref(cabinet_id)
+            note['_id'] = op['object_id'] = ObjectId()
+            if calendar_entries:
+                self._calendar[index] = (cabinet_id, calendar_entries)
+            self._written[index] = note
+            self._stats[index] = stats_change(after=note_footprint(note))
+            self.results[index].update(
+                _id=str(note['_id']), version=0, order=note['order'], cabinet_id=cabinet_id
+            )
+            return NoteWrite('insert', note['_id'], note, None)
+
+        stored = existing.get(op['object_id'])
+        if stored is None:
+            self._fail(index, 404, 'Note not found')
+            return None
+        self.results[index]['cabinet_id'] = cabinet_key(stored['cabinet_id'])
+        if op['base_version'] is not None and stored.get('version', 0) != op['base_version']:
+            self._fail(index, 409, 'Version conflict')
+            self.results[index]['version'] = stored.get('version', 0)
+            return None
+
+        before = note_footprint(stored)
+        if op['op'] == 'delete':
+            self._stats[index] = stats_change(before=before)
+            return NoteWrite('delete', op['object_id'], None, op['base_version'])
+
+        update, calendar_entries = build_put_update(stored, op['note'])
+        if calendar_entries is not None:
+            self._calendar[index] = (self.results[index]['cabinet_id'], calendar_entries)
+        op['bumps_version'] = '$inc' in update
+        self._written[index] = update['$set']
+        self._stats[index] = stats_change(before, updated_footprint(before, update['$set']))
+        return NoteWrite('update', op['object_id'], update, op['base_version'])
+
+    def record_write(self, write_errors):
+        """Mark sent operations done, failing those the write reported errors for.
+
+        `write_errors` index into the writes from build_writes.
+        """
+        failed_at = None
+        for error in sorted(write_errors, key=lambda error: error['index']):
+            index = self._sent[error['index']]
+            status = 409 if error.get('code') == DUPLICATE_KEY else 400
+            self._fail(index, status, f"Write failed: {error.get('errmsg', 'unknown error')}")
+            if failed_at is None:
+                failed_at = error['index']
+
+        if self.ordered and failed_at is not None:
+            # Ordered writes stop at the first error
+            for index in self._sent[failed_at + 1:]:
+                self.results[index].update(status=424, error='Skipped after an earlier failure')
+        for index in self._sent:
+            if self.results[index]['status'] is None:
+                self.results[index]['status'] = 201 if self.operations[index]['op'] == 'create' else 200
+
+    def updated_ids(self):
+        return [
+            self.operations[index]['object_id'] for index in self._sent
+            if self.operations[index]['op'] == 'update' and self.results[index]['status'] == 200
+        ]
+
+    def verify(self, versions):
+        """Fill in new versions and catch updates whose filter stopped matching.
+
+        `versions` maps the ObjectIds from `updated_ids` to their stored
+        version after the write. A note that vanished, or whose version is not
+        the one this batch produced, was changed by someone else in between.
+        """
+        for index in self._sent:
+            op = self.operations[index]
+            result = self.results[index]
+            if op['op'] != 'update' or result['status'] != 200:
+                continue
+            if op['object_id'] not in versions:
+                self._fail(index, 404, 'Note not found')
+                continue
+            version = versions[op['object_id']]
+            result['version'] = version
+            if op['base_version'] is not None:
+                expected = op['base_version'] + (1 if op['bumps_version'] else 0)
+                if version != expected:
+                    self._fail(index, 409, 'Version conflict')
+
+    def _applied(self):
+        return [index for index in self._sent if self.results[index]['status'] in (200, 201)]
+
+    def calendar_writes(self):
+        """(note ObjectId, cabinet id, normalized entries) for applied calendar saves"""
+        return [
+            (self.operations[index]['object_id'],) + self._calendar[index]
+            for index in self._applied() if index in self._calendar
+        ]
+
+    def written_ids(self):
+        """ObjectIds of notes created or updated by applied operations"""
+        return [
+            self.operations[index]['object_id'] for index in self._applied()
+            if self.operations[index]['op'] != 'delete'
+        ]
+
+    def deleted_ids(self):
+        return [
+            self.operations[index]['object_id'] for index in self._applied()
+            if self.operations[index]['op'] == 'delete'
+        ]
+
+    def change_events(self):
+        """(cabinet id, event type, data) for the change feed, one per applied operation"""
+        events = []
+        for index in self._applied():
+            op = self.operations[index]
+            result = self.results[index]
+            if op['op'] == 'create':
+                event = note_created_event(self._written[index])
+            elif op['op'] == 'delete':
+                event = ('note_deleted', {'_id': op['object_id']})
+            else:
+                event = note_update_event(op['object_id'], result.get('version'), self._written[index])
+            events.append((result['cabinet_id'],) + event)
+        return events
+
+    def touched_cabinets(self):
+        return {self.results[index]['cabinet_id'] for index in self._applied()}
+
+    def stats_changes(self):
+        """Summed cabinet counter changes of the applied operations, by cabinet id"""
+        changes = {}
+        for index in self._applied():
+            cabinet_id = self.results[index]['cabinet_id']
+            changes.setdefault(cabinet_id, Counter()).update(self._stats[index])
+        return changes
+
+    def response(self):
+        results = []
+        for result in self.results:
+            result = dict(result)
+            result.pop('cabinet_id', None)
+            if result['op'] == 'create' and result['status'] >= 400:
+                for field in ('_id', 'version', 'order'):
+                    result.pop(field, None)
+            results.append(result)
+        return {'results': results}
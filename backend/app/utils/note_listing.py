@@ -0,0 +1,228 @@
+# backend/app/utils/note_listing.py
+from bson.objectid import ObjectId
+from flask import Response, jsonify
+from .streaming import ndjson_response, wants_stream
+from .list_cache import get_list_cache
+from . import coalescing
+from .versioning import cabinet_version, cabinet_etag, request_variant, not_modified, tag_response
+from .search_text import SEARCH_FIELDS
+
+# Shortcut for clients that only need enough to render collapsed note headers
+HEADER_FIELDS = ['title', 'type', 'order', 'isExpanded']
+
+# Fields the cursor needs even when the client projects them away
+CURSOR_FIELDS = ['order']
+
+# Server-side bookkeeping stored on notes but never returned to clients
+INTERNAL_FIELDS = ['content_hash', 'content_bytes'] + SEARCH_FIELDS
+
+
+class ListingError(ValueError):
+    """Raised when listing query parameters are malformed"""
+
+
+def _parse_order(value):
+    try:
+        order = float(value)
+    except (TypeError, ValueError):
+        raise ListingError('after_order must be a number')
+    return int(order) if order.is_integer() else order
+
+
+def parse_fields(raw):
+    """Parse the comma separated `fields` parameter into a list of field names"""
+    if not raw:
+        return None
+    if raw == 'headers':
+        return list(HEADER_FIELDS)
+
+    fields = []
+    for name in raw.split(','):
+        name = name.strip()
+        if not name:
+            continue
+        if name.startswith('$') or '.' in name:
+            raise ListingError(f'Invalid field name: {name}')
+        if name not in fields:
+            fields.append(name)
+    return fields or None
+
+
+def parse_listing_args(args, max_limit):
+    """Read pagination and projection parameters from the request args"""
+    options = {
+        'limit': None,
+        'after_order': None,
+        'after_id': None,
+        'fields': parse_fields(args.get('fields')),
+    }
+
+    limit = args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ListingError('limit must be an integer')
+        if limit < 1:
+            raise ListingError('limit must be positive')
+        options['limit'] = min(limit, max_limit)
+
+    after_order = args.get('after_order')
+    if after_order is not None:
+        options['after_order'] = _parse_order(after_order)
+
+    after_id = args.get('after_id')
+    if after_id is not None:
+        if options['after_order'] is None:
+            raise ListingError('after_id requires after_order')
+        try:
+            options['after_id'] = ObjectId(after_id)
+        except Exception:
+            raise ListingError('Invalid after_id format')
+
+    return options
+
+
+def strip_internal_fields(note):
+    """Drop server-side bookkeeping from a note before it is returned"""
+    for name in INTERNAL_FIELDS:
+        note.pop(name, None)
+    return note
+
+
+def build_projection(fields):
+    """Build a Mongo projection for the requested fields, always keeping the cursor keys"""
+    if not fields:
+        return {name: 0 for name in INTERNAL_FIELDS}
+    projection = {name: 1 for name in fields if name not in INTERNAL_FIELDS}
+    for name in CURSOR_FIELDS:
+        projection[name] = 1
+    return projection
+
+
+def apply_cursor(query, after_order, after_id=None):
+    """Restrict `query` to notes after the (order, _id) keyset position"""
+    if after_order is None:
+        return query
+    if after_id is None:
+        position = {'order': {'$gt': after_order}}
+    else:
+        # _id breaks ties between notes that share an order value
+        position = {'$or': [
+            {'order': {'$gt': after_order}},
+            {'order': after_order, '_id': {'$gt': after_id}},
+        ]}
+    return {'$and': [query, position]} if query else position
+
+
+def is_paginated(options):
+    return options['limit'] is not None or options['after_order'] is not None
+
+
+def listing_position(options):
+    """The (order, _id) keyset position a listing resumes after, or None"""
+    if options['after_order'] is None:
+        return None
+    return options['after_order'], options['after_id']
+
+
+def find_notes(collection, query, options, batch_size=None):
+    """Build a Mongo listing cursor on the (cabinet_id, order) index without consuming it"""
+    query = apply_cursor(query, options['after_order'], options['after_id'])
+    cursor = collection.find(query, build_projection(options['fields']))
+    cursor = cursor.sort([('order', 1), ('_id', 1)])
+    if options['limit'] is not None:
+        cursor = cursor.limit(options['limit'])
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    return cursor
+
+
+def list_notes(store, cabinet_id, options, batch_size=None):
+    """Lazy listing of a cabinet's notes (every note when None) in (order, _id) order"""
+    return store.notes.list(
+        cabinet_id, build_projection(options['fields']), listing_position(options),
+        options['limit'], batch_size
+    )
+
+
+def fetch_notes(store, cabinet_id, options):
+    """Run a listing query on the (cabinet_id, order) index.
+
+    Returns the notes and the cursor for the following page, which is None
+    once the listing is exhausted or when no limit was requested.
+    """
+    limit = options['limit']
+    if limit is None:
+        return list(list_notes(store, cabinet_id, options)), None
+
+    # Fetch one extra document to know whether another page exists
+    notes = list(list_notes(store, cabinet_id, dict(options, limit=limit + 1)))
+    return split_page(notes, limit)
+
+
+def split_page(notes, limit):
+    """Trim a `limit + 1` read to one page and build the cursor for the next one"""
+    if len(notes) <= limit:
+        return notes, None
+
+    notes = notes[:limit]
+    last = notes[-1]
+    next_cursor = {'after_order': last.get('order'), 'after_id': str(last['_id'])}
+    return notes, next_cursor
+
+
+def listing_response(store, cabinet_id, options, stream=False, batch_size=None):
+    """Render a note listing as a JSON array, a paginated page or an NDJSON stream"""
+    if stream:
+        return ndjson_response(list_notes(store, cabinet_id, options, batch_size), batch_size)
+
+    notes, next_cursor = fetch_notes(store, cabinet_id, options)
+
+    if is_paginated(options):
+        return jsonify({'notes': notes, 'next_cursor': next_cursor})
+    return jsonify(notes)
+
+
+def cabinet_listing_response(store, cabinet_id, options, request, batch_size):
+    """Serve a cabinet-scoped listing through the list cache and ETag checks.
+
+    Every request reads the cabinet version (one lookup by _id) for the
+    ETag, and a cached body is only served when it was stored under that
+    ETag, so a write made through another worker is never hidden by this
+    worker's cache. Misses run the listing and store the serialized body;
+    identical misses at the same version that overlap share one run.
+    Returns None when the cabinet does not exist.
+    """
+    cache = get_list_cache()
+    stream = wants_stream(request)
+    variant = request_variant(request)
+
+    # Read the generation before the data so a concurrent write makes the
+    # cache refuse this (possibly stale) result
+    generation = cache.generation(cabinet_id)
+    version = cabinet_version(store, cabinet_id)
+    if version is None:
+        return None
+
+    etag = cabinet_etag(cabinet_id, version, request)
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+
+    if not stream:
+        cached = cache.get(cabinet_id, variant, etag)
+        if cached is not None:
+            return tag_response(Response(cached.body, mimetype=cached.mimetype), etag)
+
+    if stream:
+        return tag_response(listing_response(store, cabinet_id, options, stream, batch_size), etag)
+
+    def render():
+        response = listing_response(store, cabinet_id, options, stream, batch_size)
+        body = response.get_data()
+        cache.put(cabinet_id, variant, etag, body, response.mimetype, generation)
+        return body, response.mimetype
+
+    body, mimetype = coalescing.listings.do((cabinet_id, variant, version), render)
+    return tag_response(Response(body, mimetype=mimetype), etag)
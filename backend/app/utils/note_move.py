@@ -0,0 +1,138 @@
+# backend/app/utils/note_move.py
+import math
+from bson.objectid import ObjectId
+from .cabinet_refs import cabinet_key
+from .ordering import order_between, needs_rebalance
+
+
+class MoveError(ValueError):
+    """Raised when a move or reorder request cannot be applied; `status` is the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def same_cabinet(notes):
+    """The one cabinet every note in `notes` belongs to"""
+    cabinet_ids = set(cabinet_key(note['cabinet_id']) for note in notes)
+    if len(cabinet_ids) != 1:
+        raise MoveError('Notes must be in the same cabinet')
+    return cabinet_ids.pop()
+
+
+def valid_order(order):
+    """Whether `order` is a number a note's order can hold: a finite float or a 64-bit integer"""
+    if isinstance(order, bool) or not isinstance(order, (int, float)):
+        return False
+    return -2 ** 63 <= order < 2 ** 63 if isinstance(order, int) else math.isfinite(order)
+
+
+class OrderUpdate:
+    """Plan for a batch-update-order request: explicit orders for several notes.
+
+    The routes read `note_ids` with their cabinet, `check` them, write
+    `updates`, raise the cabinet's order floor to `max_order` and publish
+    `change_event`.
+    """
+
+    def __init__(self, updates):
+        if not updates or not isinstance(updates, list):
+            raise MoveError('Invalid update data')
+        try:
+            self.orders = [(ObjectId(update['_id']), update.get('order')) for update in updates]
+        except Exception:
+            raise MoveError('Invalid note ID format')
+        if not all(valid_order(order) for _, order in self.orders):
+            raise MoveError('Invalid order value')
+        self.note_ids = [object_id for object_id, _ in self.orders]
+        self.max_order = max(order for _, order in self.orders)
+
+    def check(self, existing_notes):
+        """Cabinet of the notes read back, which must all exist and share it"""
+        if len(existing_notes) != len(self.orders):
+            raise MoveError('Some notes not found', 404)
+        return same_cabinet(existing_notes)
+
+    def updates(self):
+        """(note_id, update, expect) triples for the bulk update"""
+        return [(object_id, {'$set': {'order': order}}, None) for object_id, order in self.orders]
+
+    def change_event(self):
+        return 'notes_reordered', {'notes': [
+            {'_id': object_id, 'order': order} for object_id, order in self.orders
+        ]}
+
+
+class NoteMove:
+    """Plan for moving one note between two neighbours.
+
+    The routes read `note_ids` (the note and its neighbours) with their
+    order and cabinet, `check` them, then place the note: at the end of the
+    cabinet when `to_end`, otherwise at `new_order()`. When that is None the
+    gap is exhausted; the cabinet is rebalanced, the orders are `refresh`ed
+    and `new_order()` asked again. `wants_rebalance` says a background
+    rebalance should be queued.
+    """
+
+    def __init__(self, note_id, move_data):
+        self.note_id = note_id
+        self.before_id = move_data.get('before_id')
+        self.after_id = move_data.get('after_id')
+        if not self.before_id and not self.after_id:
+            raise MoveError('before_id or after_id is required')
+        if note_id in (self.before_id, self.after_id) or (self.before_id and self.before_id == self.after_id):
+            raise MoveError('Invalid move target')
+        try:
+            self.note_ids = [ObjectId(i) for i in (note_id, self.before_id, self.after_id) if i]
+        except Exception:
+            raise MoveError('Invalid note ID format')
+        self.notes = {}
+        self.rebalanced = False
+
+    @property
+    def to_end(self):
+        # Moving to the end takes a fresh slot from the cabinet counter
+        return self.after_id is None
+
+    def check(self, notes):
+        """Cabinet of the moved note, given it and its neighbours as read"""
+        self.notes = {str(note['_id']): note for note in notes}
+        if self.note_id not in self.notes:
+            raise MoveError('Note not found', 404)
+        if len(self.notes) != len(self.note_ids):
+            raise MoveError('Neighbour note not found', 404)
+
+        cabinet_id = same_cabinet(self.notes.values())
+        before_order, after_order = self.neighbour_orders()
+        if before_order is not None and after_order is not None and before_order > after_order:
+            raise MoveError('before_id must precede after_id')
+        return cabinet_id
+
+    def neighbour_orders(self):
+        return (
+            self.notes[self.before_id]['order'] if self.before_id else None,
+            self.notes[self.after_id]['order'] if self.after_id else None
+        )
+
+    def new_order(self):
+        """Order between the neighbours, or None when their gap is exhausted"""
+        return order_between(*self.neighbour_orders())
+
+    def wants_rebalance(self):
+        return needs_rebalance(*self.neighbour_orders())
+
+    def refresh(self, notes):
+        """Take the orders a rebalance gave the moved note and its neighbours"""
+        self.rebalanced = True
+        for note in notes:
+            self.notes[str(note['_id'])]['order'] = note['order']
+
+    def change_event(self, new_order):
+        # After a rebalance every order in the cabinet moved, not just this one
+        return 'notes_reordered', {
+            'notes': [{'_id': ObjectId(self.note_id), 'order': new_order}], 'rebalanced': self.rebalanced
+        }
+
+    def response(self, new_order):
+        return {'_id': self.note_id, 'order': new_order, 'rebalanced': self.rebalanced}
@@ -0,0 +1,244 @@
+# backend/app/utils/note_patch.py
+from .cabinet_stats import STATS_NOTE_FIELDS, STATS_SOURCES, content_bytes, note_footprint, stats_change, updated_footprint
+from .change_feed import note_update_event
+from .content_codec import compress_fields, decompress_text
+from .sanitizer import sanitize_html, content_hash
+from .search_text import SEARCH_SOURCES, search_fields_for
+
+# Top-level note fields a PATCH may touch; identity, placement, calendar
+# entries and bookkeeping fields have their own endpoints or are server-owned
+PATCHABLE_FIELDS = {
+    'title', 'content', 'type', 'isExpanded', 'timestamp',
+    'tasks', 'viewType', 'views'
+}
+
+# Fields whose value is rich text and must go through the sanitizer
+HTML_FIELDS = {'content'}
+
+
+class PatchError(ValueError):
+    """Raised when a patch document is malformed or targets a forbidden path"""
+
+
+def version_filter(note_object_id, base_version):
+    """Match a note only while it is still at `base_version`; missing counts as 0"""
+    if base_version == 0:
+        return {'_id': note_object_id, 'version': {'$in': [0, None]}}
+    return {'_id': note_object_id, 'version': base_version}
+
+
+def _parse_path(path):
+    """Turn a JSON pointer such as /tasks/2/completed into Mongo path segments"""
+    if not isinstance(path, str) or not path.startswith('/'):
+        raise PatchError(f'Invalid path: {path}')
+    segments = [
+        segment.replace('~1', '/').replace('~0', '~')
+        for segment in path[1:].split('/')
+    ]
+    if not segments[0] or segments[0] not in PATCHABLE_FIELDS:
+        raise PatchError(f'Path is not patchable: {path}')
+    for segment in segments:
+        if not segment or segment.startswith('$') or '.' in segment:
+            raise PatchError(f'Invalid path: {path}')
+    return segments
+
+
+def apply_text_delta(text, delta):
+    """Apply a retain/insert/delete delta to `text` and return the new string"""
+    if not isinstance(delta, list):
+        raise PatchError('delta must be a list')
+
+    pieces = []
+    position = 0
+    for step in delta:
+        if not isinstance(step, dict) or len(step) != 1:
+            raise PatchError('Each delta step needs exactly one of retain, insert or delete')
+        if 'insert' in step:
+            if not isinstance(step['insert'], str):
+                raise PatchError('insert must be a string')
+            pieces.append(step['insert'])
+            continue
+        count = step.get('retain', step.get('delete'))
+        if not isinstance(count, int) or count < 0 or position + count > len(text):
+            raise PatchError('Delta does not match the base content')
+        if 'retain' in step:
+            pieces.append(text[position:position + count])
+        elif 'delete' not in step:
+            raise PatchError('Each delta step needs exactly one of retain, insert or delete')
+        position += count
+
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+
+def compile_patch(ops):
+    """Validate patch operations and group them by the Mongo operator they need.
+
+    Returns a dict with `set`, `unset` and `push` maps keyed by dotted path and a
+    `text` map of top-level field -> list of deltas that must be applied to the
+    stored value before it can be written.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise PatchError('ops must be a non-empty list')
+
+    compiled = {'set': {}, 'unset': {}, 'push': {}, 'text': {}}
+    for operation in ops:
+        if not isinstance(operation, dict):
+            raise PatchError('Each operation must be an object')
+        op = operation.get('op')
+        segments = _parse_path(operation.get('path'))
+        field = segments[0]
+
+        if op == 'text':
+            if len(segments) != 1:
+                raise PatchError('Text deltas apply to whole top-level fields')
+            compiled['text'].setdefault(field, []).append(operation.get('delta'))
+        elif op in ('add', 'replace'):
+            if 'value' not in operation:
+                raise PatchError(f'{op} requires a value')
+            if field in HTML_FIELDS and len(segments) != 1:
+                raise PatchError(f'Path is not patchable: {operation["path"]}')
+            if op == 'add' and segments[-1] == '-':
+                compiled['push'].setdefault('.'.join(segments[:-1]), []).append(operation['value'])
+            else:
+                compiled['set']['.'.join(segments)] = operation['value']
+        elif op == 'remove':
+            if segments[-1].isdigit():
+                raise PatchError('Removing array elements is not supported; replace the array instead')
+            compiled['unset']['.'.join(segments)] = ''
+        else:
+            raise PatchError(f'Unsupported op: {op}')
+
+    return compiled
+
+
+def touched_fields(compiled):
+    """Top-level fields changed by a compiled patch"""
+    paths = list(compiled['set']) + list(compiled['unset']) + list(compiled['push']) + list(compiled['text'])
+    return {path.split('.')[0] for path in paths}
+
+
+def build_update(compiled):
+    """Mongo update document for a compiled patch whose text deltas are already resolved"""
+    update = {'$inc': {'version': 1}}
+    if compiled['set']:
+        update['$set'] = compiled['set']
+    if compiled['unset']:
+        update['$unset'] = compiled['unset']
+    if compiled['push']:
+        update['$push'] = {path: {'$each': values} for path, values in compiled['push'].items()}
+    return update
+
+
+def parse_base_version(value):
+    """Validate the version a patch was made against"""
+    if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+        raise PatchError('base_version must be a non-negative integer')
+    return value
+
+
+class NotePatch:
+    """Plan for applying one PATCH request to a note.
+
+    The routes do the I/O in this order: read the note at `base_version`
+    when `base_projection` asks for it, `resolve` the patch against that
+    read, write `update` at `base_version` returning `result_projection`,
+    write `search_update` when it is not None, then bump the cabinet with
+    `stats_change` and publish `change_event`. Raises PatchError for a
+    malformed request.
+    """
+
+    def __init__(self, patch_data):
+        self.base_version = parse_base_version(patch_data.get('base_version'))
+        self.compiled = compile_patch(patch_data.get('ops'))
+        self.changed = touched_fields(self.compiled)
+        self.moves_stats = bool(self.changed & STATS_SOURCES)
+        self.base = None
+        self.stale_sources = set()
+
+    def base_projection(self):
+        """Fields to read at the base version first, or None when no read is needed.
+
+        Deltas are relative to the stored text and the result still has to
+        be sanitized, so just those fields are read, plus what the cabinet
+        counters need when the type or size may change.
+        """
+        if not self.compiled['text'] and not self.moves_stats:
+            return None
+        projection = {field: 1 for field in self.compiled['text']}
+        if self.moves_stats:
+            projection.update(STATS_NOTE_FIELDS)
+        return projection
+
+    def resolve(self, base=None):
+        """Apply text deltas to `base`, sanitize content and derive the stored fields.
+
+        Sanitizing may be slow, so app.aio runs this on a worker thread.
+        """
+        self.base = base
+        fields = self.compiled['set']
+        for field, deltas in self.compiled['text'].items():
+            value = decompress_text(base.get(field)) or ''
+            if not isinstance(value, str):
+                raise PatchError(f'{field} is not a text field')
+            for delta in deltas:
+                value = apply_text_delta(value, delta)
+            fields[field] = value
+
+        if 'content' in fields:
+            digest = content_hash(fields['content'])
+            fields['content'] = sanitize_html(fields['content'], digest)
+            fields['content_hash'] = digest
+        elif 'content' in self.compiled['unset']:
+            # A digest left behind would make a later PUT of the old content look unchanged
+            self.compiled['unset']['content_hash'] = ''
+        if 'content' in self.changed:
+            fields['content_bytes'] = content_bytes(fields.get('content'))
+
+        # Whole-field writes carry their new search text in the same update;
+        # nested writes (e.g. /tasks/3/text) re-extract from the stored result
+        fields.update(search_fields_for(fields))
+        compress_fields(fields)
+        self.stale_sources = {
+            source for source in SEARCH_SOURCES
+            if source in self.changed and source not in fields
+        }
+
+    def update(self):
+        return build_update(self.compiled)
+
+    def result_projection(self):
+        """Fields of the written note the response, event and follow-up writes need"""
+        projection = {field: 1 for field in self.changed}
+        projection['version'] = 1
+        projection['cabinet_id'] = 1
+        return projection
+
+    def search_update(self, updated_note):
+        """Update re-extracting search text from nested writes, or None when there were none"""
+        if not self.stale_sources:
+            return None
+        return {'$set': search_fields_for({
+            source: updated_note.get(source) for source in self.stale_sources
+        })}
+
+    def stats_change(self):
+        """Cabinet counter change of the patch, or None when it cannot move them"""
+        if not self.moves_stats:
+            return None
+        before = note_footprint(self.base)
+        return stats_change(before, updated_footprint(before, self.compiled['set'], self.compiled['unset']))
+
+    def change_event(self, note_id, updated_note):
+        """(type, data) announcing the patch, from the note as written"""
+        return note_update_event(
+            note_id, updated_note['version'],
+            {field: updated_note[field] for field in self.changed if field in updated_note},
+            [field for field in self.changed if field not in updated_note]
+        )
+
+    def response(self, updated_note):
+        """The written fields, with removed ones reported explicitly so clients can drop them"""
+        for field in self.changed:
+            updated_note.setdefault(field, None)
+        return updated_note
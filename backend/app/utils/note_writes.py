@@ -0,0 +1,96 @@
+# backend/app/utils/note_writes.py
+from .cabinet_refs import cabinet_ref
+from .cabinet_stats import content_bytes
+from .calendar_entries import normalize_entries
+from .content_codec import compress_fields
+from .sanitizer import sanitize_html, content_hash
+from .search_text import search_fields_for
+
+# Fields of the stored note a PUT-style update needs to read first
+EXISTING_NOTE_FIELDS = {'cabinet_id': 1, 'type': 1, 'content_hash': 1, 'content_bytes': 1}
+
+
+def prepare_new_note(note_data):
+    """Fill in defaults, sanitize content and derive search fields for a new note.
+
+    Mutates `note_data`; the caller still has to set `order`. Returns the
+    normalized calendar entries to store next to it (None for other types).
+    Raises CalendarEntryError for malformed calendarData.
+    """
+    # Remember the raw hash so autosaves of unchanged content can skip sanitizing
+    if 'content' in note_data:
+        note_data['content_hash'] = content_hash(note_data['content'])
+        note_data['content'] = sanitize_html(note_data['content'], note_data['content_hash'])
+
+    note_type = note_data.get('type', 'standard')
+    calendar_entries = None
+    if note_type == 'task':
+        note_data.setdefault('tasks', [])
+    elif note_type == 'calendar':
+        note_data.setdefault('viewType', 'month')
+        # Calendar entries live in their own collection, indexed by day
+        calendar_entries = normalize_entries(note_data.pop('calendarData', None) or [])
+        note_data.setdefault('views', [{
+            'id': 'view-1',
+            'viewType': 'month',
+            'selectedDate': note_data.get('timestamp')
+        }])
+    note_data.setdefault('content', '')
+    note_data['content_bytes'] = content_bytes(note_data['content'])
+    note_data.setdefault('title', '')
+    note_data.setdefault('timestamp', '')
+    note_data['version'] = 0
+    note_data.update(search_fields_for(note_data))
+    compress_fields(note_data)
+    return calendar_entries
+
+
+def build_put_update(existing_note, note_data):
+    """Mongo update for a whole-note save of `existing_note`.
+
+    `existing_note` needs at least EXISTING_NOTE_FIELDS. Returns the update
+    and the normalized calendar entries to write (None when calendarData was
+    not sent). Order-only saves leave the content version alone. Raises
+    CalendarEntryError for malformed calendarData.
+    """
+    if set(note_data) == {'order'}:
+        return {'$set': {'order': note_data['order']}}, None
+
+    update_data = {}
+    calendar_entries = None
+    for field in ('title', 'order', 'type', 'isExpanded'):
+        if field in note_data:
+            update_data[field] = note_data[field]
+
+    # Keep the existing cabinet, rewritten in the current stored form
+    update_data['cabinet_id'] = cabinet_ref(existing_note['cabinet_id'])
+
+    # Handle content based on note type
+    note_type = note_data.get('type', existing_note.get('type', 'standard'))
+    if note_type == 'task':
+        if 'tasks' in note_data:
+            update_data['tasks'] = note_data['tasks']
+    elif note_type == 'calendar':
+        if 'viewType' in note_data:
+            update_data['viewType'] = note_data['viewType']
+        if 'calendarData' in note_data:
+            # Full arrays from older clients are written to the entries collection
+            calendar_entries = normalize_entries(note_data['calendarData'])
+        if 'views' in note_data:
+            update_data['views'] = note_data['views']
+    elif 'content' in note_data:
+        # Unchanged content (same raw hash) is neither re-sanitized nor rewritten
+        digest = content_hash(note_data['content'])
+        if digest != existing_note.get('content_hash'):
+            update_data['content'] = sanitize_html(note_data['content'], digest)
+            update_data['content_hash'] = digest
+            update_data['content_bytes'] = content_bytes(update_data['content'])
+
+    # Keep the search fields of whatever searchable parts changed in step
+    update_data.update(search_fields_for(update_data))
+    compress_fields(update_data)
+
+    update = {'$set': update_data, '$inc': {'version': 1}}
+    if calendar_entries is not None:
+        update['$unset'] = {'calendarData': '', 'search_calendar': ''}
+    return update, calendar_entries
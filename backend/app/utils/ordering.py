@@ -0,0 +1,135 @@
+# backend/app/utils/ordering.py
+import logging
+from .versioning import bump_cabinet_version
+from .jobs import job_type
+
+logger = logging.getLogger(__name__)
+
+# Spacing between consecutive notes after creation or a rebalance
+ORDER_STEP = 1000
+
+# Below this gap a midpoint can no longer be represented distinctly, so the
+# cabinet is renumbered before the move is written
+MIN_ORDER_GAP = 1e-6
+
+# Below this gap the move still succeeds but a background rebalance is queued
+REBALANCE_ORDER_GAP = 1e-3
+
+# Passes a rebalance makes when notes keep moving under it
+REBALANCE_ATTEMPTS = 5
+
+def order_block(last_order, count):
+    """The `count` orders ending at `last_order`, for a counter bumped by a whole block"""
+    return [last_order - ORDER_STEP * (count - 1 - i) for i in range(count)]
+
+
+def allocate_order(store, cabinet_id):
+    """Reserve the next order value at the end of a cabinet.
+
+    The cabinet document keeps a `last_order` counter that is bumped with
+    one increment, so the cabinet existence check and the order lookup are a single
+    round trip and concurrent creates never receive the same value.
+    Returns None when the cabinet does not exist.
+    """
+    orders = allocate_orders(store, cabinet_id, 1)
+    return orders[0] if orders else None
+
+
+def allocate_orders(store, cabinet_id, count):
+    """Reserve `count` consecutive order values at the end of a cabinet.
+
+    The whole block is claimed with one increment, so a batch of creates
+    costs the same single round trip as one. Returns None when the cabinet
+    does not exist.
+    """
+    for _ in range(2):
+        last_order = store.cabinets.reserve_orders(cabinet_id, ORDER_STEP * count)
+        if last_order is not None:
+            return order_block(last_order, count)
+
+        # Cabinets created before the counter existed are seeded from their notes
+        if not store.cabinets.get(cabinet_id, {'_id': 1}):
+            return None
+        seed = store.notes.max_order(cabinet_id)
+        store.cabinets.seed_last_order(cabinet_id, -ORDER_STEP if seed is None else seed)
+    raise RuntimeError(f'Could not allocate an order in cabinet {cabinet_id}')
+
+
+def raise_order_floor(store, cabinet_id, order):
+    """Make sure orders allocated later land after `order`"""
+    store.cabinets.raise_order_floor(cabinet_id, order)
+
+
+def order_between(before_order, after_order):
+    """Return an order strictly between two neighbours, or None if the gap is exhausted.
+
+    `before_order` is the note that will precede the moved note and
+    `after_order` the one that will follow it; at least one must be given.
+    """
+    if before_order is None:
+        return after_order - ORDER_STEP
+    if after_order is None:
+        return before_order + ORDER_STEP
+    if after_order - before_order < MIN_ORDER_GAP:
+        return None
+    return before_order + (after_order - before_order) / 2
+
+
+def needs_rebalance(before_order, after_order):
+    if before_order is None or after_order is None:
+        return False
+    return after_order - before_order < REBALANCE_ORDER_GAP
+
+
+def rebalance_operations(notes):
+    """(note_id, update, expect) triples renumbering `notes`, read in (order, _id) order.
+
+    Each update is guarded on the order that was read, so a note moved in
+    the meantime keeps the order its move wrote. Returns the updates and
+    the last order handed out.
+    """
+    operations = []
+    new_order = 0
+    for note in notes:
+        if note.get('order') != new_order:
+            operations.append((
+                note['_id'], {'$set': {'order': new_order}}, {'order': note.get('order')}
+            ))
+        new_order += ORDER_STEP
+    return operations, new_order - ORDER_STEP
+
+
+def rebalance_cabinet(store, cabinet_id):
+    """Renumber a cabinet to evenly spaced orders with a single bulk update.
+
+    When a concurrent move makes some guarded updates miss, the cabinet is
+    read and renumbered again, up to REBALANCE_ATTEMPTS times; after that
+    the next move into a narrow gap queues another rebalance.
+    """
+    renumbered = 0
+    for _ in range(REBALANCE_ATTEMPTS):
+        operations, last_order = rebalance_operations(store.notes.list(cabinet_id, {'order': 1}))
+        modified = store.notes.bulk_update(operations)
+        renumbered += modified
+        if modified:
+            bump_cabinet_version(store, cabinet_id)
+        raise_order_floor(store, cabinet_id, last_order)
+        if modified == len(operations):
+            logger.info("Rebalanced cabinet %s: %s notes renumbered", cabinet_id, renumbered)
+            return renumbered
+        logger.info(
+            "Rebalancing cabinet %s: %d notes changed while renumbering, reading again",
+            cabinet_id, len(operations) - modified
+        )
+    logger.warning("Cabinet %s kept changing during rebalance; %s notes renumbered", cabinet_id, renumbered)
+    return renumbered
+
+
+def schedule_rebalance(jobs, cabinet_id):
+    """Queue a background rebalance of a cabinet, at most one at a time per cabinet"""
+    return jobs.submit('rebalance_cabinet', {'cabinet_id': cabinet_id}, key=f'rebalance:{cabinet_id}')
+
+
+@job_type('rebalance_cabinet')
+def _rebalance_job(store, job):
+    return {'renumbered': rebalance_cabinet(store, job.params['cabinet_id'])}
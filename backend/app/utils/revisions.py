@@ -0,0 +1,364 @@
+# backend/app/utils/revisions.py
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from .cabinet_stats import STATS_NOTE_FIELDS, content_bytes, note_footprint, stats_change
+from .content_codec import compress_fields, plain_fields
+from .jobs import job_type
+from .note_patch import apply_text_delta
+from .sanitizer import sanitize_html, content_hash
+from .search_text import SEARCH_SOURCES, search_fields_for
+from .versioning import bump_cabinet_version
+
+logger = logging.getLogger(__name__)
+
+REVISIONS_COLLECTION = 'note_revisions'
+
+# Note fields captured by a revision. Placement (order, isExpanded) is not
+# history, and calendar entries live in their own collection.
+REVISION_FIELDS = ('title', 'type', 'content', 'tasks', 'viewType', 'views')
+
+# Fields diffed as text splices; everything else is stored whole when it changes
+TEXT_FIELDS = ('title', 'content')
+
+SNAPSHOT = 'snapshot'
+DELTA = 'delta'
+
+
+class RevisionError(ValueError):
+    """Raised when a revision cannot be restored; `status` is the HTTP status.
+
+    A 409 carries the note's current `version`.
+    """
+
+    def __init__(self, message, status=400, version=None):
+        super().__init__(message)
+        self.status = status
+        self.version = version
+
+
+def note_state(note):
+    # Revisions keep plain text; compression applies to the note itself
+    return plain_fields({field: note[field] for field in REVISION_FIELDS if field in note})
+
+
+def text_delta(old, new):
+    """Smallest single-splice retain/insert/delete delta turning `old` into `new`"""
+    start = 0
+    limit = min(len(old), len(new))
+    while start < limit and old[start] == new[start]:
+        start += 1
+    end = 0
+    while end < limit - start and old[len(old) - 1 - end] == new[len(new) - 1 - end]:
+        end += 1
+
+    delta = []
+    if start:
+        delta.append({'retain': start})
+    if len(old) - start - end:
+        delta.append({'delete': len(old) - start - end})
+    if len(new) - start - end:
+        delta.append({'insert': new[start:len(new) - end]})
+    return delta
+
+
+def diff_states(old, new):
+    """Changes turning state `old` into `new`, field by field"""
+    changes = {}
+    for field in REVISION_FIELDS:
+        if field not in new:
+            if field in old:
+                changes[field] = {'unset': True}
+        elif old.get(field) != new[field] or field not in old:
+            if field in TEXT_FIELDS and isinstance(old.get(field), str) and isinstance(new[field], str):
+                changes[field] = {'delta': text_delta(old[field], new[field])}
+            else:
+                changes[field] = {'value': new[field]}
+    return changes
+
+
+def apply_changes(state, changes):
+    state = dict(state)
+    for field, change in changes.items():
+        if 'delta' in change:
+            state[field] = apply_text_delta(state[field], change['delta'])
+        elif change.get('unset'):
+            state.pop(field, None)
+        else:
+            state[field] = change['value']
+    return state
+
+
+def replay(chain):
+    """States of a chain of revisions that starts with a snapshot"""
+    states = []
+    for revision in chain:
+        if revision['kind'] == SNAPSHOT:
+            states.append(dict(revision['data']))
+        else:
+            states.append(apply_changes(states[-1], revision['data']))
+    return states
+
+
+def load_chain(store, note_object_id, seq=None):
+    """Revisions from the latest snapshot at or before `seq` up to `seq` (default: newest).
+
+    Snapshots are written at least every `snapshot_every` revisions, so this
+    is two indexed queries and a bounded number of documents.
+    """
+    snapshot = store.revisions.latest(note_object_id, kind=SNAPSHOT, max_seq=seq)
+    if snapshot is None:
+        return []
+    return store.revisions.chain(note_object_id, snapshot['seq'], seq)
+
+
+def revision_state(store, note_object_id, seq):
+    """Note fields as of revision `seq`, or None when there is no such revision"""
+    chain = load_chain(store, note_object_id, seq)
+    if not chain or chain[-1]['seq'] != seq:
+        return None
+    return replay(chain)[-1]
+
+
+def serialize_revision(revision):
+    return {
+        'seq': revision['seq'],
+        'version': revision.get('version', 0),
+        'kind': revision['kind'],
+        'started_at': revision['started_at'],
+        'updated_at': revision['updated_at'],
+    }
+
+
+def record_revision(store, note_object_id, snapshot_every=20, coalesce_seconds=60):
+    """Capture the current state of a note as its newest revision.
+
+    Saves within `coalesce_seconds` of the start of the newest revision are
+    folded into it instead of adding another, so an editing session produces
+    one revision per window rather than one per autosave. Returns the seq
+    written, or None when nothing changed.
+    """
+    projection = dict.fromkeys(REVISION_FIELDS, 1)
+    projection.update(version=1, cabinet_id=1)
+    note = store.notes.get(note_object_id, projection)
+    if note is None:
+        return None
+    state = note_state(note)
+    now = datetime.utcnow()
+    fields = {'version': note.get('version', 0), 'updated_at': now}
+
+    chain = load_chain(store, note_object_id)
+    if not chain:
+        seq, kind, data = 1, SNAPSHOT, state
+    else:
+        states = replay(chain)
+        latest = chain[-1]
+        if states[-1] == state:
+            return None
+        if now - latest['started_at'] < timedelta(seconds=coalesce_seconds):
+            if len(chain) == 1:
+                fields.update(kind=SNAPSHOT, data=state)
+            else:
+                fields.update(kind=DELTA, data=diff_states(states[-2], state))
+            # Guarded on updated_at so a concurrent fold is not silently lost
+            folded = store.revisions.update(latest['_id'], fields, latest['updated_at'])
+            return latest['seq'] if folded else None
+        seq = latest['seq'] + 1
+        if len(chain) >= snapshot_every:
+            kind, data = SNAPSHOT, state
+        else:
+            kind, data = DELTA, diff_states(states[-1], state)
+
+    if not store.revisions.insert(dict(
+        fields, note_id=note_object_id, cabinet_id=note.get('cabinet_id'),
+        seq=seq, kind=kind, data=data, started_at=now
+    )):
+        # Another worker recorded this note first; the next save catches up
+        return None
+    return seq
+
+
+def restore_update(state):
+    """Note update that puts the fields of a revision back"""
+    fields = dict(state)
+    if isinstance(fields.get('content'), str):
+        fields['content_hash'] = content_hash(fields['content'])
+        fields['content'] = sanitize_html(fields['content'], fields['content_hash'])
+    fields['content_bytes'] = content_bytes(fields.get('content'))
+    fields.update(search_fields_for(fields))
+    compress_fields(fields)
+
+    unset = {field: '' for field in REVISION_FIELDS if field not in state}
+    for source, search_field in SEARCH_SOURCES.items():
+        if source in unset:
+            unset[search_field] = ''
+    if 'content' in unset:
+        unset['content_hash'] = ''
+    update = {'$set': fields, '$inc': {'version': 1}}
+    if unset:
+        update['$unset'] = unset
+    return update
+
+
+def restore_revision(store, note_object_id, seq, base_version=None):
+    """Put a note back to revision `seq` and bump its cabinet; (the note as restored, the update).
+
+    The cabinet counters need the note's type and size from before the
+    restore, so the write is pinned to the version they were read at.
+    """
+    state = revision_state(store, note_object_id, seq)
+    if state is None:
+        raise RevisionError('Revision not found', 404)
+
+    update = restore_update(state)
+    before = store.notes.get(note_object_id, dict(STATS_NOTE_FIELDS, version=1), version=base_version)
+    restored_note = None
+    if before is not None:
+        restored_note = store.notes.update_and_get(note_object_id, update, version=before.get('version', 0))
+    if restored_note is None:
+        current = store.notes.get(note_object_id, {'version': 1})
+        if not current:
+            raise RevisionError('Note not found', 404)
+        raise RevisionError('Version conflict', 409, current.get('version', 0))
+
+    bump_cabinet_version(
+        store, restored_note.get('cabinet_id'),
+        stats_change(note_footprint(before), note_footprint(restored_note))
+    )
+    return restored_note, update
+
+
+def delete_revisions(store, note_object_ids):
+    store.revisions.delete_for_notes(note_object_ids)
+
+
+def encode_chain(revisions, states, snapshot_every):
+    """Snapshot/delta encoding of consecutive revisions with known states"""
+    encoded = []
+    since_snapshot = snapshot_every
+    for index, (revision, state) in enumerate(zip(revisions, states)):
+        if since_snapshot >= snapshot_every:
+            encoded.append((revision, SNAPSHOT, state))
+            since_snapshot = 1
+        else:
+            encoded.append((revision, DELTA, diff_states(states[index - 1], state)))
+            since_snapshot += 1
+    return encoded
+
+
+def compact_note(store, note_object_id, cutoff, bucket_seconds, snapshot_every=20):
+    """Thin a note's revisions older than `cutoff` to the last one per time bucket.
+
+    The newest old revision is always kept, so revisions after the cutoff
+    (deltas against it) stay valid. Returns the number of revisions removed.
+    """
+    last_old = store.revisions.latest(note_object_id, started_before=cutoff)
+    if last_old is None:
+        return 0
+    chain = store.revisions.chain(note_object_id, last_seq=last_old['seq'])
+    if not chain or chain[0]['kind'] != SNAPSHOT:
+        logger.error("Revisions of note %s do not start with a snapshot", note_object_id)
+        return 0
+    states = replay(chain)
+
+    kept = {}
+    for index, revision in enumerate(chain):
+        bucket = int(revision['started_at'].timestamp()) // bucket_seconds
+        kept[bucket] = index
+    kept_indexes = sorted(kept.values())
+    dropped = [revision['_id'] for index, revision in enumerate(chain) if index not in kept.values()]
+
+    updates = [
+        (revision['_id'], {'kind': kind, 'data': data, 'compacted': True})
+        for revision, kind, data in encode_chain(
+            [chain[index] for index in kept_indexes],
+            [states[index] for index in kept_indexes],
+            snapshot_every
+        )
+    ]
+    store.revisions.rewrite(updates, dropped)
+    return len(dropped)
+
+
+@job_type('compact_revisions')
+def _compact_revisions_job(store, job):
+    cutoff = datetime.utcnow() - timedelta(seconds=job.params['older_than_seconds'])
+    note_ids = store.revisions.notes_to_compact(cutoff)
+    job.progress(0, len(note_ids))
+    removed = 0
+    for done, note_id in enumerate(note_ids, 1):
+        removed += compact_note(
+            store, note_id, cutoff, job.params['bucket_seconds'], job.params['snapshot_every']
+        )
+        job.progress(done, len(note_ids))
+    return {'notes': len(note_ids), 'removed': removed}
+
+
+class RevisionRecorder:
+    """Records revisions on a background thread so saves never wait for them.
+
+    Notes saved again before the thread gets to them are recorded once.
+    Queued notes are lost if the process dies; their next save records them.
+    """
+
+    def __init__(self, store, jobs=None, enabled=True, snapshot_every=20, coalesce_seconds=60,
+                 compact_after_seconds=7 * 24 * 3600, compact_bucket_seconds=3600,
+                 compact_interval_seconds=3600):
+        self.store = store
+        self.jobs = jobs
+        self.enabled = enabled
+        self.snapshot_every = snapshot_every
+        self.coalesce_seconds = coalesce_seconds
+        self.compact_after_seconds = compact_after_seconds
+        self.compact_bucket_seconds = compact_bucket_seconds
+        self.compact_interval_seconds = compact_interval_seconds
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        # Held while a flush drains the queue, so a flush also waits for a
+        # record the background thread has already taken off it
+        self._flushing = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._next_compaction = time.monotonic() + 60
+
+    def record(self, *note_object_ids):
+        if not self.enabled:
+            return
+        with self._lock:
+            for note_object_id in note_object_ids:
+                self._pending[note_object_id] = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='revisions', daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def flush(self):
+        """Record everything queued so far on the calling thread"""
+        with self._flushing:
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        return
+                    note_object_id, _ = self._pending.popitem(last=False)
+                try:
+                    record_revision(self.store, note_object_id, self.snapshot_every, self.coalesce_seconds)
+                except Exception as e:
+                    logger.error("Error recording revision of note %s: %s", note_object_id, e)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(timeout=self.compact_interval_seconds)
+            self._wake.clear()
+            self.flush()
+            if self.jobs is not None and time.monotonic() >= self._next_compaction:
+                self._next_compaction = time.monotonic() + self.compact_interval_seconds
+                try:
+                    self.jobs.submit('compact_revisions', {
+                        'older_than_seconds': self.compact_after_seconds,
+                        'bucket_seconds': self.compact_bucket_seconds,
+                        'snapshot_every': self.snapshot_every,
+                    }, key='compact_revisions')
+                except Exception as e:
+                    logger.error("Error scheduling revision compaction: %s", e)
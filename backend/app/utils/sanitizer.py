@@ -0,0 +1,118 @@
+# backend/app/utils/sanitizer.py
+import hashlib
+import threading
+from collections import OrderedDict
+
+ALLOWED_TAGS = [
+    'p', 'div', 'span',
+    'h1', 'h2', 'h3',
+    'strong', 'em', 'u', 's',
+    'ul', 'ol', 'li',
+    'pre', 'code',
+    'blockquote', 'a',
+    'input'
+]
+
+ALLOWED_ATTRIBUTES = {
+    '*': ['class', 'style', 'data-type'],
+    'a': ['href'],
+    'input': ['type', 'checked']
+}
+
+
+class SanitizedCache:
+    """Thread-safe LRU of sanitized HTML keyed by the hash of the raw input.
+
+    Bounded both by entry count and by the total length of the cached strings
+    so a handful of very large notes cannot pin unbounded memory.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = value
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Cleaners keep parser state between calls, so each thread builds its own once
+_local = threading.local()
+_cache = SanitizedCache()
+
+
+def configure(max_entries, max_bytes):
+    """Resize the shared sanitized-output cache"""
+    global _cache
+    _cache = SanitizedCache(max_entries, max_bytes)
+
+
+def cache_stats():
+    return _cache.stats()
+
+
+def _get_cleaner():
+    cleaner = getattr(_local, 'cleaner', None)
+    if cleaner is None:
+        # bleach (and html5lib behind it) is only imported once something is sanitized
+        from bleach.sanitizer import Cleaner
+        cleaner = Cleaner(tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, strip=True)
+        _local.cleaner = cleaner
+    return cleaner
+
+
+def content_hash(content):
+    """Stable digest of raw note content, stored next to the note as `content_hash`"""
+    return hashlib.blake2b((content or '').encode('utf-8'), digest_size=16).hexdigest()
+
+
+def sanitize_html(content, digest=None):
+    """Sanitize note HTML, reusing earlier results for identical input"""
+    if not content:
+        return ''
+
+    digest = digest or content_hash(content)
+    cleaned = _cache.get(digest)
+    if cleaned is None:
+        cleaned = _get_cleaner().clean(content)
+        _cache.put(digest, cleaned)
+    return cleaned
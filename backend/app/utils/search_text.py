@@ -0,0 +1,213 @@
+# backend/app/utils/search_text.py
+import html
+import re
+from .cabinet_refs import cabinet_key
+from .content_codec import decompress_text
+from .jobs import job_type
+
+# Note field -> derived plain-text field covered by the notes text index.
+# Each source is extracted independently so a write only re-extracts the
+# parts of the note it actually changed.
+SEARCH_SOURCES = {
+    'content': 'search_content',
+    'tasks': 'search_tasks',
+    'calendarData': 'search_calendar',
+}
+
+SEARCH_FIELDS = list(SEARCH_SOURCES.values())
+
+# Title matches count more than body matches when ranking
+TEXT_INDEX_WEIGHTS = {'title': 5, 'search_content': 1, 'search_tasks': 1, 'search_calendar': 1}
+
+SNIPPET_RADIUS = 60
+
+_whitespace = re.compile(r'\s+')
+
+
+def html_to_text(markup):
+    """Visible text of an HTML fragment with whitespace collapsed"""
+    if not markup:
+        return ''
+    if '<' not in markup:
+        return _whitespace.sub(' ', markup).strip()
+    # Imported on first use so app startup does not pay for bs4
+    from bs4 import BeautifulSoup
+    text = BeautifulSoup(markup, 'html.parser').get_text(' ')
+    return _whitespace.sub(' ', text).strip()
+
+
+def _tasks_text(tasks):
+    if not isinstance(tasks, list):
+        return ''
+    return ' '.join(
+        html_to_text(str(task.get('text') or ''))
+        for task in tasks if isinstance(task, dict)
+    ).strip()
+
+
+def _calendar_text(entries):
+    if not isinstance(entries, list):
+        return ''
+    return ' '.join(
+        html_to_text(str(entry.get('content') or ''))
+        for entry in entries if isinstance(entry, dict)
+    ).strip()
+
+
+def _text(value):
+    return value if isinstance(value, str) else ''
+
+
+_extractors = {
+    'content': lambda value: html_to_text(_text(decompress_text(value))),
+    'tasks': _tasks_text,
+    'calendarData': _calendar_text,
+}
+
+
+def search_fields_for(values):
+    """Derived search fields for whichever searchable sources appear in `values`"""
+    return {
+        SEARCH_SOURCES[source]: _extractors[source](values[source])
+        for source in SEARCH_SOURCES
+        if source in values
+    }
+
+
+def reindex_notes(store, cabinet_id=None, batch_size=500, progress=None):
+    """Recompute the search fields of a cabinet's notes (or all) in bulk batches.
+
+    `progress(indexed)` is called after each batch when given.
+    """
+    projection = {source: 1 for source in SEARCH_SOURCES}
+    operations = []
+    indexed = 0
+    for note in store.notes.list(cabinet_id, projection, batch_size=batch_size):
+        fields = search_fields_for({source: note.get(source) for source in SEARCH_SOURCES})
+        operations.append((note['_id'], {'$set': fields}, None))
+        if len(operations) >= batch_size:
+            store.notes.bulk_update(operations)
+            indexed += len(operations)
+            operations = []
+            if progress:
+                progress(indexed)
+    if operations:
+        store.notes.bulk_update(operations)
+        indexed += len(operations)
+    return indexed
+
+
+@job_type('reindex_notes')
+def _reindex_job(store, job):
+    cabinet_id = job.params.get('cabinet_id') or None
+    total = store.notes.count(cabinet_id)
+    job.progress(0, total)
+    return {'indexed': reindex_notes(store, cabinet_id, progress=lambda indexed: job.progress(indexed, total))}
+
+
+def query_terms(search):
+    """Plain terms of a $text search string, without negations or quotes"""
+    terms = []
+    for token in re.findall(r'-?"[^"]*"|\S+', search):
+        if token.startswith('-'):
+            continue
+        token = token.strip('"')
+        terms.extend(word for word in re.findall(r'\w+', token) if word)
+    return terms
+
+
+def build_snippet(texts, terms, radius=SNIPPET_RADIUS):
+    """HTML-escaped excerpt around the first matching term with matches wrapped in <mark>"""
+    text = ' '.join(t for t in texts if t)
+    if not text:
+        return ''
+    if not terms:
+        return html.escape(text[:radius * 2])
+
+    # Prefix matching keeps highlights working for stemmed matches ("running" ~ "run")
+    stems = sorted({term[:max(3, len(term) - 2)] for term in terms}, key=len, reverse=True)
+    pattern = re.compile(r'\b(' + '|'.join(re.escape(stem) for stem in stems) + r')\w*', re.IGNORECASE)
+
+    first = pattern.search(text)
+    start = max(0, first.start() - radius) if first else 0
+    end = min(len(text), (first.end() if first else 0) + radius)
+    excerpt = text[start:end]
+
+    pieces = []
+    position = 0
+    for match in pattern.finditer(excerpt):
+        pieces.append(html.escape(excerpt[position:match.start()]))
+        pieces.append('<mark>' + html.escape(match.group(0)) + '</mark>')
+        position = match.end()
+    pieces.append(html.escape(excerpt[position:]))
+
+    snippet = ''.join(pieces)
+    if start > 0:
+        snippet = '…' + snippet
+    if end < len(text):
+        snippet = snippet + '…'
+    return snippet
+
+
+# Note fields a search result is built from, besides the search fields
+HEADER_PROJECTION = {'title': 1, 'type': 1, 'cabinet_id': 1, 'order': 1}
+
+
+def _search_result(note, score, snippet):
+    return {
+        '_id': str(note['_id']),
+        'cabinet_id': cabinet_key(note.get('cabinet_id')),
+        'title': note.get('title', ''),
+        'type': note.get('type', 'standard'),
+        'order': note.get('order'),
+        'score': score,
+        'snippet': snippet
+    }
+
+
+def search_page(store, search, cabinet_id, limit, offset):
+    """One page of ranked results over notes and calendar entries, and the next offset.
+
+    Notes and calendar entries are ranked separately, so each source
+    supplies its best `window` hits and the merged list is paginated.
+    """
+    window = offset + limit + 1
+    projection = dict(HEADER_PROJECTION)
+    for field in SEARCH_FIELDS:
+        projection[field] = 1
+
+    terms = query_terms(search)
+    results = {}
+    for hit in store.notes.search(search, cabinet_id, window, projection):
+        results[hit['_id']] = _search_result(
+            hit, hit.get('score'),
+            build_snippet([hit.get(field) for field in SEARCH_FIELDS], terms)
+        )
+
+    entry_hits = {}
+    for entry in store.calendar_entries.search(search, cabinet_id, window):
+        # Entries arrive best first, so the first one per note is its best
+        entry_hits.setdefault(entry['note_id'], entry)
+
+    missing = [note_id for note_id in entry_hits if note_id not in results]
+    headers = {
+        note['_id']: note
+        for note in store.notes.find(missing, HEADER_PROJECTION)
+    } if missing else {}
+
+    for note_id, entry in entry_hits.items():
+        snippet = entry['date'] + ': ' + build_snippet([entry.get('content')], terms)
+        existing = results.get(note_id)
+        if existing is None:
+            if note_id in headers:
+                results[note_id] = _search_result(headers[note_id], entry.get('score'), snippet)
+        elif entry.get('score', 0) > (existing['score'] or 0):
+            existing['score'] = entry.get('score')
+            if not existing['snippet']:
+                existing['snippet'] = snippet
+
+    ranked = sorted(results.values(), key=lambda result: result['score'] or 0, reverse=True)
+    return {
+        'results': ranked[offset:offset + limit],
+        'next_offset': offset + limit if len(ranked) > offset + limit else None
+    }
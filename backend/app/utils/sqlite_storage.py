@@ -0,0 +1,1104 @@
+# backend/app/utils/sqlite_storage.py
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import bson
+from bson.objectid import ObjectId
+from .cabinet_refs import cabinet_key
+from .jobs import QUEUED, RUNNING
+from .search_text import TEXT_INDEX_WEIGHTS
+from .storage import UpdateError
+from .tasks import task_matches, tally_tasks
+
+# Documents are kept whole as BSON, so they round-trip with the same types
+# (ObjectId, datetime) pymongo returns. The fields queries filter or sort on
+# are copied into indexed columns next to them on every write.
+
+# Rows read per query while a listing or maintenance walk is consumed
+WALK_BATCH_SIZE = 500
+
+# How long a write waits for another process holding the database file
+BUSY_TIMEOUT_MS = 5000
+
+# Indexed datetime columns hold this form, which sorts like the datetimes do
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Note search columns, ranked with the weights of the MongoDB text index
+SEARCH_COLUMNS = list(TEXT_INDEX_WEIGHTS)
+SEARCH_RANK = f"bm25(notes_search, {', '.join(str(TEXT_INDEX_WEIGHTS[name]) for name in SEARCH_COLUMNS)})"
+
+SCHEMA_MIGRATIONS = {
+    1: ('Tables with listing, lookup and full-text indexes', [
+        """CREATE TABLE notes (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            cabinet_id TEXT,
+            sort_order NUMERIC,
+            inline_calendar INTEGER NOT NULL DEFAULT 0,
+            doc BLOB NOT NULL
+        )""",
+        # Listings, exports and rebalances walk a cabinet in (order, _id) order
+        "CREATE INDEX notes_cabinet_order ON notes (cabinet_id, sort_order, id)",
+        "CREATE INDEX notes_order ON notes (sort_order, id)",
+        f"""CREATE VIRTUAL TABLE notes_search USING fts5(
+            {', '.join(SEARCH_COLUMNS)}, tokenize='porter unicode61'
+        )""",
+        """CREATE TABLE calendar_entries (
+            pk INTEGER PRIMARY KEY,
+            note_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            cabinet_id TEXT,
+            content TEXT NOT NULL DEFAULT '',
+            updated_at TEXT,
+            UNIQUE (note_id, date)
+        )""",
+        "CREATE INDEX calendar_entries_cabinet ON calendar_entries (cabinet_id)",
+        """CREATE VIRTUAL TABLE calendar_search USING fts5(
+            content, content='calendar_entries', content_rowid='pk', tokenize='porter unicode61'
+        )""",
+        """CREATE TRIGGER calendar_entries_insert AFTER INSERT ON calendar_entries BEGIN
+            INSERT INTO calendar_search (rowid, content) VALUES (new.pk, new.content);
+        END""",
+        """CREATE TRIGGER calendar_entries_delete AFTER DELETE ON calendar_entries BEGIN
+            INSERT INTO calendar_search (calendar_search, rowid, content) VALUES ('delete', old.pk, old.content);
+        END""",
+        """CREATE TRIGGER calendar_entries_update AFTER UPDATE OF content ON calendar_entries BEGIN
+            INSERT INTO calendar_search (calendar_search, rowid, content) VALUES ('delete', old.pk, old.content);
+            INSERT INTO calendar_search (rowid, content) VALUES (new.pk, new.content);
+        END""",
+        """CREATE TABLE cabinets (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT UNIQUE,
+            created_at TEXT,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            doc BLOB NOT NULL
+        )""",
+        "CREATE INDEX cabinets_live ON cabinets (deleted, created_at)",
+        """CREATE TABLE note_revisions (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            note_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            kind TEXT,
+            started_at TEXT,
+            compacted INTEGER NOT NULL DEFAULT 0,
+            doc BLOB NOT NULL,
+            UNIQUE (note_id, seq)
+        )""",
+        "CREATE INDEX note_revisions_started ON note_revisions (started_at)",
+        """CREATE TABLE jobs (
+            pk INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE,
+            type TEXT,
+            status TEXT,
+            active_key TEXT UNIQUE,
+            created_at TEXT,
+            updated_at TEXT,
+            expires_at TEXT,
+            doc BLOB NOT NULL
+        )""",
+        "CREATE INDEX jobs_status ON jobs (status, updated_at)",
+        "CREATE INDEX jobs_created ON jobs (created_at)",
+        "CREATE INDEX jobs_expires ON jobs (expires_at)",
+    ]),
+    # Notes written before this have NULL in both; the stats reconcile job
+    # rewrites every note without content_bytes, which fills them in
+    2: ('Note type and content size columns for the cabinet counters', [
+        "ALTER TABLE notes ADD COLUMN type TEXT",
+        "ALTER TABLE notes ADD COLUMN content_bytes INTEGER",
+    ]),
+}
+
+
+def _time(value):
+    """Column form of a datetime, at the millisecond precision BSON stores"""
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000).strftime(TIME_FORMAT)
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _object_id(value):
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def _marks(values):
+    return ', '.join('?' * len(values))
+
+
+def project(document, projection):
+    """Apply a top-level MongoDB projection: inclusion or exclusion, _id kept unless excluded"""
+    if not projection:
+        return document
+    including = any(value for name, value in projection.items() if name != '_id') or all(projection.values())
+    if not including:
+        return {name: value for name, value in document.items() if name not in projection}
+    keep_id = projection.get('_id', 1)
+    return {
+        name: value for name, value in document.items()
+        if (keep_id if name == '_id' else projection.get(name))
+    }
+
+
+def at_version(document, version):
+    """Whether a document is at `version`, missing counting as 0; any version when None"""
+    if version is None:
+        return True
+    if version == 0:
+        return document.get('version') in (0, None)
+    return document.get('version') == version
+
+
+def holds(document, expect):
+    """Whether top-level fields still hold the `expect` values, None standing for absent"""
+    return all(document.get(name) == value for name, value in (expect or {}).items())
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _child(container, part, path):
+    if isinstance(container, dict):
+        value = container.get(part)
+        if value is None:
+            value = container[part] = {}
+        return value
+    if isinstance(container, list) and part.isdigit():
+        index = int(part)
+        container.extend([None] * (index + 1 - len(container)))
+        if container[index] is None:
+            container[index] = {}
+        return container[index]
+    raise UpdateError(f"Cannot create field '{part}' of '{path}' in a {type(container).__name__} value")
+
+
+def _parent(document, path):
+    """(container, key) of the last segment of a dotted path, creating the containers above it"""
+    parts = path.split('.')
+    container = document
+    for part in parts[:-1]:
+        container = _child(container, part, path)
+        if not isinstance(container, (dict, list)):
+            raise UpdateError(f"Cannot update '{path}' through a {type(container).__name__} value")
+    return container, parts[-1]
+
+
+def _index(container, key, path):
+    if not key.isdigit():
+        raise UpdateError(f"Cannot use '{key}' of '{path}' as an array index")
+    return int(key)
+
+
+def _read(container, key, path):
+    """(exists, value) at `key` of a dict or list"""
+    if isinstance(container, dict):
+        return key in container, container.get(key)
+    index = _index(container, key, path)
+    return index < len(container), container[index] if index < len(container) else None
+
+
+def _write(container, key, value, path):
+    if isinstance(container, dict):
+        container[key] = value
+        return
+    index = _index(container, key, path)
+    container.extend([None] * (index + 1 - len(container)))
+    container[index] = value
+
+
+def _unset(document, path):
+    container = document
+    parts = path.split('.')
+    for part in parts[:-1]:
+        exists, container = _read(container, part, path) if isinstance(container, (dict, list)) else (False, None)
+        if not exists:
+            return
+    if isinstance(container, dict):
+        container.pop(parts[-1], None)
+    elif isinstance(container, list) and parts[-1].isdigit() and int(parts[-1]) < len(container):
+        # Like MongoDB, unsetting an array element leaves a null in its place
+        container[int(parts[-1])] = None
+
+
+def apply_update(document, update):
+    """Apply an update document in place.
+
+    Covers the operators the app writes with: $set, $unset, $inc, $max and
+    $push (with $each and $position), on dotted paths.
+    """
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == '$unset':
+                _unset(document, path)
+                continue
+            container, key = _parent(document, path)
+            exists, current = _read(container, key, path)
+            if operator == '$set':
+                _write(container, key, value, path)
+            elif operator == '$inc':
+                if exists and not _is_number(current):
+                    raise UpdateError(f"Cannot apply $inc to the non-numeric value of '{path}'")
+                _write(container, key, (current or 0) + value, path)
+            elif operator == '$max':
+                try:
+                    if not exists or current is None or value > current:
+                        _write(container, key, value, path)
+                except TypeError:
+                    raise UpdateError(f"Cannot compare the value of '{path}' for $max")
+            elif operator == '$push':
+                if exists and not isinstance(current, list):
+                    raise UpdateError(f"Cannot $push to the non-array value of '{path}'")
+                items = list(current or [])
+                if isinstance(value, dict) and '$each' in value:
+                    position = value.get('$position')
+                    at = len(items) if position is None else min(position, len(items))
+                    items[at:at] = value['$each']
+                else:
+                    items.append(value)
+                _write(container, key, items, path)
+            else:
+                raise UpdateError(f'Unsupported update operator {operator}')
+
+
+def text_query(search):
+    """FTS5 query for a MongoDB $text search string, or None when it matches nothing.
+
+    As with $text, every quoted phrase must appear when there are any,
+    otherwise any one of the terms, and -negated terms exclude a note.
+    """
+    phrases, terms, excluded = [], [], []
+    for token in re.findall(r'-?"[^"]*"|\S+', search):
+        negated = token.startswith('-')
+        words = re.findall(r'\w+', token)
+        if not words:
+            continue
+        if negated:
+            excluded.append('"' + ' '.join(words) + '"')
+        elif token.startswith('"'):
+            phrases.append('"' + ' '.join(words) + '"')
+        else:
+            terms.extend(f'"{word}"' for word in words)
+    if phrases:
+        query = ' AND '.join(phrases)
+    elif terms:
+        query = ' OR '.join(terms)
+    else:
+        return None
+    if excluded:
+        query = f"({query}) NOT ({' OR '.join(excluded)})"
+    return query
+
+
+class _Documents:
+    """One table of BSON documents keyed by the string form of their _id.
+
+    Subclasses name the columns copied out of each document for their
+    queries; `columns_of` returns those values for a document.
+    """
+
+    table = None
+    columns = ()
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def columns_of(self, document):
+        raise NotImplementedError
+
+    def _documents(self, where='', params=(), projection=None, tail=''):
+        rows = self.storage.fetch(f'SELECT doc FROM {self.table} {where} {tail}', params)
+        return [project(bson.decode(row[0]), projection) for row in rows]
+
+    def _document(self, key, projection=None):
+        row = self.storage.fetch_one(f'SELECT doc FROM {self.table} WHERE id = ?', (str(key),))
+        return project(bson.decode(row[0]), projection) if row else None
+
+    def _insert(self, document):
+        """Store a new document; like pymongo, sets its _id when missing. Returns the row's pk"""
+        document.setdefault('_id', ObjectId())
+        names = ('id',) + self.columns + ('doc',)
+        values = (str(document['_id']),) + tuple(self.columns_of(document)) + (bson.encode(document),)
+        return self.storage.execute(
+            f"INSERT INTO {self.table} ({', '.join(names)}) VALUES ({_marks(names)})", values
+        ).lastrowid
+
+    def _save(self, pk, document):
+        assignments = ', '.join(f'{name} = ?' for name in self.columns + ('doc',))
+        self.storage.execute(
+            f'UPDATE {self.table} SET {assignments} WHERE pk = ?',
+            tuple(self.columns_of(document)) + (bson.encode(document), pk)
+        )
+
+    def _modify(self, key, change):
+        """Read one document, let `change` edit it in place and write it back, in one transaction.
+
+        `change` returns False to leave the document alone. Returns the
+        document as it was, the document as written (None when it is
+        missing or `change` declined) and whether it changed.
+        """
+        with self.storage.transaction():
+            row = self.storage.fetch_one(f'SELECT pk, doc FROM {self.table} WHERE id = ?', (str(key),))
+            if row is None:
+                return None, None, False
+            pk, stored = row
+            document = bson.decode(stored)
+            if change(document) is False:
+                return None, None, False
+            encoded = bson.encode(document)
+            if encoded != stored:
+                self._save(pk, document)
+            return bson.decode(stored), document, encoded != stored
+
+    def _update(self, key, update, guard=None):
+        """Apply an update document while `guard(document)` holds; see _modify"""
+        def change(document):
+            if guard is not None and not guard(document):
+                return False
+            apply_update(document, update)
+        return self._modify(key, change)
+
+
+class SQLiteNotes(_Documents):
+    """The notes table, with its full-text index kept in step on every write"""
+
+    table = 'notes'
+    columns = ('cabinet_id', 'sort_order', 'inline_calendar', 'type', 'content_bytes')
+
+    # Fields with_field, without_field and count can test for
+    PRESENT = {
+        'calendarData': 'inline_calendar = 1',
+        'content_bytes': 'content_bytes IS NOT NULL',
+    }
+
+    def columns_of(self, note):
+        note_type = note.get('type')
+        return (
+            cabinet_key(note.get('cabinet_id')),
+            _number(note.get('order')),
+            int('calendarData' in note),
+            # A type that is not a string is counted as 'other', see cabinet_stats._type_key
+            note_type if note_type is None or isinstance(note_type, str) else '',
+            _number(note.get('content_bytes')),
+        )
+
+    def _index(self, pk, note):
+        self.storage.execute('DELETE FROM notes_search WHERE rowid = ?', (pk,))
+        values = [note.get(name) for name in SEARCH_COLUMNS]
+        self.storage.execute(
+            f"INSERT INTO notes_search (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, {_marks(values)})",
+            [pk] + [value if isinstance(value, str) else '' for value in values]
+        )
+
+    def _insert(self, note):
+        pk = super()._insert(note)
+        self._index(pk, note)
+        return pk
+
+    def _save(self, pk, note):
+        super()._save(pk, note)
+        self._index(pk, note)
+
+    def _present(self, field):
+        if field not in self.PRESENT:
+            raise ValueError(f'Cannot look up notes by whether they store {field!r}')
+        return self.PRESENT[field]
+
+    def get(self, note_id, projection=None, version=None):
+        """One note, or None; with `version` only while it is at that version"""
+        note = self._document(note_id)
+        return project(note, projection) if note is not None and at_version(note, version) else None
+
+    def find(self, note_ids, projection=None):
+        """The notes among `note_ids` that exist, in no particular order"""
+        keys = [str(note_id) for note_id in note_ids]
+        return self._documents(f'WHERE id IN ({_marks(keys)})', keys, projection) if keys else []
+
+    def list(self, cabinet_id=None, projection=None, after=None, limit=None, batch_size=None):
+        """Lazy walk of a cabinet's notes (every note when None) in (order, _id) order.
+
+        Same contract as MongoNotes.list. Rows are read in keyset batches on
+        the (cabinet_id, sort_order, id) index, so only one batch is held at
+        a time and the database is free between batches.
+        """
+        batch_size = batch_size or WALK_BATCH_SIZE
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            conditions, params = [], []
+            if cabinet_id is not None:
+                conditions.append('cabinet_id = ?')
+                params.append(cabinet_key(cabinet_id))
+            if after is not None:
+                order, after_id = after
+                if after_id is None:
+                    conditions.append('sort_order > ?')
+                    params.append(order)
+                else:
+                    conditions.append('(sort_order, id) > (?, ?)')
+                    params.extend([order, str(after_id)])
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            rows = self.storage.fetch(
+                f'SELECT sort_order, id, doc FROM notes {where} ORDER BY sort_order, id LIMIT ?', params + [size]
+            )
+            for row in rows:
+                yield project(bson.decode(row[2]), projection)
+            if len(rows) < size:
+                return
+            if remaining is not None:
+                remaining -= len(rows)
+            after = rows[-1][0], rows[-1][1]
+
+    def scan(self, projection=None, after_id=None, limit=None):
+        """Every note in _id order, for maintenance jobs that resume where they stopped"""
+        where, params = ('WHERE id > ?', [str(after_id)]) if after_id is not None else ('', [])
+        tail = 'ORDER BY id' + (' LIMIT ?' if limit is not None else '')
+        return self._documents(where, params + ([limit] if limit is not None else []), projection, tail)
+
+    def with_field(self, field, projection=None, batch_size=None):
+        """Lazy walk of the notes that store `field` at all"""
+        condition = self._present(field)
+        after = 0
+        while True:
+            rows = self.storage.fetch(
+                f'SELECT pk, doc FROM notes WHERE {condition} AND pk > ? ORDER BY pk LIMIT ?',
+                (after, batch_size or WALK_BATCH_SIZE)
+            )
+            if not rows:
+                return
+            for row in rows:
+                yield project(bson.decode(row[1]), projection)
+            after = rows[-1][0]
+
+    def without_field(self, field, projection=None, limit=None):
+        """Up to `limit` notes that do not store `field`"""
+        return self._documents(
+            f'WHERE NOT ({self._present(field)})', [limit if limit is not None else -1], projection, 'LIMIT ?'
+        )
+
+    def count(self, cabinet_id=None, field=None):
+        """Number of notes in a cabinet (or in all), only counting those storing `field` if given"""
+        conditions, params = [], []
+        if cabinet_id is not None:
+            conditions.append('cabinet_id = ?')
+            params.append(cabinet_key(cabinet_id))
+        if field:
+            conditions.append(self._present(field))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self.storage.fetch_one(f'SELECT COUNT(*) FROM notes {where}', params)[0]
+
+    def max_order(self, cabinet_id):
+        """Highest order in a cabinet, or None when it has no notes"""
+        return self.storage.fetch_one(
+            'SELECT MAX(sort_order) FROM notes WHERE cabinet_id = ?', (cabinet_key(cabinet_id),)
+        )[0]
+
+    def insert(self, note):
+        """Store a new note; sets and returns its _id"""
+        with self.storage.transaction():
+            self._insert(note)
+        return note['_id']
+
+    def insert_many(self, notes):
+        with self.storage.transaction():
+            for note in notes:
+                self._insert(note)
+
+    def update(self, note_id, update, version=None, expect=None):
+        """Apply an update document to one note; True when the note matched, see MongoNotes.update"""
+        _, written, _ = self._update(note_id, update, lambda note: at_version(note, version) and holds(note, expect))
+        return written is not None
+
+    def update_and_get(self, note_id, update, version=None, projection=None):
+        """Like update, returning the note as written, or None when it did not match"""
+        _, written, _ = self._update(note_id, update, lambda note: at_version(note, version))
+        return project(written, projection) if written is not None else None
+
+    def bulk_update(self, updates):
+        """Apply (note_id, update, expect) triples in one transaction; returns how many notes changed"""
+        modified = 0
+        with self.storage.transaction():
+            for note_id, update, expect in updates:
+                modified += self._update(note_id, update, lambda note: holds(note, expect))[2]
+        return modified
+
+    def write_batch(self, writes, ordered):
+        """Apply NoteWrites in one transaction; returns the write errors by index into `writes`.
+
+        Same contract as MongoNotes.write_batch; a duplicate _id reports the
+        MongoDB duplicate key code.
+        """
+        errors = []
+        with self.storage.transaction():
+            for index, write in enumerate(writes):
+                self.storage.execute('SAVEPOINT note_write')
+                try:
+                    if write.op == 'insert':
+                        self._insert(write.document)
+                    elif write.op == 'update':
+                        self._update(write.note_id, write.document, lambda note: at_version(note, write.base_version))
+                    else:
+                        self._delete_where(write.note_id, write.base_version)
+                except (sqlite3.IntegrityError, UpdateError) as e:
+                    self.storage.execute('ROLLBACK TO note_write')
+                    code = 11000 if isinstance(e, sqlite3.IntegrityError) else 2
+                    errors.append({'index': index, 'code': code, 'errmsg': str(e)})
+                    if ordered:
+                        self.storage.execute('RELEASE note_write')
+                        break
+                self.storage.execute('RELEASE note_write')
+        return errors
+
+    def _delete_where(self, note_id, version=None):
+        """Delete one note (only at `version` if given) with its search row; returns it, or None"""
+        with self.storage.transaction():
+            row = self.storage.fetch_one('SELECT pk, doc FROM notes WHERE id = ?', (str(note_id),))
+            if row is None:
+                return None
+            note = bson.decode(row[1])
+            if not at_version(note, version):
+                return None
+            self.storage.execute('DELETE FROM notes_search WHERE rowid = ?', (row[0],))
+            self.storage.execute('DELETE FROM notes WHERE pk = ?', (row[0],))
+            return note
+
+    def delete(self, note_id, projection=None):
+        """Delete one note; returns it as it was, or None when there was none"""
+        note = self._delete_where(note_id)
+        return project(note, projection) if note is not None else None
+
+    def delete_many(self, note_ids):
+        keys = [str(note_id) for note_id in note_ids]
+        if not keys:
+            return 0
+        with self.storage.transaction():
+            self.storage.execute(
+                f'DELETE FROM notes_search WHERE rowid IN (SELECT pk FROM notes WHERE id IN ({_marks(keys)}))', keys
+            )
+            return self.storage.execute(f'DELETE FROM notes WHERE id IN ({_marks(keys)})', keys).rowcount
+
+    def _write_task(self, note_id, change, projection):
+        """Let `change(tasks)` edit a task note's tasks and bump its version; see MongoNotes.add_task"""
+        def edit(note):
+            if note.get('type') != 'task':
+                return False
+            tasks = note.get('tasks')
+            if tasks is not None and not isinstance(tasks, list):
+                raise UpdateError("The note's tasks are not an array")
+            tasks = list(tasks or [])
+            if change(tasks) is False:
+                return False
+            note['tasks'] = tasks
+            apply_update(note, {'$inc': {'version': 1}})
+        _, written, _ = self._modify(note_id, edit)
+        return project(written, projection) if written is not None else None
+
+    def add_task(self, note_id, task, position, projection=None):
+        """Insert a task at `position` (None for the end) of a task note, see MongoNotes.add_task"""
+        def change(tasks):
+            if any(isinstance(stored, dict) and stored.get('id') == task['id'] for stored in tasks):
+                return False
+            tasks.insert(len(tasks) if position is None else position, task)
+        return self._write_task(note_id, change, projection)
+
+    def update_task(self, note_id, task_id, fields, projection=None):
+        """Set fields of the task `task_id`; like add_task otherwise"""
+        def change(tasks):
+            for task in tasks:
+                if task_matches(task, task_id):
+                    task.update(fields)
+                    return True
+            return False
+        return self._write_task(note_id, change, projection)
+
+    def remove_task(self, note_id, task_id, projection=None):
+        """Remove the task `task_id` from a task note; like add_task otherwise"""
+        def change(tasks):
+            kept = [task for task in tasks if not task_matches(task, task_id)]
+            if len(kept) == len(tasks):
+                return False
+            tasks[:] = kept
+        return self._write_task(note_id, change, projection)
+
+    def task_counts(self, cabinet_id=None, note_id=None):
+        """(note _id, total, done) for the task notes of a cabinet, or for one note"""
+        if note_id is not None:
+            where, params = "WHERE id = ? AND type = 'task'", (str(note_id),)
+        else:
+            where, params = "WHERE cabinet_id = ? AND type = 'task'", (cabinet_key(cabinet_id),)
+        return [
+            (note['_id'],) + tally_tasks(note.get('tasks'))
+            for note in self._documents(where, params, {'tasks': 1})
+        ]
+
+    def type_totals(self, cabinet_ids):
+        """(stored cabinet_id, type, notes, content bytes) for each cabinet and note type"""
+        keys = [cabinet_key(cabinet_id) for cabinet_id in cabinet_ids]
+        if not keys:
+            return []
+        return self.storage.fetch(
+            f'SELECT cabinet_id, type, COUNT(*), COALESCE(SUM(content_bytes), 0) FROM notes '
+            f'WHERE cabinet_id IN ({_marks(keys)}) GROUP BY cabinet_id, type', keys
+        )
+
+    def search(self, text, cabinet_id=None, limit=20, projection=None):
+        """Up to `limit` notes matching a full-text search, best first, each with a `score`"""
+        query = text_query(text)
+        if query is None:
+            return []
+        where, params = 'WHERE notes_search MATCH ?', [query]
+        if cabinet_id:
+            where += ' AND notes.cabinet_id = ?'
+            params.append(cabinet_key(cabinet_id))
+        rows = self.storage.fetch(
+            f'SELECT notes.doc, -{SEARCH_RANK} AS score FROM notes_search '
+            f'JOIN notes ON notes.pk = notes_search.rowid {where} ORDER BY score DESC LIMIT ?',
+            params + [limit]
+        )
+        return [dict(project(bson.decode(doc), projection), score=score) for doc, score in rows]
+
+
+class SQLiteCabinets(_Documents):
+    """The cabinets table; soft-deleted cabinets are skipped unless asked for"""
+
+    table = 'cabinets'
+    columns = ('name', 'created_at', 'deleted')
+
+    def columns_of(self, cabinet):
+        return cabinet.get('name'), _time(cabinet.get('created_at')), int('deleted_at' in cabinet)
+
+    @staticmethod
+    def _key(cabinet_id):
+        # Invalid ids fail the way they do on MongoDB
+        return str(ObjectId(cabinet_id))
+
+    @staticmethod
+    def _live(cabinet, include_deleted=False):
+        return include_deleted or 'deleted_at' not in cabinet
+
+    def list(self, projection=None):
+        """Every live cabinet, newest first"""
+        return self._documents('WHERE deleted = 0', (), projection, 'ORDER BY created_at DESC')
+
+    def get(self, cabinet_id, projection=None, include_deleted=False):
+        cabinet = self._document(self._key(cabinet_id))
+        return project(cabinet, projection) if cabinet is not None and self._live(cabinet, include_deleted) else None
+
+    def name_taken(self, name, exclude_id=None):
+        """Whether another cabinet, deleted or not, goes by `name`"""
+        exclude = self._key(exclude_id) if exclude_id is not None else ''
+        return self.storage.fetch_one('SELECT 1 FROM cabinets WHERE name = ? AND id != ?', (name, exclude)) is not None
+
+    def insert(self, cabinet):
+        """Store a new cabinet; sets and returns its _id"""
+        self._insert(cabinet)
+        return cabinet['_id']
+
+    def update(self, cabinet_id, update, include_deleted=True, expect=None):
+        """Apply an update document to a cabinet; True when it matched, see MongoCabinets.update"""
+        _, written, _ = self._update(
+            self._key(cabinet_id), update,
+            lambda cabinet: self._live(cabinet, include_deleted) and holds(cabinet, expect)
+        )
+        return written is not None
+
+    def delete(self, cabinet_id):
+        """Remove a soft-deleted cabinet for good"""
+        return self.storage.execute(
+            'DELETE FROM cabinets WHERE id = ? AND deleted = 1', (self._key(cabinet_id),)
+        ).rowcount == 1
+
+    def reserve_orders(self, cabinet_id, amount):
+        """Add `amount` to a live cabinet's `last_order` counter and return the new value, see MongoCabinets"""
+        _, written, _ = self._update(
+            self._key(cabinet_id), {'$inc': {'last_order': amount}},
+            lambda cabinet: self._live(cabinet) and 'last_order' in cabinet
+        )
+        return written['last_order'] if written is not None else None
+
+    def seed_last_order(self, cabinet_id, order):
+        """Start the `last_order` counter of a cabinet that has none"""
+        self._update(self._key(cabinet_id), {'$set': {'last_order': order}}, lambda cabinet: 'last_order' not in cabinet)
+
+    def raise_order_floor(self, cabinet_id, order):
+        """Move `last_order` up to `order` if it is lower, for cabinets that have the counter"""
+        self._update(self._key(cabinet_id), {'$max': {'last_order': order}}, lambda cabinet: 'last_order' in cabinet)
+
+
+class SQLiteCalendarEntries:
+    """The calendar_entries table, one row per note and day, with a full-text index kept by triggers"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def list(self, note_id, start=None, end=None):
+        """Entries of a note between two days (both inclusive), by date"""
+        where, params = 'WHERE note_id = ?', [str(note_id)]
+        if start:
+            where += ' AND date >= ?'
+            params.append(start)
+        if end:
+            where += ' AND date <= ?'
+            params.append(end)
+        return [
+            {'date': date, 'content': content}
+            for date, content in self.storage.fetch(
+                f'SELECT date, content FROM calendar_entries {where} ORDER BY date', params
+            )
+        ]
+
+    def for_notes(self, note_ids):
+        """Entries of several notes, by date"""
+        keys = [str(note_id) for note_id in note_ids]
+        if not keys:
+            return []
+        return [
+            {'note_id': _object_id(note_id), 'date': date, 'content': content}
+            for note_id, date, content in self.storage.fetch(
+                f'SELECT note_id, date, content FROM calendar_entries WHERE note_id IN ({_marks(keys)}) ORDER BY date',
+                keys
+            )
+        ]
+
+    def upsert(self, note_id, cabinet_id, entries):
+        """Create or overwrite a note's entries from a map of date -> content"""
+        now = _time(datetime.utcnow())
+        self.storage.executemany(
+            'INSERT INTO calendar_entries (note_id, date, cabinet_id, content, updated_at) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT (note_id, date) DO UPDATE SET '
+            'content = excluded.content, cabinet_id = excluded.cabinet_id, updated_at = excluded.updated_at',
+            [(str(note_id), date, cabinet_key(cabinet_id), content, now) for date, content in entries.items()]
+        )
+
+    def insert_many(self, entries):
+        self.storage.executemany(
+            'INSERT INTO calendar_entries (note_id, date, cabinet_id, content, updated_at) VALUES (?, ?, ?, ?, ?)',
+            [
+                (str(entry['note_id']), entry['date'], cabinet_key(entry.get('cabinet_id')),
+                 entry.get('content', ''), _time(entry.get('updated_at')))
+                for entry in entries
+            ]
+        )
+
+    def delete(self, note_id, date):
+        """Remove one day's entry; True when there was one"""
+        return self.storage.execute(
+            'DELETE FROM calendar_entries WHERE note_id = ? AND date = ?', (str(note_id), date)
+        ).rowcount == 1
+
+    def delete_other_dates(self, note_id, dates):
+        """Remove a note's entries for every day not in `dates`"""
+        dates = list(dates)
+        self.storage.execute(
+            f'DELETE FROM calendar_entries WHERE note_id = ? AND date NOT IN ({_marks(dates)})',
+            [str(note_id)] + dates
+        )
+
+    def delete_for_notes(self, note_ids):
+        keys = [str(note_id) for note_id in note_ids]
+        if keys:
+            self.storage.execute(f'DELETE FROM calendar_entries WHERE note_id IN ({_marks(keys)})', keys)
+
+    def delete_for_cabinet(self, cabinet_id):
+        self.storage.execute('DELETE FROM calendar_entries WHERE cabinet_id = ?', (cabinet_key(cabinet_id),))
+
+    def search(self, text, cabinet_id=None, limit=20):
+        """Up to `limit` entries matching a full-text search, best first, each with a `score`"""
+        query = text_query(text)
+        if query is None:
+            return []
+        where, params = 'WHERE calendar_search MATCH ?', [query]
+        if cabinet_id:
+            where += ' AND calendar_entries.cabinet_id = ?'
+            params.append(cabinet_key(cabinet_id))
+        return [
+            {'note_id': _object_id(note_id), 'date': date, 'content': content, 'score': score}
+            for note_id, date, content, score in self.storage.fetch(
+                'SELECT calendar_entries.note_id, calendar_entries.date, calendar_entries.content, '
+                '-bm25(calendar_search) AS score FROM calendar_search '
+                f'JOIN calendar_entries ON calendar_entries.pk = calendar_search.rowid {where} '
+                'ORDER BY score DESC LIMIT ?',
+                params + [limit]
+            )
+        ]
+
+
+class SQLiteRevisions(_Documents):
+    """The note_revisions table, numbered by `seq` within each note"""
+
+    table = 'note_revisions'
+    columns = ('note_id', 'seq', 'kind', 'started_at', 'compacted')
+
+    def columns_of(self, revision):
+        return (
+            str(revision['note_id']), revision['seq'], revision.get('kind'),
+            _time(revision.get('started_at')), int(revision.get('compacted') is True),
+        )
+
+    def latest(self, note_id, kind=None, max_seq=None, started_before=None):
+        """_id and seq of a note's newest revision of `kind`, see MongoRevisions.latest"""
+        where, params = 'WHERE note_id = ?', [str(note_id)]
+        if kind is not None:
+            where += ' AND kind = ?'
+            params.append(kind)
+        if max_seq is not None:
+            where += ' AND seq <= ?'
+            params.append(max_seq)
+        if started_before is not None:
+            where += ' AND started_at < ?'
+            params.append(_time(started_before))
+        found = self._documents(where, params, {'seq': 1}, 'ORDER BY seq DESC LIMIT 1')
+        return found[0] if found else None
+
+    def chain(self, note_id, first_seq=None, last_seq=None):
+        """A note's revisions from `first_seq` to `last_seq` (both inclusive), by seq"""
+        where, params = 'WHERE note_id = ?', [str(note_id)]
+        if first_seq is not None:
+            where += ' AND seq >= ?'
+            params.append(first_seq)
+        if last_seq is not None:
+            where += ' AND seq <= ?'
+            params.append(last_seq)
+        return self._documents(where, params, None, 'ORDER BY seq')
+
+    def list(self, note_id, before=None, limit=50):
+        """A note's revisions without their data, newest first, before seq `before`"""
+        where, params = 'WHERE note_id = ?', [str(note_id)]
+        if before is not None:
+            where += ' AND seq < ?'
+            params.append(before)
+        return self._documents(where, params + [limit], {'data': 0}, 'ORDER BY seq DESC LIMIT ?')
+
+    def insert(self, revision):
+        """Store a new revision; False when the note already has one with its seq"""
+        try:
+            self._insert(revision)
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def update(self, revision_id, fields, updated_at):
+        """Set fields of a revision unless it was written again since `updated_at`"""
+        _, written, _ = self._update(
+            revision_id, {'$set': fields}, lambda revision: revision.get('updated_at') == updated_at
+        )
+        return written is not None
+
+    def rewrite(self, updates, dropped_ids):
+        """Set fields of several revisions and delete others in one transaction"""
+        keys = [str(revision_id) for revision_id in dropped_ids]
+        with self.storage.transaction():
+            for revision_id, fields in updates:
+                self._update(revision_id, {'$set': fields})
+            if keys:
+                self.storage.execute(f'DELETE FROM note_revisions WHERE id IN ({_marks(keys)})', keys)
+
+    def notes_to_compact(self, cutoff):
+        """Ids of the notes with revisions started before `cutoff` that were never compacted"""
+        return [
+            _object_id(row[0]) for row in self.storage.fetch(
+                'SELECT DISTINCT note_id FROM note_revisions WHERE started_at < ? AND compacted = 0',
+                (_time(cutoff),)
+            )
+        ]
+
+    def delete_for_notes(self, note_ids):
+        keys = [str(note_id) for note_id in note_ids]
+        if keys:
+            self.storage.execute(f'DELETE FROM note_revisions WHERE note_id IN ({_marks(keys)})', keys)
+
+
+class SQLiteJobs(_Documents):
+    """The jobs table; finished jobs past expires_at are removed whenever a job is added"""
+
+    table = 'jobs'
+    columns = ('type', 'status', 'active_key', 'created_at', 'updated_at', 'expires_at')
+
+    # Claimable jobs: queued, or running without a heartbeat since the given time
+    CLAIMABLE = f"(status = '{QUEUED}' OR (status = '{RUNNING}' AND updated_at < ?))"
+
+    def columns_of(self, job):
+        return (
+            job.get('type'), job.get('status'), job.get('active_key'),
+            _time(job.get('created_at')), _time(job.get('updated_at')), _time(job.get('expires_at')),
+        )
+
+    def insert(self, job):
+        """Store a new job; False when another queued or running job holds its `active_key`"""
+        assigned = '_id' not in job
+        with self.storage.transaction():
+            self.storage.execute('DELETE FROM jobs WHERE expires_at < ?', (_time(datetime.utcnow()),))
+            try:
+                self._insert(job)
+            except sqlite3.IntegrityError:
+                if assigned:
+                    job.pop('_id', None)
+                return False
+        return True
+
+    def find_active(self, key):
+        """_id of the queued or running job holding `key`, or None"""
+        row = self.storage.fetch_one('SELECT id FROM jobs WHERE active_key = ?', (key,))
+        return _object_id(row[0]) if row else None
+
+    def get(self, job_id):
+        return self._document(job_id)
+
+    def list(self, job_type=None, status=None, limit=20):
+        """Newest jobs first, optionally of one type and status"""
+        conditions, params = [], []
+        if job_type:
+            conditions.append('type = ?')
+            params.append(job_type)
+        if status:
+            conditions.append('status = ?')
+            params.append(status)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        return self._documents(where, params + [limit], None, 'ORDER BY created_at DESC LIMIT ?')
+
+    def claimable(self, stale_before):
+        """_ids of the jobs that are queued, or running without a heartbeat since `stale_before`"""
+        return [
+            _object_id(row[0])
+            for row in self.storage.fetch(f'SELECT id FROM jobs WHERE {self.CLAIMABLE}', (_time(stale_before),))
+        ]
+
+    def claim(self, job_id, stale_before, update):
+        """Apply `update` to a job if it is still claimable; returns the job as written, or None"""
+        stale = _time(stale_before)
+
+        def claimable(job):
+            return job.get('status') == QUEUED or (
+                job.get('status') == RUNNING and (_time(job.get('updated_at')) or '') < stale
+            )
+        return self._update(job_id, update, claimable)[1]
+
+    def update(self, job_id, update, status=None):
+        """Apply `update` to a job, only while it has `status` if given; True when it matched"""
+        _, written, _ = self._update(job_id, update, lambda job: status is None or job.get('status') == status)
+        return written is not None
+
+    def update_and_get(self, job_id, update, projection=None):
+        """Like update, returning the job as it was before, or None"""
+        before, _, _ = self._update(job_id, update)
+        return project(before, projection) if before is not None else None
+
+
+class SQLiteStorage:
+    """Storage in a SQLite database file, or in a private in-memory database when `path` is None.
+
+    Every store shares one connection. Writes that read a document before
+    changing it run in BEGIN IMMEDIATE transactions, so they are atomic
+    against other threads and against other processes using the same
+    file; file databases use WAL so readers never wait for a writer.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path=None):
+        self.path = path
+        self.connection = sqlite3.connect(path or ':memory:', isolation_level=None, check_same_thread=False)
+        if path:
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        self._lock = threading.RLock()
+        self._depth = 0
+        self.notes = SQLiteNotes(self)
+        self.cabinets = SQLiteCabinets(self)
+        self.calendar_entries = SQLiteCalendarEntries(self)
+        self.revisions = SQLiteRevisions(self)
+        self.jobs = SQLiteJobs(self)
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self.connection.execute(sql, params)
+
+    def executemany(self, sql, rows):
+        with self.transaction():
+            self.connection.executemany(sql, rows)
+
+    def fetch(self, sql, params=()):
+        with self._lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def fetch_one(self, sql, params=()):
+        with self._lock:
+            return self.connection.execute(sql, params).fetchone()
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database for a group of statements; nested uses join the outer transaction"""
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield
+                finally:
+                    self._depth -= 1
+                return
+            self.connection.execute('BEGIN IMMEDIATE')
+            self._depth = 1
+            try:
+                yield
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            else:
+                self.connection.execute('COMMIT')
+            finally:
+                self._depth = 0
+
+    def _applied(self):
+        self.execute(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT, duration_ms REAL)'
+        )
+        return self.fetch('SELECT version, description, applied_at, duration_ms FROM schema_migrations ORDER BY version')
+
+    def migrate(self):
+        """Create or upgrade the schema; returns the versions applied"""
+        applied = []
+        with self.transaction():
+            done = {row[0] for row in self._applied()}
+            for version in sorted(SCHEMA_MIGRATIONS):
+                if version in done:
+                    continue
+                description, statements = SCHEMA_MIGRATIONS[version]
+                started = time.monotonic()
+                for statement in statements:
+                    self.execute(statement)
+                self.execute(
+                    'INSERT INTO schema_migrations VALUES (?, ?, ?, ?)',
+                    (version, description, _time(datetime.utcnow()),
+                     round((time.monotonic() - started) * 1000, 1))
+                )
+                applied.append(version)
+        return applied
+
+    def migration_status(self):
+        """(applied migration records, pending migrations) for /api/system/migrations"""
+        applied = [
+            {
+                'version': version, 'description': description,
+                'applied_at': datetime.strptime(applied_at, TIME_FORMAT), 'duration_ms': duration_ms,
+            }
+            for version, description, applied_at, duration_ms in self._applied()
+        ]
+        done = {record['version'] for record in applied}
+        pending = [
+            {'version': version, 'description': SCHEMA_MIGRATIONS[version][0]}
+            for version in sorted(SCHEMA_MIGRATIONS) if version not in done
+        ]
+        return applied, pending
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
@@ -0,0 +1,32 @@
+# backend/app/utils/storage.py
+from pymongo import MongoClient
+
+# 'mongo' talks to MONGO_URI; 'sqlite' keeps everything in the SQLite file
+# at STORAGE_PATH and 'memory' in a private in-memory SQLite database
+STORAGE_BACKENDS = ('mongo', 'sqlite', 'memory')
+
+
+class UpdateError(ValueError):
+    """Raised when an update cannot be applied to the stored document, e.g. a path through a scalar"""
+
+
+def database_name(config):
+    return config['MONGO_URI'].split('/')[-1]
+
+
+def open_storage(config, event_listeners=None):
+    """Storage for the configured STORAGE_BACKEND.
+
+    Both kinds expose the same stores - `notes`, `cabinets`,
+    `calendar_entries`, `revisions` and `jobs` - whose methods are the
+    queries the app makes; see MongoStorage for what each one does.
+    """
+    backend = config['STORAGE_BACKEND']
+    if backend == 'mongo':
+        from .mongo_storage import MongoStorage
+        client = MongoClient(config['MONGO_URI'], event_listeners=event_listeners or [])
+        return MongoStorage(client, database_name(config))
+    if backend in ('sqlite', 'memory'):
+        from .sqlite_storage import SQLiteStorage
+        return SQLiteStorage(config['STORAGE_PATH'] if backend == 'sqlite' else None)
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}; expected one of {', '.join(STORAGE_BACKENDS)}")
@@ -0,0 +1,40 @@
+# backend/app/utils/streaming.py
+import logging
+from flask import Response
+from .json_provider import dumps_bytes
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream(request):
+    """True when the client asked for NDJSON via `?stream=1` or the Accept header"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_documents(cursor, batch_size):
+    """Yield one NDJSON chunk per cursor batch so only a batch is held in memory"""
+    lines = []
+    try:
+        for doc in cursor:
+            lines.append(dumps_bytes(doc))
+            if len(lines) >= batch_size:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
+    except Exception as e:
+        # Headers are already sent, so the best we can do is end the stream early
+        logger.error("Error while streaming documents: %s", e)
+    finally:
+        cursor.close()
+
+
+def ndjson_response(cursor, batch_size):
+    """Wrap a pymongo cursor in a chunked NDJSON response"""
+    response = Response(stream_documents(cursor, batch_size), mimetype=NDJSON_MIMETYPE)
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
@@ -0,0 +1,193 @@
+# backend/app/utils/tasks.py
+from bson.objectid import ObjectId
+from .search_text import search_fields_for
+from .versioning import bump_cabinet_version
+
+# Fields of a task a client may set; `id` is fixed once the task exists
+TASK_FIELDS = ('text', 'completed')
+
+
+class TaskError(ValueError):
+    """Raised when a task request is malformed or cannot be applied; `status` is the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def task_id_filter(task_id):
+    """Condition on `id` matching a task id from a URL.
+
+    The frontend numbers tasks with Date.now(), so a numeric path segment
+    matches the integer id as well as the string.
+    """
+    if task_id.isdigit():
+        return {'$in': [int(task_id), task_id]}
+    return task_id
+
+
+def task_fields(data, partial=False):
+    """Validated text/completed from a request body; all of them unless `partial`.
+
+    A `partial` body is an edit of an existing task, so it may hold nothing
+    but TASK_FIELDS.
+    """
+    if not isinstance(data, dict):
+        raise TaskError('No data provided')
+    if partial:
+        unknown = sorted(str(name) for name in data if name not in TASK_FIELDS)
+        if unknown:
+            raise TaskError(f"Unknown task fields: {', '.join(unknown)}")
+    fields = {}
+    if 'text' in data or not partial:
+        text = data.get('text', '')
+        if not isinstance(text, str):
+            raise TaskError('text must be a string')
+        fields['text'] = text
+    if 'completed' in data or not partial:
+        completed = data.get('completed', False)
+        if not isinstance(completed, bool):
+            raise TaskError('completed must be a boolean')
+        fields['completed'] = completed
+    if partial and not fields:
+        raise TaskError('Nothing to update; send text and/or completed')
+    return fields
+
+
+def new_task(data):
+    """A task to add from a request body, keeping a client-chosen id"""
+    task = task_fields(data)
+    task_id = data.get('id')
+    if task_id is None:
+        task_id = str(ObjectId())
+    elif isinstance(task_id, bool) or not isinstance(task_id, (int, str)) or task_id == '':
+        raise TaskError('id must be a number or a non-empty string')
+    return dict(id=task_id, **task)
+
+
+def task_position(data):
+    """Optional `position` of a request body: an index, or None to append"""
+    position = data.get('position')
+    if position is None:
+        return None
+    if not isinstance(position, int) or isinstance(position, bool) or position < 0:
+        raise TaskError('position must be a non-negative integer')
+    return position
+
+
+def moved_tasks(tasks, task_id, position):
+    """(`tasks` with the task `task_id` moved to `position`, that task), or None if absent"""
+    for index, task in enumerate(tasks):
+        if isinstance(task, dict) and not isinstance(task.get('id'), bool) and str(task.get('id')) == task_id:
+            remaining = tasks[:index] + tasks[index + 1:]
+            remaining.insert(min(position, len(remaining)), task)
+            return remaining, task
+    return None
+
+
+def check_task_note(store, note_object_id):
+    """Raise TaskError when the note is missing (404) or not a task note (400)"""
+    note = store.notes.get(note_object_id, {'type': 1})
+    if not note:
+        raise TaskError('Note not found', 404)
+    if note.get('type') != 'task':
+        raise TaskError('Not a task note')
+
+
+def write_task(store, note_object_id, write, refresh_search, missing):
+    """Apply one task write and bump the cabinet; the note's version and cabinet.
+
+    `write(projection)` makes the write and returns the note as written, or
+    None when it matched nothing; then the note's own TaskError is raised,
+    or `missing` when the note is a task note. Only text changes re-extract
+    the search text, which needs the updated array read back; a toggle
+    reads back just the version.
+    """
+    projection = {'version': 1, 'cabinet_id': 1}
+    if refresh_search:
+        projection['tasks'] = 1
+    note = write(projection)
+    if note is None:
+        check_task_note(store, note_object_id)
+        raise missing
+    if refresh_search:
+        store.notes.update(
+            note_object_id, {'$set': search_fields_for({'tasks': note.get('tasks')})},
+            expect={'version': note['version']}
+        )
+    bump_cabinet_version(store, note.get('cabinet_id'))
+    return note
+
+
+def move_task(store, note_object_id, task_id, position, attempts):
+    """Write a note's tasks back with the task `task_id` moved to `position`.
+
+    A remove and an insert of the same task are two writes that could lose
+    the task in between; instead the reordered array is written back only
+    if the note is unchanged, reading it again up to `attempts` times.
+    Returns (the note as read, the reordered tasks, the moved task), with
+    None for both when every attempt lost to another write. Raises
+    TaskError when the note or the task does not exist.
+    """
+    for _ in range(attempts):
+        note = store.notes.get(note_object_id, {'type': 1, 'tasks': 1, 'version': 1, 'cabinet_id': 1})
+        if note is None or note.get('type') != 'task':
+            # Raises, unless the note changed between the two reads
+            check_task_note(store, note_object_id)
+            continue
+        moved = moved_tasks(note.get('tasks') or [], task_id, position)
+        if moved is None:
+            raise TaskError('Task not found', 404)
+        tasks, task = moved
+        if store.notes.update(
+            note_object_id, {'$set': {'tasks': tasks}, '$inc': {'version': 1}}, version=note.get('version', 0)
+        ):
+            bump_cabinet_version(store, note.get('cabinet_id'))
+            return note, tasks, task
+    return note, None, None
+
+
+def task_counts_pipeline(query):
+    """Per-note total and completed task counts for the task notes matching `query`.
+
+    The arrays are sized on the server, so only the two numbers per note
+    come back over the wire.
+    """
+    tasks = {'$ifNull': ['$tasks', []]}
+    return [
+        {'$match': dict(query, type='task')},
+        {'$project': {
+            'total': {'$size': tasks},
+            'done': {'$size': {'$filter': {
+                'input': tasks, 'as': 'task', 'cond': {'$eq': ['$$task.completed', True]}
+            }}},
+        }},
+    ]
+
+
+def task_matches(task, task_id):
+    """Whether a stored task is the one task_id_filter(task_id) matches"""
+    if not isinstance(task, dict):
+        return False
+    stored = task.get('id')
+    if isinstance(stored, bool):
+        return False
+    return stored == task_id or (task_id.isdigit() and stored == int(task_id))
+
+
+def tally_tasks(tasks):
+    """(total, done) for a note's tasks, as task_counts_pipeline counts them"""
+    tasks = tasks or []
+    return len(tasks), sum(1 for task in tasks if isinstance(task, dict) and task.get('completed') is True)
+
+
+def task_counts(store, cabinet_id=None, note_id=None):
+    """Open/done counts of each task note of a cabinet (or just `note_id`), plus their sum"""
+    notes = []
+    totals = {'total': 0, 'done': 0, 'open': 0}
+    for row_id, total, done in store.notes.task_counts(cabinet_id, note_id):
+        counts = {'total': total, 'done': done, 'open': total - done}
+        for key, value in counts.items():
+            totals[key] += value
+        notes.append(dict(counts, _id=row_id))
+    return notes, totals
@@ -0,0 +1,79 @@
+# backend/app/utils/versioning.py
+import hashlib
+from datetime import datetime
+from bson.objectid import ObjectId
+from flask import make_response
+from .list_cache import get_list_cache
+
+# Deleted cabinets keep their document, marked with deleted_at, until their
+# notes have been purged in the background
+LIVE_CABINET = {'deleted_at': {'$exists': False}}
+
+
+def version_update(stats=None):
+    """Cabinet update for bump_cabinet_version.
+
+    Besides the version it moves the cabinet's last activity time forward
+    and applies `stats`, the `$inc` amounts for its note counters (see
+    app.utils.cabinet_stats.stats_change), in the same write.
+    """
+    update = {'$inc': {'version': 1}, '$max': {'stats.last_activity': datetime.utcnow()}}
+    if stats:
+        update['$inc'].update((path, amount) for path, amount in stats.items() if amount)
+    return update
+
+
+def bump_cabinet_version(store, cabinet_id, stats=None):
+    """Record that a cabinet or one of its notes changed.
+
+    Must run after the mutation itself so a reader that saw the old version
+    can never have cached data newer than the version it was tagged with.
+    """
+    if not cabinet_id or not ObjectId.is_valid(cabinet_id):
+        return
+    store.cabinets.update(cabinet_id, version_update(stats))
+    get_list_cache().invalidate(cabinet_id)
+
+
+def cabinet_version(store, cabinet_id):
+    """Current version of a cabinet, or None when it does not exist"""
+    if not cabinet_id or not ObjectId.is_valid(cabinet_id):
+        return None
+    cabinet = store.cabinets.get(cabinet_id, {'version': 1})
+    if not cabinet:
+        return None
+    return cabinet.get('version', 0)
+
+
+def request_variant(request):
+    """Digest of everything besides cabinet state that shapes a read response.
+
+    The path, query string and negotiated representation are folded in so
+    pages, projections and streamed responses are tagged and cached separately.
+    """
+    variant = hashlib.blake2b(digest_size=8)
+    variant.update(request.path.encode('utf-8'))
+    variant.update(b'?' + request.query_string)
+    variant.update(b'|' + str(request.accept_mimetypes.best).encode('utf-8'))
+    return variant.hexdigest()
+
+
+def cabinet_etag(cabinet_id, version, request):
+    """Strong ETag for a read of cabinet state at `version`"""
+    return f'{cabinet_id}-{version}-{request_variant(request)}'
+
+
+def not_modified(request, etag):
+    """304 response when the client already holds `etag`, otherwise None"""
+    # Weak comparison, so a compressed response's W/ tag still revalidates
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+        return tag_response(response, etag)
+    return None
+
+
+def tag_response(response, etag):
+    response.set_etag(etag)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
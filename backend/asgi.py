@@ -0,0 +1,8 @@
+# backend/asgi.py
+import os
+from app.aio import create_async_app
+from config import Config, TestConfig
+
+# Serve with an ASGI server, e.g. `hypercorn asgi:app --bind 0.0.0.0:5001`
+config_class = TestConfig if os.getenv('TEST_MODE') == 'true' else Config
+app = create_async_app(config_class)
@@ -7,6 +7,12 @@ class Config:
     """Base configuration class"""
     # MongoDB settings
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/notes_manager')
+
+    # Storage backend: 'mongo' uses MONGO_URI; 'sqlite' keeps the data in the
+    # SQLite file at STORAGE_PATH and 'memory' in a private in-memory SQLite
+    # database that is gone when the process exits.
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'mongo')
+    STORAGE_PATH = os.getenv('STORAGE_PATH', 'notes_manager.db')
     
     # Flask settings
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
@@ -17,6 +23,124 @@ class Config:
     CORS_ALLOW_HEADERS = ['Content-Type', 'Authorization']
     CORS_SUPPORTS_CREDENTIALS = True
     CORS_MAX_AGE = 3600
+
+    # Note listing settings
+    NOTES_PAGE_MAX_LIMIT = int(os.getenv('NOTES_PAGE_MAX_LIMIT', '500'))
+    NOTES_STREAM_BATCH_SIZE = int(os.getenv('NOTES_STREAM_BATCH_SIZE', '200'))
+
+    # Notes prepared and written per insert_many by cabinet imports
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+
+    # Most operations accepted by POST /api/notes/batch
+    NOTES_BATCH_MAX_OPS = int(os.getenv('NOTES_BATCH_MAX_OPS', '200'))
+
+    # Background job settings; a running job that has not reported progress
+    # for JOBS_STALE_SECONDS is assumed dead and may be claimed again
+    JOBS_MAX_WORKERS = int(os.getenv('JOBS_MAX_WORKERS', '2'))
+    JOBS_STALE_SECONDS = int(os.getenv('JOBS_STALE_SECONDS', '300'))
+    JOBS_RETENTION_SECONDS = int(os.getenv('JOBS_RETENTION_SECONDS', str(7 * 24 * 3600)))
+    JOBS_PURGE_BATCH_SIZE = int(os.getenv('JOBS_PURGE_BATCH_SIZE', '1000'))
+
+    # How often the cabinet note counters are recounted and repaired if they
+    # drifted; 0 turns the schedule off (POST /api/cabinets/stats/reconcile
+    # still works)
+    STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv('STATS_RECONCILE_INTERVAL_SECONDS', '3600'))
+
+    # Note content of at least NOTE_COMPRESSION_MIN_BYTES (UTF-8) is stored
+    # zlib-compressed at NOTE_COMPRESSION_LEVEL and decompressed only when
+    # it is serialized into a response. Off by default: older releases cannot
+    # read compressed notes, so turn it on once every process is upgraded.
+    # Existing notes are rewritten by POST /api/system/migrations/compress-content.
+    NOTE_COMPRESSION_ENABLED = os.getenv('NOTE_COMPRESSION_ENABLED', 'false').lower() == 'true'
+    NOTE_COMPRESSION_MIN_BYTES = int(os.getenv('NOTE_COMPRESSION_MIN_BYTES', '4096'))
+    NOTE_COMPRESSION_LEVEL = int(os.getenv('NOTE_COMPRESSION_LEVEL', '6'))
+
+    # Notes and calendar entries store their cabinet_id as: 'string' or
+    # 'objectid' (12 bytes instead of a 24-character string, in documents and
+    # indexes). Reads accept both, so switch to 'objectid' once every process
+    # runs this release, then backfill existing documents with
+    # POST /api/system/migrations/cabinet-ids, which rewrites
+    # CABINET_ID_MIGRATION_BATCH_SIZE documents at a time and pauses
+    # CABINET_ID_MIGRATION_PAUSE_SECONDS between batches.
+    CABINET_ID_FORMAT = os.getenv('CABINET_ID_FORMAT', 'string')
+    CABINET_ID_MIGRATION_BATCH_SIZE = int(os.getenv('CABINET_ID_MIGRATION_BATCH_SIZE', '500'))
+    CABINET_ID_MIGRATION_PAUSE_SECONDS = float(os.getenv('CABINET_ID_MIGRATION_PAUSE_SECONDS', '0.1'))
+
+    # Note revision history; saves within REVISIONS_COALESCE_SECONDS of the
+    # start of a revision fold into it, and every REVISIONS_SNAPSHOT_EVERY-th
+    # revision is stored whole. Revisions older than
+    # REVISIONS_COMPACT_AFTER_SECONDS are thinned to one per bucket.
+    REVISIONS_ENABLED = os.getenv('REVISIONS_ENABLED', 'true').lower() == 'true'
+    REVISIONS_SNAPSHOT_EVERY = int(os.getenv('REVISIONS_SNAPSHOT_EVERY', '20'))
+    REVISIONS_COALESCE_SECONDS = int(os.getenv('REVISIONS_COALESCE_SECONDS', '60'))
+    REVISIONS_COMPACT_AFTER_SECONDS = int(os.getenv('REVISIONS_COMPACT_AFTER_SECONDS', str(7 * 24 * 3600)))
+    REVISIONS_COMPACT_BUCKET_SECONDS = int(os.getenv('REVISIONS_COMPACT_BUCKET_SECONDS', '3600'))
+    REVISIONS_COMPACT_INTERVAL_SECONDS = int(os.getenv('REVISIONS_COMPACT_INTERVAL_SECONDS', '3600'))
+
+    # Change feed served at /api/changes. 'auto' reads MongoDB change streams
+    # when the deployment supports them and otherwise keeps the last
+    # CHANGE_FEED_BUFFER events of this process in memory for resuming.
+    # Streams are closed after CHANGE_FEED_MAX_SECONDS; clients reconnect
+    # and resume where they left off.
+    CHANGE_FEED_SOURCE = os.getenv('CHANGE_FEED_SOURCE', 'auto')
+    CHANGE_FEED_BUFFER = int(os.getenv('CHANGE_FEED_BUFFER', '10000'))
+    CHANGE_FEED_HEARTBEAT_SECONDS = int(os.getenv('CHANGE_FEED_HEARTBEAT_SECONDS', '15'))
+    CHANGE_FEED_MAX_SECONDS = int(os.getenv('CHANGE_FEED_MAX_SECONDS', '300'))
+
+    # Sanitized HTML cache settings
+    SANITIZE_CACHE_MAX_ENTRIES = int(os.getenv('SANITIZE_CACHE_MAX_ENTRIES', '1024'))
+    SANITIZE_CACHE_MAX_BYTES = int(os.getenv('SANITIZE_CACHE_MAX_BYTES', str(16 * 1024 * 1024)))
+
+    # Cabinet listing cache settings. A cached body is only served after the
+    # cabinet's current version has been read and matches it, so entries are
+    # never stale across workers; the 'shm' backend also shares invalidations
+    # between worker processes on the same host to free memory sooner
+    LIST_CACHE_ENABLED = os.getenv('LIST_CACHE_ENABLED', 'true').lower() == 'true'
+    LIST_CACHE_BACKEND = os.getenv('LIST_CACHE_BACKEND', 'local')
+    LIST_CACHE_MAX_ENTRIES = int(os.getenv('LIST_CACHE_MAX_ENTRIES', '256'))
+    LIST_CACHE_MAX_BYTES = int(os.getenv('LIST_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    LIST_CACHE_TTL = int(os.getenv('LIST_CACHE_TTL', '300'))
+    LIST_CACHE_SHM_NAME = os.getenv('LIST_CACHE_SHM_NAME', 'notes_manager_list_cache')
+    LIST_CACHE_SHM_SLOTS = int(os.getenv('LIST_CACHE_SHM_SLOTS', '4096'))
+
+    # Identical cabinet listing reads that arrive while one is already
+    # running wait for it and share its result instead of querying again;
+    # a waiter gives up and queries itself after COALESCE_WAIT_SECONDS
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() == 'true'
+    COALESCE_WAIT_SECONDS = float(os.getenv('COALESCE_WAIT_SECONDS', '30'))
+
+    # Admission control, off by default: requests beyond
+    # ADMISSION_MAX_CONCURRENT in this process get 503, and a client beyond
+    # ADMISSION_MAX_PER_CLIENT of its own gets 429, both with Retry-After;
+    # 0 turns a limit off. Clients are told apart by peer address, or by the
+    # first address in ADMISSION_CLIENT_HEADER (e.g. X-Forwarded-For). Behind
+    # a proxy every request has the proxy's address, so set the header before
+    # turning on the per-client limit or all clients share one allowance.
+    # Long-lived streams under ADMISSION_EXEMPT_PATHS are not counted.
+    ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '0'))
+    ADMISSION_MAX_PER_CLIENT = int(os.getenv('ADMISSION_MAX_PER_CLIENT', '0'))
+    ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', '1'))
+    ADMISSION_CLIENT_HEADER = os.getenv('ADMISSION_CLIENT_HEADER', '')
+    ADMISSION_EXEMPT_PATHS = [
+        path for path in os.getenv('ADMISSION_EXEMPT_PATHS', '/metrics,/api/changes').split(',') if path
+    ]
+
+    # Search settings
+    SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '100'))
+
+    # Logging and instrumentation; LOG_FORMAT is 'json' or 'text', and only
+    # this share of successful requests gets an access log line
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_REQUEST_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', '0.01'))
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Response compression (gzip, plus brotli when the brotli package is
+    # installed); bodies under COMPRESSION_MIN_BYTES are sent uncompressed
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
     
     DEBUG = True
 
@@ -4,6 +4,7 @@ import Note from './Note';
 import CabinetHeader from './cabinets/CabinetHeader';
 import FloatingToolbar from './ui/FloatingToolbar';
 import { EditorProvider } from './EditorContext';
+import { applyNoteEvent, needsRefetch, openChangeFeed } from '@/lib/changeFeed';
 import '../styles/App.css';
 import '../styles/Note.css';
 
@@ -30,9 +31,35 @@ function App() {
     loadCabinets();
   }, []);
 
-  const loadCabinets = async () => {
+  // Follow the open cabinet, so changes made elsewhere show up here
+  useEffect(() => {
+    const cabinetId = currentCabinet?._id;
+    if (!cabinetId) return undefined;
+
+    return openChangeFeed(cabinetId, {
+      onNoteEvent: (type, data) => {
+        if (needsRefetch(type, data)) {
+          loadNotes(cabinetId);
+        } else {
+          setNotes(prevNotes => applyNoteEvent(prevNotes, type, data));
+        }
+      },
+      onCabinetEvent: (type, data) => {
+        if (type === 'cabinet_updated') {
+          setCabinets(prev => prev.map(c => (c._id === cabinetId ? { ...c, ...data.fields } : c)));
+          setCurrentCabinet(prev => (prev?._id === cabinetId ? { ...prev, ...data.fields } : prev));
+        } else if (type === 'cabinet_deleted') {
+          // Deleted elsewhere; pick another cabinet as after a local delete
+          loadCabinets(true);
+        }
+      },
+      onReset: () => loadNotes(cabinetId),
+    });
+  }, [currentCabinet?._id]);
+
+  const loadCabinets = async (selectCabinet = isInitialLoad) => {
     try {
-      const response = await fetch('http://localhost:5001/api/cabinets', {
+      const response = await fetch('http://localhost:5001/api/cabinets?with_stats=1', {
         method: 'GET',
         headers: {
           'Accept': 'application/json',
@@ -48,7 +75,7 @@ function App() {
       const data = await response.json();
       setCabinets(data);
 
-      if (isInitialLoad) {
+      if (selectCabinet) {
         const lastCabinetId = localStorage.getItem('lastCabinetId');
         const lastUsedCabinet = data.find(c => c._id === lastCabinetId);
         const defaultCabinet = data.find(c => c.name === 'Default Cabinet');
@@ -62,6 +89,9 @@ function App() {
         } else if (data.length > 0) {
           setCurrentCabinet(data[0]);
           await loadNotes(data[0]._id);
+        } else {
+          setCurrentCabinet(null);
+          setNotes([]);
         }
         setIsInitialLoad(false);
       }
@@ -206,7 +236,10 @@ function App() {
       }
       
       const newNote = await response.json();
-      setNotes([...notes, newNote]);
+      // The change feed may have brought the note in already
+      setNotes(prevNotes => (
+        prevNotes.some(note => note._id === newNote._id) ? prevNotes : [...prevNotes, newNote]
+      ));
     } catch (error) {
       console.error('Error creating note:', error);
     }
@@ -245,40 +278,37 @@ function App() {
     const [movedNote] = reorderedNotes.splice(sourceIndex, 1);
     reorderedNotes.splice(destinationIndex, 0, movedNote);
 
-    const notesWithNewOrder = reorderedNotes.map((note, index) => ({
-        ...note,
-        order: index * 1000
-    }));
-
-    const orderUpdates = notesWithNewOrder.map(note => ({
-        _id: note._id,
-        order: note.order
-    }));
+    // Only the moved note changes; the server places it between its new neighbours
+    const beforeNote = reorderedNotes[destinationIndex - 1];
+    const afterNote = reorderedNotes[destinationIndex + 1];
 
-    setNotes(notesWithNewOrder);
+    setNotes(reorderedNotes);
 
     try {
-        const response = await fetch('http://localhost:5001/api/notes/batch-update-order', {
+        const response = await fetch(`http://localhost:5001/api/notes/${movedNote._id}/move`, {
             method: 'POST',
             headers: {
                 'Accept': 'application/json',
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify(orderUpdates)
+            body: JSON.stringify({
+                before_id: beforeNote ? beforeNote._id : null,
+                after_id: afterNote ? afterNote._id : null
+            })
         });
 
         if (!response.ok) {
             throw new Error(`Failed to update note order: ${response.status}`);
         }
 
-        const updatedNotesResponse = await response.json();
-        
-        const ordersMatch = notesWithNewOrder.every((note, index) => 
-            note.order === updatedNotesResponse[index].order
-        );
-        
-        if (!ordersMatch) {
-            setNotes(updatedNotesResponse);
+        const moveResult = await response.json();
+
+        if (moveResult.rebalanced) {
+            await loadNotes(currentCabinet._id);
+        } else {
+            setNotes(prevNotes => prevNotes.map(note =>
+                note._id === moveResult._id ? { ...note, order: moveResult.order } : note
+            ));
         }
     } catch (error) {
         console.error('Error updating note order:', error);
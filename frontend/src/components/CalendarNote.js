@@ -1,9 +1,27 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { ChevronLeft, ChevronRight } from 'lucide-react';
 import CalendarMonthView from './CalendarMonthView';
 import CalendarWeekView from './CalendarWeekView';
 import '../styles/CalendarNote.css';
 
+const toDateKey = (date) => date.toISOString().split('T')[0];
+
+// Days a view can show: the whole month grid or the surrounding weeks
+const viewRange = (view) => {
+  const start = new Date(view.selectedDate);
+  const end = new Date(view.selectedDate);
+  if (view.viewType === 'month') {
+    start.setDate(1);
+    start.setDate(start.getDate() - 7);
+    end.setMonth(end.getMonth() + 1, 0);
+    end.setDate(end.getDate() + 7);
+  } else {
+    start.setDate(start.getDate() - 7);
+    end.setDate(end.getDate() + 7);
+  }
+  return [toDateKey(start), toDateKey(end)];
+};
+
 const CalendarNote = ({ note, onUpdate }) => {
   // Convert string dates to Date objects when initializing from note data
   const [views, setViews] = useState(() => {
@@ -20,27 +38,64 @@ const CalendarNote = ({ note, onUpdate }) => {
     }];
   });
   const [calendarData, setCalendarData] = useState(note.calendarData || []);
+  const saveTimeoutsRef = useRef({});
 
-  const handleContentUpdate = (date, content) => {
-    const newData = [...calendarData];
-    const existingEntryIndex = newData.findIndex(
-      entry => entry.date === date.toISOString().split('T')[0]
-    );
+  // Only the entries of the days on screen are loaded
+  const ranges = views.map(viewRange);
+  const rangeFrom = ranges.reduce((min, [from]) => (from < min ? from : min), ranges[0][0]);
+  const rangeTo = ranges.reduce((max, [, to]) => (to > max ? to : max), ranges[0][1]);
 
-    if (existingEntryIndex !== -1) {
-      newData[existingEntryIndex] = { 
-        ...newData[existingEntryIndex], 
-        content 
-      };
-    } else {
-      newData.push({ 
-        date: date.toISOString().split('T')[0], 
-        content 
+  useEffect(() => {
+    const loadEntries = async () => {
+      try {
+        const response = await fetch(
+          `http://localhost:5001/api/notes/${note._id}/calendar?from=${rangeFrom}&to=${rangeTo}`,
+          { headers: { 'Accept': 'application/json' } }
+        );
+        if (!response.ok) {
+          throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        const entries = await response.json();
+        setCalendarData(prev => [
+          ...prev.filter(entry => entry.date < rangeFrom || entry.date > rangeTo),
+          ...entries
+        ]);
+      } catch (error) {
+        console.error('Error loading calendar entries:', error);
+      }
+    };
+    loadEntries();
+  }, [note._id, rangeFrom, rangeTo]);
+
+  const saveEntry = async (dateStr, content) => {
+    try {
+      const response = await fetch(`http://localhost:5001/api/notes/${note._id}/calendar/${dateStr}`, {
+        method: 'PUT',
+        headers: {
+          'Accept': 'application/json',
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ content }),
       });
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+    } catch (error) {
+      console.error('Error saving calendar entry:', error);
     }
+  };
+
+  const handleContentUpdate = (date, content) => {
+    const dateStr = toDateKey(date);
+    setCalendarData(prev => {
+      const newData = prev.filter(entry => entry.date !== dateStr);
+      newData.push({ date: dateStr, content });
+      return newData;
+    });
 
-    setCalendarData(newData);
-    onUpdate({ calendarData: newData });
+    // Each day is saved on its own, debounced like other note edits
+    clearTimeout(saveTimeoutsRef.current[dateStr]);
+    saveTimeoutsRef.current[dateStr] = setTimeout(() => saveEntry(dateStr, content), 500);
   };
 
   const getContentForDate = (date) => {
@@ -4,6 +4,7 @@ import CalendarNote from './CalendarNote';
 import RichTextEditor from './ui/RichTextEditor';
 import { useEditor } from './EditorContext';
 import { sanitizeContent, cleanContent } from '@/lib/utils';
+import { queueNoteSave } from '@/lib/saveQueue';
 
 const Note = ({
   note,
@@ -39,40 +40,84 @@ const Note = ({
   }, [note.title]);
 
   useEffect(() => {
+    // The change feed hands down newer versions of the note; one at or
+    // behind what this note has saved itself is an echo of its own writes
+    if (note._id === localNote._id && (note.version || 0) <= (localNote.version || 0)) return;
     setLocalNote(note);
-    setContent(cleanContent(note.content) || '');
-    setTitle(note.title || '');
+    // Text still being typed is kept; its pending save is newer
+    if (!updateTimeoutRef.current) {
+      setContent(cleanContent(note.content) || '');
+    }
+    if (!isEditingTitle) {
+      setTitle(note.title || '');
+    }
   }, [note]);
 
   const updateNote = async (updates) => {
     try {
-      const updatedNote = {
-        ...localNote,
-        ...updates,
-        title,
-        order: note.order,
-        type: note.type,
-      };
+      // Only the changed fields are sent; a save of the whole local note
+      // would write back tasks and content that other requests have since
+      // changed. Saves from all open notes go out together in one batch request.
+      const { version } = await queueNoteSave(note._id, updates);
+      setLocalNote(prev => ({ ...prev, ...updates, version: Math.max(prev.version || 0, version) }));
+    } catch (error) {
+      console.error('Error updating note:', error);
+    }
+  };
 
-      if (note.type === 'calendar' && !updates.views && localNote.views) {
-        updatedNote.views = localNote.views;
-      }
+  // Task edits are saved by TaskNote one request at a time; this only keeps
+  // the local note in step with what each of them wrote
+  const handleTasksSaved = (applyToTasks, version) => {
+    setLocalNote(prev => ({
+      ...prev,
+      tasks: applyToTasks(prev.tasks || []),
+      version: Math.max(prev.version || 0, version),
+    }));
+  };
 
+  // Smallest single-splice delta turning `from` into `to`, counted in code points
+  const textDelta = (from, to) => {
+    const a = Array.from(from);
+    const b = Array.from(to);
+    let start = 0;
+    while (start < a.length && start < b.length && a[start] === b[start]) start++;
+    let end = 0;
+    while (end < a.length - start && end < b.length - start &&
+           a[a.length - 1 - end] === b[b.length - 1 - end]) end++;
+
+    const delta = [];
+    if (start) delta.push({ retain: start });
+    if (a.length - start - end) delta.push({ delete: a.length - start - end });
+    if (b.length - start - end) delta.push({ insert: b.slice(start, b.length - end).join('') });
+    return delta;
+  };
+
+  const patchContent = async (newContent) => {
+    try {
       const response = await fetch(`http://localhost:5001/api/notes/${note._id}`, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(updatedNote),
+        body: JSON.stringify({
+          base_version: localNote.version || 0,
+          ops: [{ op: 'text', path: '/content', delta: textDelta(localNote.content || '', newContent) }],
+        }),
       });
 
+      // Someone else saved in between; fall back to a full save
+      if (response.status === 409) {
+        await updateNote({ content: newContent });
+        return;
+      }
+
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const savedNote = await response.json();
-      setLocalNote(savedNote);
+      const changes = await response.json();
+      setLocalNote(prev => ({ ...prev, ...changes }));
     } catch (error) {
       console.error('Error updating note:', error);
     }
@@ -97,7 +142,8 @@ const Note = ({
     }
 
     updateTimeoutRef.current = setTimeout(() => {
-      updateNote({ content: sanitizedContent });
+      updateTimeoutRef.current = null;
+      patchContent(sanitizedContent);
     }, 500);
   };
 
@@ -117,30 +163,17 @@ const Note = ({
 
     if (updateTimeoutRef.current) {
       clearTimeout(updateTimeoutRef.current);
+      updateTimeoutRef.current = null;
     }
 
-    updateTimeoutRef.current = setTimeout(() => {
-      updateNote(updates);
-    }, 500);
+    // The save queue already waits for the editor to settle
+    updateNote(updates);
   };
 
   const updateExpansionState = async (expanded) => {
     try {
-      const response = await fetch(`http://localhost:5001/api/notes/${note._id}`, {
-        method: 'PUT',
-        headers: {
-          'Accept': 'application/json',
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          ...note,
-          isExpanded: expanded
-        }),
-      });
-
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
+      const { version } = await queueNoteSave(note._id, { isExpanded: expanded });
+      setLocalNote(prev => ({ ...prev, isExpanded: expanded, version }));
     } catch (error) {
       console.error('Error updating note expansion state:', error);
     }
@@ -177,7 +210,7 @@ const Note = ({
 
   const renderContent = () => {
     if (note.type === 'task') {
-      return <TaskNote note={localNote} onUpdate={handleNoteUpdate} />;
+      return <TaskNote note={localNote} onSaved={handleTasksSaved} />;
     } else if (note.type === 'calendar') {
       return <CalendarNote note={localNote} onUpdate={handleNoteUpdate} />;
     }
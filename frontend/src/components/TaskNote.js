@@ -1,103 +1,113 @@
 import React, { useState, useRef, useEffect } from 'react';
 
-const TaskNote = ({ note, onUpdate }) => {
+const sameTask = (task, taskId) => String(task.id) === String(taskId);
+
+const TaskNote = ({ note, onSaved }) => {
   const [tasks, setTasks] = useState(note.tasks || []);
-  const updateTimeoutRef = useRef(null);
+  // Typed text not yet sent, and its debounce timer, by task id
+  const pendingTextRef = useRef({});
+  // Task requests sent but not answered yet
+  const inFlightRef = useRef(0);
 
-  const updateBackend = async (newTasks) => {
+  // Each change is sent on its own to /api/notes/:id/tasks, so ticking one
+  // box no longer resends the whole note. `applyToTasks` replays the change
+  // the server made on the note's task list, which goes to onSaved with the
+  // new version.
+  const taskRequest = async (method, path, body, applyToTasks) => {
+    inFlightRef.current += 1;
     try {
-      // Ensure we're sending valid tasks array
-      const tasks = newTasks || [];
-      
-      // Create a clean note update object
-      const noteUpdate = {
-        ...note,
-        type: 'task',  // Ensure type is set
-        tasks: tasks,  // Use validated tasks array
-        content: '',   // Task notes don't use content field
-      };
-
-      const response = await fetch(`http://localhost:5001/api/notes/${note._id}`, {
-        method: 'PUT',
+      const response = await fetch(`http://localhost:5001/api/notes/${note._id}/tasks${path}`, {
+        method,
         headers: {
+          'Accept': 'application/json',
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(noteUpdate),
+        body: body ? JSON.stringify(body) : undefined,
       });
-
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
-
-      // Get the response to ensure we're in sync
-      const updatedNote = await response.json();
-      if (updatedNote.tasks) {
-        setTasks(updatedNote.tasks);
-      }
+      const result = await response.json();
+      onSaved?.(tasksBefore => applyToTasks(tasksBefore, result), result.version);
     } catch (error) {
       console.error('Error updating tasks:', error);
+    } finally {
+      inFlightRef.current -= 1;
     }
   };
 
-  const handleUpdate = (newTasks) => {
-    // Ensure we're not setting null or undefined
-    const validTasks = newTasks || [];
-    setTasks(validTasks);
-    
-    if (updateTimeoutRef.current) {
-      clearTimeout(updateTimeoutRef.current);
-    }
-    
-    // Ensure we send the full note data with tasks
-    updateBackend(validTasks);
+  const addTask = () => {
+    const task = {
+      id: Date.now(),
+      text: '',
+      completed: false
+    };
+    setTasks(prev => [...prev, task]);
+    taskRequest('POST', '', task, (tasksBefore, { task: added }) => [
+      ...tasksBefore.filter(other => !sameTask(other, added.id)),
+      added,
+    ]);
   };
 
-  const addTask = () => {
-    const newTasks = [
-      ...tasks, 
-      { 
-        id: Date.now(), 
-        text: '', 
-        completed: false 
-      }
-    ];
-    handleUpdate(newTasks);
+  const sendText = (taskId) => {
+    const pending = pendingTextRef.current[taskId];
+    if (!pending) return;
+    clearTimeout(pending.timer);
+    delete pendingTextRef.current[taskId];
+    patchTask(taskId, { text: pending.text });
+  };
+
+  const patchTask = (taskId, fields) => {
+    taskRequest('PATCH', `/${taskId}`, fields, (tasksBefore, result) => tasksBefore.map(task =>
+      sameTask(task, result.task_id) ? { ...task, ...result.fields } : task
+    ));
   };
 
   const updateTask = (taskId, updates) => {
-    const newTasks = tasks.map(task => 
+    setTasks(prev => prev.map(task =>
       task.id === taskId ? { ...task, ...updates } : task
-    );
-    handleUpdate(newTasks);
+    ));
+
+    if (!('text' in updates)) {
+      patchTask(taskId, updates);
+      return;
+    }
+    // Typing is debounced per task, like other note edits
+    const pending = pendingTextRef.current[taskId];
+    if (pending) clearTimeout(pending.timer);
+    pendingTextRef.current[taskId] = {
+      text: updates.text,
+      timer: setTimeout(() => sendText(taskId), 500),
+    };
   };
 
   const deleteTask = (taskId) => {
-    const newTasks = tasks.filter(task => task.id !== taskId);
-    handleUpdate(newTasks);
+    const pending = pendingTextRef.current[taskId];
+    if (pending) clearTimeout(pending.timer);
+    delete pendingTextRef.current[taskId];
+    setTasks(prev => prev.filter(task => task.id !== taskId));
+    taskRequest('DELETE', `/${taskId}`, undefined, (tasksBefore, result) =>
+      tasksBefore.filter(task => !sameTask(task, result.task_id))
+    );
   };
 
-  // Always keep local state synchronized with note props
+  // Always keep local state synchronized with note props, unless an edit
+  // is still waiting to be sent or answered
   useEffect(() => {
     // Ensure we have tasks array, defaulting to empty if not present
     const noteTasks = note.tasks || [];
-    if (JSON.stringify(noteTasks) !== JSON.stringify(tasks)) {
+    if (Object.keys(pendingTextRef.current).length === 0 && inFlightRef.current === 0 &&
+        JSON.stringify(noteTasks) !== JSON.stringify(tasks)) {
       setTasks(noteTasks);
-      // Clear any pending updates
-      if (updateTimeoutRef.current) {
-        clearTimeout(updateTimeoutRef.current);
-        updateTimeoutRef.current = null;
-      }
     }
   }, [note, note.tasks]);
 
+  // Send pending text edits right away when the note goes away
   useEffect(() => {
     return () => {
-      if (updateTimeoutRef.current) {
-        clearTimeout(updateTimeoutRef.current);
-        updateBackend(tasks);
-      }
+      Object.keys(pendingTextRef.current).forEach(sendText);
     };
-  }, [tasks]);
+  }, []);
 
   return (
     <div className="task-note space-y-4">
@@ -86,6 +86,9 @@ const CabinetHeader = ({
               data-testid={`cabinet-item-${cabinet.name.replace(/\s+/g, '-')}`}
             >
               <span className="truncate">{cabinet.name}</span>
+              {cabinet.stats && (
+                <span className="ml-auto text-xs text-gray-400 shrink-0">{cabinet.stats.notes}</span>
+              )}
               <button
                 className="delete-button opacity-0 group-hover:opacity-100 p-1 hover:bg-red-100 rounded transition-opacity shrink-0"
                 onClick={(e) => handleDeleteClick(cabinet, e)}
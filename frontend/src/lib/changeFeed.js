@@ -0,0 +1,138 @@
+// changeFeed.js
+// Follows GET /api/changes for one cabinet, so notes edited in another tab
+// or by another user show up without a reload.
+
+const CHANGES_URL = 'http://localhost:5001/api/changes';
+
+const NOTE_EVENTS = [
+  'note_created', 'note_updated', 'note_deleted', 'notes_reordered', 'notes_imported',
+  'task_added', 'task_updated', 'task_deleted', 'task_moved',
+];
+const CABINET_EVENTS = ['cabinet_updated', 'cabinet_deleted'];
+
+// Sets or removes a field of a note; change stream events may name nested
+// fields with dotted paths such as "tasks.0.completed"
+const applyPath = (note, path, value, remove) => {
+  const names = path.split('.');
+  const root = { ...note };
+  let target = root;
+  for (const name of names.slice(0, -1)) {
+    const child = target[name];
+    if (child === null || typeof child !== 'object') return note;
+    target[name] = Array.isArray(child) ? [...child] : { ...child };
+    target = target[name];
+  }
+  const last = names[names.length - 1];
+  if (remove) {
+    delete target[last];
+  } else {
+    target[last] = value;
+  }
+  return root;
+};
+
+const sameTask = (task, taskId) => String(task.id) === String(taskId);
+
+const applyTaskEvent = (tasks, type, data) => {
+  switch (type) {
+    case 'task_added': {
+      const next = tasks.filter(task => !sameTask(task, data.task.id));
+      next.splice(data.position ?? next.length, 0, data.task);
+      return next;
+    }
+    case 'task_updated':
+      return tasks.map(task => (sameTask(task, data.task_id) ? { ...task, ...data.fields } : task));
+    case 'task_deleted':
+      return tasks.filter(task => !sameTask(task, data.task_id));
+    case 'task_moved': {
+      const moved = tasks.find(task => sameTask(task, data.task_id));
+      if (!moved) return tasks;
+      const next = tasks.filter(task => task !== moved);
+      next.splice(data.position, 0, moved);
+      return next;
+    }
+    default:
+      return tasks;
+  }
+};
+
+/**
+ * Whether an event cannot be applied note by note, so the cabinet's notes
+ * should be fetched again instead
+ * @param {string} type - The event type
+ * @param {object} data - The event payload
+ * @returns {boolean}
+ */
+export const needsRefetch = (type, data) => (
+  // A rebalance moved every note in the cabinet, not just the one reported
+  type === 'notes_imported' || (type === 'notes_reordered' && Boolean(data.rebalanced))
+);
+
+/**
+ * The notes of a cabinet after one change feed event (see needsRefetch).
+ * Events at or behind the version a note already has are echoes of
+ * writes it has seen, and are skipped.
+ * @param {Array} notes - The notes of the cabinet, ordered by `order`
+ * @param {string} type - The event type
+ * @param {object} data - The event payload
+ * @returns {Array}
+ */
+export const applyNoteEvent = (notes, type, data) => {
+  const isNewer = note => (data.version || 0) > (note.version || 0);
+
+  switch (type) {
+    case 'note_created':
+      if (notes.some(note => note._id === data.note._id)) return notes;
+      return [...notes, data.note].sort((a, b) => (a.order || 0) - (b.order || 0));
+    case 'note_updated':
+      return notes.map(note => {
+        if (note._id !== data._id || !isNewer(note)) return note;
+        let updated = { ...note, version: data.version };
+        Object.entries(data.fields).forEach(([path, value]) => {
+          updated = applyPath(updated, path, value, false);
+        });
+        data.removed.forEach(path => {
+          updated = applyPath(updated, path, undefined, true);
+        });
+        return updated;
+      });
+    case 'note_deleted':
+      return notes.filter(note => note._id !== data._id);
+    case 'notes_reordered': {
+      const orders = new Map(data.notes.map(({ _id, order }) => [_id, order]));
+      return notes
+        .map(note => (orders.has(note._id) ? { ...note, order: orders.get(note._id) } : note))
+        .sort((a, b) => (a.order || 0) - (b.order || 0));
+    }
+    case 'task_added':
+    case 'task_updated':
+    case 'task_deleted':
+    case 'task_moved':
+      return notes.map(note => {
+        if (note._id !== data._id || !isNewer(note)) return note;
+        return { ...note, tasks: applyTaskEvent(note.tasks || [], type, data), version: data.version };
+      });
+    default:
+      return notes;
+  }
+};
+
+/**
+ * Opens the change feed of a cabinet. EventSource reconnects on its own and
+ * resumes after the last event it saw; `reset` says events were lost.
+ * @param {string} cabinetId - The cabinet to follow
+ * @param {object} handlers - onNoteEvent(type, data), onCabinetEvent(type, data), onReset()
+ * @returns {function} - Closes the feed
+ */
+export const openChangeFeed = (cabinetId, { onNoteEvent, onCabinetEvent, onReset }) => {
+  const source = new EventSource(`${CHANGES_URL}?cabinet_id=${cabinetId}`);
+  const listen = (types, handler) => types.forEach(type => {
+    source.addEventListener(type, event => handler(type, JSON.parse(event.data)));
+  });
+
+  listen(NOTE_EVENTS, onNoteEvent);
+  listen(CABINET_EVENTS, onCabinetEvent);
+  source.addEventListener('reset', () => onReset());
+
+  return () => source.close();
+};
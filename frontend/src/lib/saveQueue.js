@@ -0,0 +1,88 @@
+// saveQueue.js
+// Collects note saves from every open editor and flushes them together
+// through POST /api/notes/batch, so a burst of autosaves is one round trip.
+
+const BATCH_URL = 'http://localhost:5001/api/notes/batch';
+const FLUSH_DELAY = 500;
+const MAX_BATCH_OPS = 200;
+
+// note id -> { changes, waiters }
+const pending = new Map();
+let flushTimer = null;
+
+const settle = (waiters, result) => {
+  waiters.forEach(({ resolve, reject }) => {
+    if (result && result.status < 400) {
+      resolve(result);
+    } else {
+      reject(new Error(result ? result.error : 'Save failed'));
+    }
+  });
+};
+
+const sendBatch = async (entries, keepalive) => {
+  try {
+    const response = await fetch(BATCH_URL, {
+      method: 'POST',
+      keepalive,
+      headers: {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+      },
+      body: JSON.stringify({
+        // Saves of different notes do not depend on each other
+        ordered: false,
+        ops: entries.map(([noteId, { changes }]) => ({ op: 'update', _id: noteId, note: changes })),
+      }),
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const { results } = await response.json();
+    entries.forEach(([, { waiters }], index) => settle(waiters, results[index]));
+  } catch (error) {
+    entries.forEach(([, { waiters }]) => waiters.forEach(({ reject }) => reject(error)));
+  }
+};
+
+export const flushNoteSaves = (keepalive = false) => {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  const entries = Array.from(pending.entries());
+  pending.clear();
+
+  const batches = [];
+  for (let start = 0; start < entries.length; start += MAX_BATCH_OPS) {
+    batches.push(sendBatch(entries.slice(start, start + MAX_BATCH_OPS), keepalive));
+  }
+  return Promise.all(batches);
+};
+
+/**
+ * Queues changes to a note; saves of the same note made before the next
+ * flush are merged into one update.
+ * @param {string} noteId - The note to update
+ * @param {object} changes - Fields to save, as accepted by PUT /api/notes/:id
+ * @returns {Promise<object>} - The batch result for the note ({ status, version })
+ */
+export const queueNoteSave = (noteId, changes) => new Promise((resolve, reject) => {
+  const entry = pending.get(noteId) || { changes: {}, waiters: [] };
+  entry.changes = { ...entry.changes, ...changes };
+  entry.waiters.push({ resolve, reject });
+  pending.set(noteId, entry);
+
+  // The window starts at the first queued save, so steady typing cannot
+  // postpone the flush indefinitely
+  if (!flushTimer) {
+    flushTimer = setTimeout(() => flushNoteSaves(), FLUSH_DELAY);
+  }
+});
+
+// Saves still waiting when the tab goes away are sent with keepalive
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', () => flushNoteSaves(true));
+}
@@ -0,0 +1,197 @@
+# Location: tests/benchmarks/run_benchmarks.py
+
+"""Seed a benchmark database, drive workloads through create_app and report latencies.
+
+    python tests/benchmarks/run_benchmarks.py --in-memory --operations 200
+    python tests/benchmarks/run_benchmarks.py --output results.json \\
+        --baseline tests/benchmarks/baseline.json
+
+Results are JSON with p50/p95/p99 latency and requests/sec per endpoint and
+workload. The run exits non-zero when a simulated client raises, and with
+--baseline also when any endpoint's p95 grows, or its throughput drops, by
+more than --tolerance.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..', '..'))
+sys.path.insert(0, os.path.join(REPO_DIR, 'backend'))
+sys.path.insert(0, BENCH_DIR)
+
+import app as app_module  # noqa: E402
+from config import Config  # noqa: E402
+from seed import parse_mix, seed  # noqa: E402
+from stats import Recorder, compare  # noqa: E402
+from workloads import WORKLOADS, Session  # noqa: E402
+
+
+class BenchConfig(Config):
+    MONGO_URI = os.getenv('BENCH_MONGO_URI', 'mongodb://localhost:27017/notes_manager_bench')
+    DEBUG = False
+    LOG_LEVEL = 'WARNING'
+    LOG_REQUEST_SAMPLE_RATE = 0.0
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_workload(app, store, layout, workload, operations, concurrency, seed_value):
+    """Run `operations` iterations of a workload split across `concurrency` sessions.
+
+    The summary's `failed_sessions` counts sessions that stopped on an
+    exception; their tracebacks are printed to stderr.
+    """
+    recorder = Recorder()
+    cabinets = list(layout)
+    shared = len(cabinets) < concurrency
+    sessions = []
+    for index in range(concurrency):
+        # Writers get disjoint cabinets whenever there are enough to go round;
+        # otherwise each works on its own copy of the layout, so one session
+        # deleting or moving a note never pulls it out of another's lists
+        owned = cabinets if shared else cabinets[index::concurrency]
+        session_layout = copy.deepcopy(layout) if shared else layout
+        rng = random.Random(f'{seed_value}-{workload.__name__}-{index}')
+        sessions.append(Session(app, store, recorder, rng, session_layout, owned, shared))
+
+    failures = []
+
+    def work(session, count):
+        try:
+            workload(session, count)
+        except Exception:
+            failures.append(traceback.format_exc())
+
+    share, extra = divmod(operations, concurrency)
+    threads = [
+        threading.Thread(target=work, args=(session, share + (1 if index < extra else 0)))
+        for index, session in enumerate(sessions)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = recorder.summary(time.perf_counter() - started)
+    for failure in failures:
+        print(f'Session failed in {workload.__name__}:\n{failure}', file=sys.stderr)
+    summary['failed_sessions'] = len(failures)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--in-memory', action='store_true',
+                        help='use an in-memory SQLite store instead of the MongoDB at BENCH_MONGO_URI')
+    parser.add_argument('--cabinets', type=int, default=5)
+    parser.add_argument('--notes', type=int, default=200, help='notes per cabinet')
+    parser.add_argument('--mix', default=None,
+                        help='note type weights, e.g. standard=60,task=25,calendar=15')
+    parser.add_argument('--content-bytes', type=int, default=2000,
+                        help='approximate HTML size of standard notes')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS),
+                        help='comma separated subset of: ' + ', '.join(WORKLOADS))
+    parser.add_argument('--operations', type=int, default=500, help='iterations per workload')
+    parser.add_argument('--concurrency', type=int, default=4, help='simulated clients per workload')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write results JSON here (default: stdout)')
+    parser.add_argument('--baseline', help='compare against a previous results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.20,
+                        help='allowed relative p95 growth / rps drop before failing')
+    parser.add_argument('--force', action='store_true',
+                        help='allow a database whose name does not contain "bench"')
+    args = parser.parse_args(argv)
+
+    args.workloads = [name.strip() for name in args.workloads.split(',') if name.strip()]
+    unknown = [name for name in args.workloads if name not in WORKLOADS]
+    if unknown:
+        parser.error(f'unknown workloads: {", ".join(unknown)}')
+    if args.concurrency < 1 or args.operations < 1:
+        parser.error('--concurrency and --operations must be positive')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    db_name = BenchConfig.MONGO_URI.split('/')[-1]
+    if not args.in_memory and 'bench' not in db_name and not args.force:
+        sys.exit(f'Refusing to wipe database {db_name!r}; use a *bench* database or --force')
+    if args.in_memory:
+        BenchConfig.STORAGE_BACKEND = 'memory'
+
+    app = app_module.create_app(BenchConfig)
+    mix = parse_mix(args.mix)
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': BenchConfig.STORAGE_BACKEND,
+            'cabinets': args.cabinets,
+            'notes_per_cabinet': args.notes,
+            'mix': mix,
+            'content_bytes': args.content_bytes,
+            'operations': args.operations,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'workloads': {},
+    }
+
+    for name in args.workloads:
+        # Every workload starts from the same freshly seeded data
+        layout = seed(app.store, args.cabinets, args.notes, mix, args.content_bytes, seed_value=args.seed)
+        print(f'Running {name}...', file=sys.stderr)
+        results['workloads'][name] = run_workload(
+            app, app.store, layout, WORKLOADS[name], args.operations, args.concurrency, args.seed
+        )
+
+    failed = [name for name, summary in results['workloads'].items() if summary['failed_sessions']]
+    for name in failed:
+        print(f"FAILED {name}: {results['workloads'][name]['failed_sessions']} sessions raised", file=sys.stderr)
+    exit_code = 1 if failed else 0
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(results, baseline, args.tolerance)
+        results['regressions'] = regressions
+        for regression in regressions:
+            print(
+                f"REGRESSION {regression['workload']} {regression['endpoint']} "
+                f"{regression['metric']}: {regression['baseline']} -> {regression['current']}",
+                file=sys.stderr
+            )
+        if regressions:
+            exit_code = 1
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
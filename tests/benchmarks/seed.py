@@ -0,0 +1,150 @@
+# Location: tests/benchmarks/seed.py
+
+"""Synthetic cabinets and notes written straight to MongoDB.
+
+Documents have the same shape the API writes (order counter, content
+version, content hash, derived search fields, calendar entries in their own
+collection), so the benchmarked routes behave exactly as they would on real
+data. Generation is driven by a seeded RNG and is reproducible.
+"""
+
+import random
+from datetime import date, datetime, timedelta
+
+from app.utils.ordering import ORDER_STEP
+from app.utils.sanitizer import content_hash
+from app.utils.search_text import search_fields_for
+
+WORDS = (
+    'meeting notes draft plan review budget design sprint release backlog '
+    'customer feedback roadmap metrics launch hiring onboarding research '
+    'summary follow up idea question decision risk owner deadline status'
+).split()
+
+DEFAULT_MIX = {'standard': 60, 'task': 25, 'calendar': 15}
+
+
+def parse_mix(raw):
+    """Parse `standard=60,task=25,calendar=15` into relative weights"""
+    if not raw:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in raw.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f'Unknown note type in mix: {name}')
+        mix[name] = float(weight)
+    if not any(mix.values()):
+        raise ValueError('Note mix needs at least one positive weight')
+    return mix
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _html(rng, size):
+    paragraphs = []
+    length = 0
+    while length < size:
+        paragraph = '<p>' + _sentence(rng, rng.randint(8, 24)) + '</p>'
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return ''.join(paragraphs)
+
+
+def _tasks(rng, count):
+    return [
+        {'id': i + 1, 'text': _sentence(rng, rng.randint(3, 8)), 'completed': rng.random() < 0.3}
+        for i in range(count)
+    ]
+
+
+def _calendar(rng, days, start):
+    return {
+        (start + timedelta(days=offset)).strftime('%Y-%m-%d'): _sentence(rng, rng.randint(3, 10))
+        for offset in sorted(rng.sample(range(365), days))
+    }
+
+
+def build_note(rng, cabinet_id, order, note_type, content_bytes):
+    note = {
+        'cabinet_id': cabinet_id,
+        'type': note_type,
+        'title': _sentence(rng, rng.randint(2, 5))[:-1],
+        'timestamp': datetime.utcnow().isoformat(),
+        'isExpanded': rng.random() < 0.2,
+        'order': order,
+        'version': 0,
+        'content': '',
+    }
+    if note_type == 'standard':
+        note['content'] = _html(rng, content_bytes)
+        note['content_hash'] = content_hash(note['content'])
+    elif note_type == 'task':
+        note['tasks'] = _tasks(rng, rng.randint(3, 15))
+    else:
+        note['viewType'] = 'month'
+        note['views'] = [{'id': 'view-1', 'viewType': 'month', 'selectedDate': note['timestamp']}]
+    note.update(search_fields_for(note))
+    return note
+
+
+def seed(store, cabinets=5, notes_per_cabinet=200, mix=None, content_bytes=2000,
+         calendar_days=20, seed_value=1):
+    """Replace the contents of `store` with synthetic cabinets.
+
+    Returns {cabinet_id: {'notes': [ids in order], 'types': {id: type}}}.
+    """
+    rng = random.Random(seed_value)
+    mix = mix or dict(DEFAULT_MIX)
+    types = list(mix)
+    weights = [mix[name] for name in types]
+    start = date(2024, 1, 1)
+
+    if store.backend == 'mongo':
+        for name in ('cabinets', 'notes', 'calendar_entries'):
+            store.db[name].delete_many({})
+    else:
+        with store.transaction():
+            for name in ('cabinets', 'notes', 'notes_search', 'calendar_entries'):
+                store.execute(f'DELETE FROM {name}')
+
+    layout = {}
+    for index in range(cabinets):
+        now = datetime.utcnow()
+        cabinet_id = str(store.cabinets.insert({
+            'name': f'Benchmark cabinet {index + 1}',
+            'created_at': now,
+            'updated_at': now,
+            'version': 0,
+            'last_order': (notes_per_cabinet - 1) * ORDER_STEP,
+        }))
+
+        notes = []
+        entries = []
+        pending_entries = []
+        for position in range(notes_per_cabinet):
+            note_type = rng.choices(types, weights)[0]
+            notes.append(build_note(rng, cabinet_id, position * ORDER_STEP, note_type, content_bytes))
+            if note_type == 'calendar':
+                pending_entries.append((position, _calendar(rng, calendar_days, start)))
+        if notes:
+            store.notes.insert_many(notes)
+
+        for position, days in pending_entries:
+            note_id = notes[position]['_id']
+            entries.extend(
+                {'note_id': note_id, 'cabinet_id': cabinet_id, 'date': day,
+                 'content': content, 'updated_at': now}
+                for day, content in days.items()
+            )
+        if entries:
+            store.calendar_entries.insert_many(entries)
+
+        layout[cabinet_id] = {
+            'notes': [str(note['_id']) for note in notes],
+            'types': {str(note['_id']): note['type'] for note in notes},
+        }
+    return layout
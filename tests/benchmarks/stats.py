@@ -0,0 +1,95 @@
+# Location: tests/benchmarks/stats.py
+
+"""Latency recording, percentile summaries and baseline comparison"""
+
+import math
+import threading
+from collections import defaultdict
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency samples for one workload"""
+
+    def __init__(self):
+        self._latencies = defaultdict(list)
+        self._errors = defaultdict(int)
+        self._statuses = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, status, error):
+        with self._lock:
+            self._latencies[endpoint].append(seconds)
+            self._statuses[endpoint][status] += 1
+            if error:
+                self._errors[endpoint] += 1
+
+    def summary(self, wall_seconds):
+        """Per-endpoint and overall figures; latencies in milliseconds"""
+        endpoints = {}
+        total = 0
+        total_errors = 0
+        with self._lock:
+            items = {name: sorted(values) for name, values in self._latencies.items()}
+            errors = dict(self._errors)
+            statuses = {name: dict(counts) for name, counts in self._statuses.items()}
+
+        for endpoint, values in sorted(items.items()):
+            count = len(values)
+            total += count
+            total_errors += errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                'requests': count,
+                'errors': errors.get(endpoint, 0),
+                'statuses': {str(status): n for status, n in sorted(statuses[endpoint].items())},
+                'rps': round(count / wall_seconds, 2) if wall_seconds else None,
+                'mean_ms': round(sum(values) / count * 1000, 3),
+                'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+                'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+                'max_ms': round(values[-1] * 1000, 3),
+            }
+
+        return {
+            'duration_s': round(wall_seconds, 3),
+            'requests': total,
+            'errors': total_errors,
+            'rps': round(total / wall_seconds, 2) if wall_seconds else None,
+            'endpoints': endpoints,
+        }
+
+
+def compare(results, baseline, tolerance=0.20, min_requests=20):
+    """Regressions of `results` against `baseline`.
+
+    An endpoint regresses when its p95 latency grows, or its request rate
+    drops, by more than `tolerance`. Endpoints with fewer than `min_requests`
+    samples on either side are too noisy to judge and are skipped.
+    """
+    regressions = []
+    for workload, current in results['workloads'].items():
+        previous = baseline.get('workloads', {}).get(workload)
+        if not previous:
+            continue
+        for endpoint, now in current['endpoints'].items():
+            before = previous['endpoints'].get(endpoint)
+            if not before or min(before['requests'], now['requests']) < min_requests:
+                continue
+            if before['p95_ms'] and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append({
+                    'workload': workload, 'endpoint': endpoint, 'metric': 'p95_ms',
+                    'baseline': before['p95_ms'], 'current': now['p95_ms'],
+                })
+            if before['rps'] and now['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append({
+                    'workload': workload, 'endpoint': endpoint, 'metric': 'rps',
+                    'baseline': before['rps'], 'current': now['rps'],
+                })
+    return regressions
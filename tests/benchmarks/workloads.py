@@ -0,0 +1,249 @@
+# Location: tests/benchmarks/workloads.py
+
+"""Simulated client sessions and the workloads they run.
+
+Every request goes through a Flask test client bound to the real app, so
+routing, serialization, caching and MongoDB access are all on the measured
+path; only network transfer is left out. Bookkeeping reads that a real
+client would already have in memory (note versions, task counts) go
+straight to the database and are not timed.
+"""
+
+import time
+from bson.objectid import ObjectId
+
+from seed import WORDS, build_note
+
+
+class Session:
+    """One simulated editor with its own test client, RNG and cabinets.
+
+    With `shared` the cabinets are also edited by other sessions, so this
+    session's view of their order can go stale the way a real client's does.
+    """
+
+    def __init__(self, app, store, recorder, rng, layout, cabinets, shared=False):
+        self.client = app.test_client()
+        self.store = store
+        self.recorder = recorder
+        self.rng = rng
+        self.layout = layout
+        self.cabinets = cabinets
+        self.shared = shared
+        self.versions = {}
+        self.etags = {}
+
+    def request(self, endpoint, method, url, allowed=(), **kwargs):
+        """Issue one timed request; 4xx outside `allowed` and any 5xx count as errors"""
+        started = time.perf_counter()
+        response = self.client.open(url, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        status = response.status_code
+        self.recorder.add(endpoint, elapsed, status, status >= 400 and status not in allowed)
+        return response
+
+    def notes_of_type(self, note_type):
+        return [
+            note_id
+            for cabinet_id in self.cabinets
+            for note_id in self.layout[cabinet_id]['notes']
+            if self.layout[cabinet_id]['types'].get(note_id) == note_type
+        ]
+
+    def note_state(self, note_id, refresh=False):
+        """Version and stored fields a client editing `note_id` would hold"""
+        if refresh or note_id not in self.versions:
+            note = self.store.notes.get(
+                ObjectId(note_id), {'version': 1, 'content': 1, 'tasks': 1}
+            ) or {}
+            self.versions[note_id] = {
+                'version': note.get('version', 0),
+                'length': len(note.get('content') or ''),
+                'tasks': len(note.get('tasks') or []),
+            }
+        return self.versions[note_id]
+
+    def words(self, count):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+
+def _apply_patch_result(session, note_id, response):
+    if response.status_code == 200:
+        body = response.get_json()
+        state = session.note_state(note_id)
+        state['version'] = body['version']
+        if body.get('content') is not None:
+            state['length'] = len(body['content'])
+    elif response.status_code == 409:
+        session.note_state(note_id, refresh=True)
+
+
+def autosave_storm(session, operations):
+    """A few open editors autosaving: text deltas, task toggles and legacy full PUTs"""
+    rng = session.rng
+    standard = session.notes_of_type('standard')
+    tasks = session.notes_of_type('task')
+    hot = rng.sample(standard, min(8, len(standard)))
+    hot_tasks = rng.sample(tasks, min(4, len(tasks)))
+    if not hot and not hot_tasks:
+        return
+
+    for index in range(operations):
+        if hot_tasks and (not hot or rng.random() < 0.25):
+            note_id = rng.choice(hot_tasks)
+            state = session.note_state(note_id)
+            if not state['tasks']:
+                continue
+            response = session.request(
+                'PATCH /api/notes/<note_id>', 'PATCH', f'/api/notes/{note_id}',
+                allowed=(409,),
+                json={'base_version': state['version'], 'ops': [{
+                    'op': 'replace',
+                    'path': f"/tasks/{rng.randrange(state['tasks'])}/completed",
+                    'value': rng.random() < 0.5,
+                }]}
+            )
+            _apply_patch_result(session, note_id, response)
+        elif index % 20 == 19:
+            # Older clients still save the whole note
+            note_id = rng.choice(hot)
+            response = session.request(
+                'PUT /api/notes/<note_id>', 'PUT', f'/api/notes/{note_id}',
+                json={'content': f'<p>{session.words(rng.randint(40, 120))}</p>'}
+            )
+            if response.status_code == 200:
+                session.note_state(note_id, refresh=True)
+        else:
+            note_id = rng.choice(hot)
+            state = session.note_state(note_id)
+            response = session.request(
+                'PATCH /api/notes/<note_id>', 'PATCH', f'/api/notes/{note_id}',
+                allowed=(409,),
+                json={'base_version': state['version'], 'ops': [{
+                    'op': 'text', 'path': '/content',
+                    'delta': [{'retain': state['length']}, {'insert': ' ' + session.words(2)}],
+                }]}
+            )
+            _apply_patch_result(session, note_id, response)
+
+
+def drag_reorder(session, operations):
+    """Drag-and-drop moves between neighbours, with an occasional batch reorder"""
+    rng = session.rng
+    for index in range(operations):
+        cabinet_id = rng.choice(session.cabinets)
+        notes = session.layout[cabinet_id]['notes']
+        if len(notes) < 3:
+            continue
+
+        if index % 25 == 24:
+            # Reverse a window of notes the way the legacy client did
+            start = rng.randrange(len(notes) - 2)
+            window = notes[start:start + 10]
+            current = {
+                str(note['_id']): note['order']
+                for note in session.store.notes.find([ObjectId(i) for i in window], {'order': 1})
+            }
+            if len(current) != len(window):
+                continue
+            orders = [current[note_id] for note_id in window]
+            response = session.request(
+                'POST /api/notes/batch-update-order', 'POST', '/api/notes/batch-update-order',
+                json=[{'_id': note_id, 'order': order} for note_id, order in zip(reversed(window), orders)]
+            )
+            if response.status_code == 200:
+                notes[start:start + len(window)] = list(reversed(window))
+            continue
+
+        note_id = notes.pop(rng.randrange(len(notes)))
+        target = rng.randrange(len(notes) + 1)
+        before_id = notes[target - 1] if target > 0 else None
+        after_id = notes[target] if target < len(notes) else None
+        # Neighbours another session reordered can come back out of order
+        response = session.request(
+            'POST /api/notes/<note_id>/move', 'POST', f'/api/notes/{note_id}/move',
+            allowed=(400, 404) if session.shared else (404,),
+            json={'before_id': before_id, 'after_id': after_id}
+        )
+        notes.insert(target, note_id)
+
+
+def cabinet_switch(session, operations):
+    """Switching between cabinets: cabinet read, header listing, first full page.
+
+    Clients revalidate with the ETag they hold about half of the time, and
+    every tenth switch is followed by an edit so listings keep getting
+    invalidated instead of being served from cache forever.
+    """
+    rng = session.rng
+    cabinets = list(session.layout)
+    # Recently used cabinets are switched to far more often than the rest
+    weights = [1.0 / (rank + 1) for rank in range(len(cabinets))]
+
+    def get(endpoint, url):
+        headers = {}
+        if url in session.etags and rng.random() < 0.5:
+            headers['If-None-Match'] = session.etags[url]
+        response = session.request(endpoint, 'GET', url, allowed=(304,), headers=headers)
+        if response.headers.get('ETag'):
+            session.etags[url] = response.headers['ETag']
+        return response
+
+    for index in range(operations):
+        cabinet_id = rng.choices(cabinets, weights)[0]
+        get('GET /api/cabinets/<cabinet_id>', f'/api/cabinets/{cabinet_id}')
+        get('GET /api/cabinets/<cabinet_id>/notes?fields=headers',
+            f'/api/cabinets/{cabinet_id}/notes?fields=headers')
+        get('GET /api/cabinets/<cabinet_id>/notes?limit=50',
+            f'/api/cabinets/{cabinet_id}/notes?limit=50')
+
+        if index % 10 == 9 and session.layout[cabinet_id]['notes']:
+            note_id = rng.choice(session.layout[cabinet_id]['notes'])
+            state = session.note_state(note_id)
+            response = session.request(
+                'PATCH /api/notes/<note_id>', 'PATCH', f'/api/notes/{note_id}',
+                allowed=(404, 409),
+                json={'base_version': state['version'], 'ops': [
+                    {'op': 'replace', 'path': '/title', 'value': session.words(3)}
+                ]}
+            )
+            _apply_patch_result(session, note_id, response)
+
+
+def bulk_delete(session, operations):
+    """Bursts of deletes in one cabinet, each refilled with new notes of the same types"""
+    rng = session.rng
+    for _ in range(operations):
+        cabinet_id = rng.choice(session.cabinets)
+        layout = session.layout[cabinet_id]
+        if not layout['notes']:
+            continue
+
+        burst = rng.sample(layout['notes'], min(10, len(layout['notes'])))
+        for note_id in burst:
+            session.request(
+                'DELETE /api/notes/<note_id>', 'DELETE', f'/api/notes/{note_id}', allowed=(404,)
+            )
+            layout['notes'].remove(note_id)
+
+        for note_id in burst:
+            note_type = layout['types'].pop(note_id)
+            session.versions.pop(note_id, None)
+            payload = build_note(rng, cabinet_id, 0, note_type, 1000)
+            payload = {
+                key: value for key, value in payload.items()
+                if key in ('cabinet_id', 'type', 'title', 'timestamp', 'content', 'tasks', 'viewType')
+            }
+            response = session.request('POST /api/notes', 'POST', '/api/notes', json=payload)
+            if response.status_code == 201:
+                new_id = response.get_json()['_id']
+                layout['notes'].append(new_id)
+                layout['types'][new_id] = note_type
+
+
+WORKLOADS = {
+    'autosave_storm': autosave_storm,
+    'drag_reorder': drag_reorder,
+    'cabinet_switch': cabinet_switch,
+    'bulk_delete': bulk_delete,
+}